@@ -1,17 +1,22 @@
-import os
+import io
 import json
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict
 from pathlib import Path
-from typing import Literal, Dict, Any
+from typing import Literal, Dict, Any, Callable
 
 
 from flask import Flask, Response, render_template, jsonify, send_file, request
-from werkzeug.utils import secure_filename
 
 
-from core.parser import WorkflowIO, WorkflowReader, WorkflowWriter
-from core.setting import NodeOptions
-from core.core import StandardOrder, MainBranchShader
-from core.pos_caculate import NodePosCalculator, GroupPosCalulator
+from core import layout_workflow, relayout_workflow, layout_selection
+from core.cache import LayoutCache
+from core.pipeline import StageMemo
+from core.jobs import LayoutJobQueue, JobQueueFull
+from core.metrics import LayoutMetrics
+from core.instrument import LayoutReport
 
 
 current_dir = Path(__file__).parent.absolute()
@@ -20,9 +25,60 @@ app = Flask(
     template_folder = current_dir / "web" / "templates",
     static_folder = current_dir / "web" / "static"
 )
-app.config['temp'] = Path('temp')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-os.makedirs(app.config['temp'], exist_ok=True)
+app.config['MAX_STORED_RESULTS'] = 32
+# 布局结果只保存在内存中，供 /download 下载，超过上限时淘汰最早的结果
+stored_results: OrderedDict[str, bytes] = OrderedDict()
+stored_results_lock = threading.Lock()
+# 相同工作流 + 相同设置直接复用上次的布局结果；LAYOUT_CACHE_DB 设为文件路径即可启用 SQLite 磁盘缓存
+app.config['LAYOUT_CACHE_ENTRIES'] = 128
+app.config['LAYOUT_CACHE_DB'] = None
+app.config['LAYOUT_CACHE_DB_BYTES'] = 256 * 1024 * 1024
+# 同一工作流只改了下游设置（如 gap_x）时，从保存的阶段检查点继续布局
+app.config['STAGE_MEMO_WORKFLOWS'] = 8
+# /jobs 异步任务：在独立的进程池中布局，未完成任务达到 JOB_MAX_PENDING 时返回 429，结果保留 JOB_RESULT_TTL 秒
+app.config['JOB_MAX_WORKERS'] = None
+app.config['JOB_MAX_PENDING'] = 16
+app.config['JOB_RESULT_TTL'] = 600
+services_lock = threading.Lock()
+
+
+def lazy_service(name: str, factory: Callable[[], Any]) -> Any:
+    # 缓存、阶段检查点和任务队列在第一次使用时按当时的 app.config 创建，导入模块后修改配置仍然有效
+    with services_lock:
+        if name not in app.extensions:
+            app.extensions[name] = factory()
+        return app.extensions[name]
+
+
+def layout_cache() -> LayoutCache:
+    return lazy_service('layout_cache', lambda: LayoutCache(
+        max_entries=app.config['LAYOUT_CACHE_ENTRIES'],
+        db_path=app.config['LAYOUT_CACHE_DB'],
+        max_db_bytes=app.config['LAYOUT_CACHE_DB_BYTES']
+    ))
+
+
+def stage_memo() -> StageMemo:
+    return lazy_service('stage_memo', lambda: StageMemo(max_workflows=app.config['STAGE_MEMO_WORKFLOWS']))
+
+
+def job_queue() -> LayoutJobQueue:
+    return lazy_service('job_queue', lambda: LayoutJobQueue(
+        max_workers=app.config['JOB_MAX_WORKERS'],
+        max_pending=app.config['JOB_MAX_PENDING'],
+        result_ttl=app.config['JOB_RESULT_TTL'],
+        cache_db=app.config['LAYOUT_CACHE_DB']
+    ))
+
+
+def store_result(payload: bytes) -> str:
+    result_id = uuid.uuid4().hex
+    with stored_results_lock:
+        stored_results[result_id] = payload
+        while len(stored_results) > app.config['MAX_STORED_RESULTS']:
+            stored_results.popitem(last=False)
+    return result_id
 
 
 @app.route('/')
@@ -30,58 +86,61 @@ def index() -> str:
     return render_template(r"index.html")
 
 
-@app.route('/generate', methods=['POST'])
-def generate_layout() -> tuple[Response, Literal[400]] | Response | tuple[Response, Literal[500]]:
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    temp_filename = "input.json" if file.filename is not None else ""
-    filename = secure_filename(temp_filename)
-    input_path = app.config['temp'] / filename
-    file.save(input_path)
+def request_options() -> Dict[str, Any]:
     config: Dict[str, Any] = json.loads(request.form.get('config', '{}'))
-    NodeOptions.update_setting({
+    return {
         'gap_x': config.get('gap_x', 100),
         'gap_y': config.get('gap_y', 100),
         'same_column_stacking_strength': config.get('same_column_stacking_strength', 1),
         'layout_calculator': config.get('layout_calculator', 'highly_align'),
+        'pava_weight': config.get('pava_weight', 'uniform'),
         'remove_intermediate_nodes': config.get('remove_intermediate_nodes', True),
         'set_color_for_main_path': config.get('set_color_for_main_path', True)
-    })
-    try:
-        workflow_data = WorkflowIO.import_file(input_path)
-        workflow_reader = WorkflowReader(workflow_data)
-        workflow_writer = WorkflowWriter(workflow_data)
-        standard_order = StandardOrder(workflow_reader)
-        main_branch_shader = MainBranchShader(workflow_reader)
-        group_caculator = GroupPosCalulator(workflow_reader)
-        pos_caculator = NodePosCalculator(workflow_reader)
-        orig_groups = group_caculator.get_orig_groups()
-        if NodeOptions.remove_intermediate_nodes:
-            workflow_writer.remove_unnecessary_nodes()
-        columns = standard_order.get_logic_order(nodes=[i.id for i in workflow_data.nodes])
-        workflow_writer.align_node_dimensions(columns)
-        workflow_writer.fold_unimportant_node()
-        pos_caculator.modify_node_layout(columns, align=NodeOptions.calculator_align, method=NodeOptions.layout_calculator)
-        group_caculator.modify_group_layout(orig_groups)
-        if NodeOptions.set_color_for_main_path:
-            main_branch_shader.set_color_for_main_path(list(workflow_reader.id_to_node.keys()))
-        if NodeOptions.remove_nails:
-            workflow_writer.remove_nail()
-        output_filename = "output.json"
-        output_path = app.config['temp'] / output_filename
-        workflow_writer.export_file(output_path)
-        with open(output_path, 'r', encoding='utf-8') as f:
-            preview_data = json.load(f)
-        return jsonify({
-            'success': True,
-            'download_url': f'/download/{output_filename}',
-            'preview_data': preview_data
-        })
+    }
+
+
+def layout_response(payload: bytes, download_url: str, **extra: Dict[str, Any]) -> Response:
+    # 结果只序列化一次，下载内容和响应里的 preview_data 共用同一份 JSON
+    body = b'{"success": true, "download_url": "%s", "preview_data": %s' % (download_url.encode(), payload)
+    for key, value in extra.items():
+        body += b', "%s": %s' % (key.encode(), json.dumps(value).encode('utf-8'))
+    return Response(body + b'}', mimetype='application/json')
+
+
+@app.route('/generate', methods=['POST'])
+def generate_layout() -> tuple[Response, int] | Response:
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
     
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    options = request_options()
+    try:
+        # report 记录各阶段耗时和热点计数，随结果一起返回，便于定位某个工作流上变慢的阶段
+        report = LayoutReport()
+        # selection 为节点 id 的 JSON 数组时只重新布局这些节点，其余节点保持不动
+        selection = json.loads(request.form.get('selection') or 'null')
+        # 传入上一次结果的 id（download_url 的最后一段）时在该结果上增量布局，只重排编辑过的部分
+        previous_result = request.form.get('previous_result')
+        if selection:
+            preview_data = layout_selection(file.read(), selection, options, report=report)
+        elif previous_result:
+            with stored_results_lock:
+                previous = stored_results.get(previous_result)
+            if previous is None:
+                return jsonify({'error': 'Previous result not found', 'success': False}), 404
+            preview_data = relayout_workflow(file.read(), previous, options, report=report)
+        else:
+            preview_data = layout_workflow(file.read(), options, cache=layout_cache(), memo=stage_memo(), report=report)
+        payload = json.dumps(preview_data, ensure_ascii=False).encode('utf-8')
+        result_id = store_result(payload)
+        extra: Dict[str, Any] = {'report': report.as_dict()}
+        # 布局质量指标（交叉数、连线长度、重叠等）需要重新解析结果，只在请求带 metrics=1 时计算
+        if request.form.get('metrics', '').lower() in ('1', 'true'):
+            extra['metrics'] = LayoutMetrics.of_workflow(preview_data).measure()
+        return layout_response(payload, f'/download/{result_id}', **extra)
+
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -89,14 +148,72 @@ def generate_layout() -> tuple[Response, Literal[400]] | Response | tuple[Respon
         }), 500
 
 
-@app.route('/download/<filename>')
-def download_file(filename: str) -> tuple[Response, Literal[404]] | Response:
-    output_path: Path = app.config['temp'] / "output.json"
-    if not output_path.exists():
+@app.route('/jobs', methods=['POST'])
+def submit_job() -> tuple[Response, int]:
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    try:
+        job_id = job_queue().submit(file.read(), request_options())
+    except JobQueueFull as e:
+        response = jsonify({'error': str(e), 'success': False})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id: str) -> tuple[Response, Literal[404]] | Response:
+    status = job_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status['status'] == 'done':
+        status['result_url'] = f'/jobs/{job_id}/result'
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id: str) -> tuple[Response, int] | Response:
+    status = job_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status['status'] in ('failed', 'cancelled'):
+        return jsonify({'error': status.get('error', 'Job cancelled'), 'success': False}), 500
+    payload = job_queue().result(job_id)
+    if payload is None:
+        # 尚未完成，客户端继续轮询
+        return jsonify(status), 202
+    return layout_response(payload, f'/jobs/{job_id}/download')
+
+
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id: str) -> tuple[Response, Literal[404]] | Response:
+    payload = job_queue().result(job_id)
+    if payload is None:
+        return jsonify({'error': 'File not found'}), 404
+    return send_file(io.BytesIO(payload), mimetype='application/json', as_attachment=True, download_name='output.json')
+
+
+@app.route('/cache/stats')
+def cache_stats() -> Response:
+    return jsonify({**layout_cache().stats(), 'stage_memo': stage_memo().stats(), 'jobs': job_queue().stats()})
+
+
+@app.route('/download/<result_id>')
+def download_file(result_id: str) -> tuple[Response, Literal[404]] | Response:
+    with stored_results_lock:
+        payload = stored_results.get(result_id)
+    if payload is None:
         return jsonify({'error': 'File not found'}), 404
-    return send_file(output_path, as_attachment=True)
+    return send_file(io.BytesIO(payload), mimetype='application/json', as_attachment=True, download_name='output.json')
 
 
 if __name__ == '__main__':
-    app.run(debug=False)
+    # 打包成 exe 后进程池需要它才能正常启动子进程
+    multiprocessing.freeze_support()
+    # 每个请求使用独立的 LayoutOptions 和内存数据，可以放心开启多线程
+    app.run(debug=False, threaded=True)
 
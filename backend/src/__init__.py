@@ -1,4 +1,5 @@
-from .setting import NodeOptions, GroupOptions
+from .setting import NodeOptions, GroupOptions, LayoutOptions
+from .pipeline import layout_workflow, layout_workflow_data, relayout_workflow, layout_selection
 
 NodeOptions.load_setting()
 GroupOptions.load_setting()
@@ -0,0 +1,127 @@
+from typing import Dict, List, Tuple, Any, Iterator, Iterable, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from pathlib import Path
+import glob
+import json
+import time
+import os
+
+from .setting import LayoutOptions
+from .pipeline import layout_workflow
+
+
+
+@dataclass
+class BatchResult:
+    input_path: str
+    output_path: str
+    status: str
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+# 每个工作进程在初始化时解析一次设置，之后处理的所有文件共用
+_worker_options: Optional[LayoutOptions] = None
+
+
+def _init_worker(options: Dict[str, Any]) -> None:
+    global _worker_options
+    _worker_options = LayoutOptions.resolve(options)
+
+
+def _layout_file(input_path: str, output_path: str) -> BatchResult:
+    start = time.perf_counter()
+    try:
+        with open(input_path, "rb") as f:
+            result = layout_workflow(f.read(), _worker_options)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+    except Exception as e:
+        return BatchResult(input_path, output_path, "failed", time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    return BatchResult(input_path, output_path, "done", time.perf_counter() - start)
+
+
+class BatchLayout(object):
+    def __init__(
+            self,
+            output_dir: str | Path,
+            options: Dict[str, Any] | None = None,
+            workers: int | None = None,
+            force: bool = False
+        ) -> None:
+        self.output_dir = Path(output_dir).absolute()
+        self.options = options or {}
+        self.workers = workers or os.cpu_count() or 1
+        self.force = force
+
+    @staticmethod
+    def glob_base(pattern: str) -> Path:
+        # 通配符之前的目录部分，例如 a/b/**/*.json 的 a/b
+        parts = Path(pattern).parts
+        base = parts[:next((idx for idx, part in enumerate(parts) if glob.has_magic(part)), len(parts))]
+        return Path(*base) if base else Path(".")
+
+    def find_workflows(self, patterns: Iterable[str]) -> List[Tuple[Path, Path]]:
+        # 返回 (输入文件, 相对输出路径)；目录递归查找 *.json，通配符匹配的文件相对通配符之前的目录，都保留目录结构，
+        # 单个文件只保留文件名。两个输入对应同一个输出路径时抛出 ValueError，不让后处理的文件覆盖先处理的
+        found: Dict[Path, Path] = {}
+        for pattern in patterns:
+            path = Path(pattern)
+            if path.is_dir():
+                for file in sorted(path.rglob("*.json")):
+                    found.setdefault(file.absolute(), file.relative_to(path))
+            elif glob.has_magic(pattern):
+                base = self.glob_base(pattern).absolute()
+                for file in sorted(glob.glob(pattern, recursive=True)):
+                    if Path(file).is_file():
+                        found.setdefault(Path(file).absolute(), Path(file).absolute().relative_to(base))
+            else:
+                found.setdefault(path.absolute(), Path(path.name))
+        # 输出目录位于输入目录内时，不要把上一次的输出当作输入
+        workflows = [(file, rel) for file, rel in found.items() if self.output_dir not in file.parents]
+        owners: Dict[Path, Path] = {}
+        for file, rel in workflows:
+            if rel in owners:
+                raise ValueError(f"{owners[rel]} and {file} would both be written to {self.output_dir / rel}")
+            owners[rel] = file
+        return workflows
+
+    def is_up_to_date(self, input_path: Path, output_path: Path) -> bool:
+        if self.force or not output_path.exists():
+            return False
+        return output_path.stat().st_mtime >= input_path.stat().st_mtime
+
+    def run(self, patterns: Iterable[str]) -> Iterator[BatchResult]:
+        # 按完成顺序逐个产出结果，调用方可以边处理边输出
+        pending: List[Tuple[str, str]] = []
+        for input_path, rel in self.find_workflows(patterns):
+            output_path = self.output_dir / rel
+            if not input_path.is_file():
+                yield BatchResult(str(input_path), str(output_path), "failed", error="File not found")
+            elif self.is_up_to_date(input_path, output_path):
+                yield BatchResult(str(input_path), str(output_path), "skipped")
+            else:
+                pending.append((str(input_path), str(output_path)))
+        if not pending:
+            return
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(pending)),
+            initializer=_init_worker,
+            initargs=(self.options,)
+        ) as executor:
+            futures = [executor.submit(_layout_file, input_path, output_path) for input_path, output_path in pending]
+            for future in as_completed(futures):
+                yield future.result()
+
+    @staticmethod
+    def summary(results: List[BatchResult], wall_seconds: float) -> Dict[str, Any]:
+        counts = {status: sum(1 for result in results if result.status == status) for status in ("done", "skipped", "failed")}
+        return {
+            **counts,
+            "total": len(results),
+            "wall_seconds": wall_seconds,
+            "layout_seconds": sum(result.seconds for result in results),
+            "files": [asdict(result) for result in sorted(results, key=lambda result: result.input_path)],
+        }
@@ -0,0 +1,95 @@
+from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import os
+
+from .header import WorkflowData, Node, Link
+from .parser import WorkflowReader
+from .multilevel import MultilevelOrder
+from .pos_caculate import NodePosCalculator
+from .Utils import DataTool, AlgorithmTool
+from .setting import LayoutOptions
+from . import instrument
+
+
+
+def _order_component(nodes: List[Node], links: List[Link], options: LayoutOptions) -> List[List[int]]:
+    # 在子进程中只用连通分量自己的节点和连线重建工作流，排序结果与在完整工作流上排序相同
+    workflow_data = WorkflowData(nodes, links, [], {}, 0, 0, {})
+    return MultilevelOrder.logic_order(WorkflowReader(workflow_data), options, [node.id for node in nodes])
+
+
+class ComponentLayout(object):
+    # 弱连通分量互不相连，各自排序、布局后再用天际线装箱排到画布上
+    # 节点总数达到该阈值且分量不止一个时才启动进程池，小工作流上进程间传输的开销大于收益
+    parallel_threshold: int = 2000
+
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
+        self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
+
+    def split(self) -> List[List[int]]:
+        # 分量按其第一个节点在工作流中的顺序排列，分量内的节点保持工作流中的顺序
+        nodes = [node.id for node in self.workflow_reader.workflow_data.nodes]
+        position = {node: idx for idx, node in enumerate(nodes)}
+        components = AlgorithmTool.group_connected_nodes(self.workflow_reader.build_graph(nodes))
+        components = [sorted(component, key=position.__getitem__) for component in components]
+        return sorted(components, key=lambda component: position[component[0]])
+
+    def order(self, components: List[List[int]]) -> List[List[List[int]]]:
+        workers = self.options.node.component_workers or os.cpu_count() or 1
+        total = sum(len(component) for component in components)
+        if workers <= 1 or len(components) < 2 or total < self.parallel_threshold:
+            return [MultilevelOrder.logic_order(self.workflow_reader, self.options, component) for component in components]
+        # 只把排序用到的数据（节点 id、类型和连线）发给子进程
+        id_to_node = self.workflow_reader.id_to_node
+        graph_index = self.workflow_reader.graph_index
+        with ProcessPoolExecutor(max_workers=min(workers, len(components))) as executor:
+            futures = [
+                executor.submit(
+                    _order_component,
+                    [replace(id_to_node[node], inputs=[], outputs=[], widgets_values=None) for node in component],
+                    graph_index.inner_links(component),
+                    self.options
+                )
+                for component in components
+            ]
+            result = [future.result() for future in futures]
+        instrument.count("components_parallel", len(components))
+        return result
+
+    @staticmethod
+    def merge_columns(component_columns: List[List[List[int]]]) -> List[List[int]]:
+        # 各分量的第 i 列合并成整体的第 i 列，供后续只需要列号的阶段使用
+        columns: List[List[int]] = []
+        for component in component_columns:
+            for idx, column in enumerate(component):
+                if idx == len(columns):
+                    columns.append([])
+                columns[idx].extend(column)
+        return columns
+
+    def place(self, component_columns: List[List[List[int]]]) -> None:
+        # 只有排序在子进程中并行，放置在主进程中逐个分量进行：放置与节点数成线性，
+        # 把带尺寸和端口的完整节点发给子进程再取回坐标，传输的开销与放置本身相当
+        node_opt = self.options.node
+        pos_caculator = NodePosCalculator(self.workflow_reader, self.options)
+        for columns in component_columns:
+            pos_caculator.modify_node_layout(columns, align=node_opt.calculator_align, method=node_opt.layout_calculator)
+        if len(component_columns) > 1:
+            self.pack(component_columns)
+
+    def pack(self, component_columns: List[List[List[int]]]) -> None:
+        # 包围盒四周留出 gap_x / gap_y，画布宽度取总面积开方的 1.2 倍（接近 4:3），最宽的分量放不下时以它为准
+        gap_x, gap_y = self.options.node.gap_x, self.options.node.gap_y
+        components = [list(DataTool.flatten_generator(columns)) for columns in component_columns]
+        boxes = [self.workflow_reader.bounding_box(nodes) for nodes in components]
+        sizes = [(x1 - x0 + gap_x, y1 - y0 + gap_y) for x0, y0, x1, y1 in boxes]
+        max_width = sum(width * height for width, height in sizes) ** 0.5 * 1.2
+        positions = AlgorithmTool.skyline_pack(sizes, max_width)
+        id_to_node = self.workflow_reader.id_to_node
+        for nodes, (x0, y0, _, _), (x, y) in zip(components, boxes, positions):
+            dx, dy = x - x0, y - y0
+            for node in nodes:
+                id_to_node[node].pos.x += dx
+                id_to_node[node].pos.y += dy
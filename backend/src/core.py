@@ -1,9 +1,10 @@
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Iterable
 from collections import defaultdict
 
 from .parser import WorkflowReader
 from .Utils import DataTool, AlgorithmTool
-from .setting import NodeOptions
+from .setting import LayoutOptions
+from . import instrument
 
 
 
@@ -19,8 +20,12 @@ class StandardOrder(object):
         6: (4, 4),
         7: (5, 5)
     }
-    def __init__(self, workflow_reader: WorkflowReader) -> None:
+    # adjacent_swap 每一列最多扫描的轮数；不设上限时块数多的列是平方复杂度
+    swap_passes: int = 8
+
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
         self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
 
     def column_forward(self, columns: List[List[int]]) -> None:
         if len(columns) < 3:
@@ -30,7 +35,8 @@ class StandardOrder(object):
         out_edges = self.workflow_reader.build_graph(nodes, output_graph=True)
         id_to_node = self.workflow_reader.id_to_node
         node_to_col = self.workflow_reader.node_to_col(columns)
-        (x0, x1) = StandardOrder.same_column_stacking_strength_table.get(NodeOptions.same_column_stacking_strength, (1, 1))
+        (x0, x1) = StandardOrder.same_column_stacking_strength_table.get(self.options.node.same_column_stacking_strength, (1, 1))
+        moved = 0
         for col_idx in range(len(columns) - 2, -1, -1):
             for node in columns[col_idx].copy():
                 out_nodes = out_edges.get(node, [])
@@ -47,6 +53,8 @@ class StandardOrder(object):
                 columns[col_idx].remove(node)
                 columns[move_new_col].append(node)
                 node_to_col[node] = move_new_col
+                moved += move_new_col != col_idx
+        instrument.count("column_forward_moves", moved)
         columns[:] = [col for col in columns if col]
 
     def normalize_relations(self, left_col: List[int], right_col: List[int]) -> Tuple[List[int], List[Tuple[int, int]]]:
@@ -54,12 +62,13 @@ class StandardOrder(object):
         virtual_right_col = []
         virtual_normalize_connections: list[Tuple[int, int]] = list()
         virtual_node_id = max(max(left_col), max(right_col)) + 1
-        right_port_map: defaultdict[int, List[Tuple]] = defaultdict(list)
-        for link in self.workflow_reader.workflow_data.links:
-            if link.input_node_id in left_col and link.output_node_id in right_col:
-                right_port_map[link.output_node_id].append((link.input_node_id, link.output_port))
+        left_nodes = set(left_col)
+        graph_index = self.workflow_reader.graph_index
         for r in right_col:
-            node_links = right_port_map[r]
+            node_links = [
+                (link.input_node_id, link.output_port)
+                for link in graph_index.links_to(r) if link.input_node_id in left_nodes
+            ]
             if not node_links:
                 virtual_right_col.append(r)
             elif len(node_links) == 1:
@@ -73,35 +82,134 @@ class StandardOrder(object):
                     virtual_node_id += 1
         return virtual_right_col, virtual_normalize_connections
 
-    def build_group_nodes_map(self, column: List[int], outer_links: List[Tuple[int, int]], start_id: int) -> Tuple[Dict[int, List[int]], List[Tuple[int, int]]]:
-        group_nodes = dict()
+    def column_blocks(self, column: List[int]) -> List[List[int]]:
+        # 同列中有连线的节点组成一个块整体移动，块内按 branched_sort 排序
         graph = self.workflow_reader.build_graph(column)
         inner_link = [
             (i.input_node_id, i.input_port, i.output_node_id, i.output_port)
-            for i in self.workflow_reader.workflow_data.links
+            for i in self.workflow_reader.graph_index.inner_links(column)
         ]
         # groups指这些节点间有直接或间接的关系
         groups = AlgorithmTool.group_connected_nodes(graph)
-        for group in groups:
-            result = AlgorithmTool.branched_sort(group, inner_link)
-            for idx, outer_link in enumerate(outer_links.copy()):
-                if outer_link[0] in group:
-                    outer_links[idx] = (start_id, outer_link[1])
-            group_nodes[start_id] = list(DataTool.flatten_generator(result))
-            start_id += 1
-        return group_nodes, outer_links
-    
+        # 连线的两端必然在同一个组里，先按组分好，每个组只排序自己的连线
+        node_group = {node: idx for idx, group in enumerate(groups) for node in group}
+        group_links: defaultdict[int, List[Tuple[int, int, int, int]]] = defaultdict(list)
+        for link in inner_link:
+            group_links[node_group[link[0]]].append(link)
+        return [
+            list(DataTool.flatten_generator(AlgorithmTool.branched_sort(group, group_links[idx])))
+            for idx, group in enumerate(groups)
+        ]
+
+    def right_positions(self, left_col: List[int], right_col: List[int]) -> Tuple[Dict[int, List[int]], int]:
+        # 左列每个节点连向右列的位置；右列按 normalize_relations 展开成端口，多输入节点按端口顺序占多个位置
+        virtual_right_col, virtual_links = self.normalize_relations(left_col, right_col)
+        virtual_index = {node: idx for idx, node in enumerate(virtual_right_col)}
+        positions: Dict[int, List[int]] = defaultdict(list)
+        for left_node, right_node in virtual_links:
+            positions[left_node].append(virtual_index[right_node])
+        return positions, len(virtual_right_col)
+
+    def left_positions(self, left_col: List[int], right_col: List[int]) -> Dict[int, List[int]]:
+        # 右列每个节点的输入来自左列的位置
+        left_index = {node: idx for idx, node in enumerate(left_col)}
+        graph_index = self.workflow_reader.graph_index
+        return {
+            node: [left_index[link.input_node_id] for link in graph_index.links_to(node) if link.input_node_id in left_index]
+            for node in right_col
+        }
+
+    def count_crossings(self, columns: List[List[int]], targets: Iterable[int] | None = None) -> int:
+        # targets 给出时只统计与这些列相邻的列间，其余列间的交叉数不受这些列的顺序影响
+        pairs = range(len(columns) - 1) if targets is None else sorted(
+            {pair for col in targets for pair in (col - 1, col) if 0 <= pair < len(columns) - 1}
+        )
+        crossings = 0
+        for col in pairs:
+            left_index = {node: idx for idx, node in enumerate(columns[col])}
+            positions, right_size = self.right_positions(columns[col], columns[col + 1])
+            edges = [(left_index[node], position) for node, node_positions in positions.items() for position in node_positions]
+            crossings += AlgorithmTool.count_crossings(edges, right_size)
+        return crossings
+
+    @staticmethod
+    def reorder(columns: List[List[int]], blocks: List[List[List[int]]], col: int, order: List[int]) -> None:
+        blocks[col] = [blocks[col][idx] for idx in order]
+        columns[col] = list(DataTool.flatten_generator(blocks[col]))
+
+    def sweep_up(self, columns: List[List[int]], blocks: List[List[List[int]]], heuristic: str, targets: Iterable[int] | None = None) -> None:
+        # 从右往左，右列固定，按块连向右列端口的位置重排左列；targets 给出时只重排这些列
+        for col in range(len(columns) - 2, -1, -1) if targets is None else sorted((col for col in targets if col < len(columns) - 1), reverse=True):
+            positions, right_size = self.right_positions(columns[col], columns[col + 1])
+            block_positions = [[p for node in block for p in positions.get(node, ())] for block in blocks[col]]
+            self.reorder(columns, blocks, col, AlgorithmTool.order_by_neighbors(block_positions, (right_size - 1) / 2, heuristic))
+
+    def sweep_down(self, columns: List[List[int]], blocks: List[List[List[int]]], heuristic: str, targets: Iterable[int] | None = None) -> None:
+        # 从左往右，左列固定，按块输入在左列中的位置重排右列；targets 给出时只重排这些列
+        for col in range(1, len(columns)) if targets is None else sorted(col for col in targets if col > 0):
+            positions = self.left_positions(columns[col - 1], columns[col])
+            block_positions = [[p for node in block for p in positions[node]] for block in blocks[col]]
+            default = (len(columns[col - 1]) - 1) / 2
+            self.reorder(columns, blocks, col, AlgorithmTool.order_by_neighbors(block_positions, default, heuristic))
+
+    @staticmethod
+    def already_ordered(upper: List[int], lower: List[int]) -> bool:
+        return not upper or not lower or upper[-1] <= lower[0]
+
+    def adjacent_swap(self, columns: List[List[int]], blocks: List[List[List[int]]], targets: Iterable[int] | None = None) -> None:
+        # 两侧邻列固定，反复交换相邻的块，只要交换后与两侧的交叉数之和变小；targets 给出时只处理这些列
+        for col in range(len(columns)) if targets is None else targets:
+            if len(blocks[col]) < 2:
+                continue
+            left = self.left_positions(columns[col - 1], columns[col]) if col > 0 else {}
+            right = self.right_positions(columns[col], columns[col + 1])[0] if col + 1 < len(columns) else {}
+            left_keys = [sorted(p for node in block for p in left.get(node, ())) for block in blocks[col]]
+            right_keys = [sorted(p for node in block for p in right.get(node, ())) for block in blocks[col]]
+            order = list(range(len(blocks[col])))
+            for _ in range(self.swap_passes):
+                swapped = False
+                for idx in range(len(order) - 1):
+                    upper, lower = order[idx], order[idx + 1]
+                    # 两侧的位置区间都已经是上块在上时交换只会更差，省去计数
+                    if self.already_ordered(left_keys[upper], left_keys[lower]) and self.already_ordered(right_keys[upper], right_keys[lower]):
+                        continue
+                    current = (AlgorithmTool.pair_crossings(left_keys[upper], left_keys[lower])
+                               + AlgorithmTool.pair_crossings(right_keys[upper], right_keys[lower]))
+                    exchanged = (AlgorithmTool.pair_crossings(left_keys[lower], left_keys[upper])
+                                 + AlgorithmTool.pair_crossings(right_keys[lower], right_keys[upper]))
+                    if exchanged < current:
+                        order[idx], order[idx + 1] = lower, upper
+                        swapped = True
+                if not swapped:
+                    break
+            self.reorder(columns, blocks, col, order)
+
     def up_down_adjust(self, columns: List[List[int]]) -> None:
         if len(columns) < 2:
             return
-        for col in range(len(columns) - 2, -1, -1):
-            left_col = columns[col]
-            right_col = columns[col + 1]
-            virtual_right_col, virtual_links = self.normalize_relations(left_col, right_col)
-            group_node_start_id = max(max(left_col), max(virtual_right_col)) + 1
-            group_nodes_map, group_links = self.build_group_nodes_map(left_col, virtual_links, group_node_start_id)
-            sorted_res = AlgorithmTool.gravity_sort(list(group_nodes_map.keys()), virtual_right_col, group_links)
-            columns[col] = list(DataTool.flatten_generator(group_nodes_map[i] for i in sorted_res))
+        heuristic = self.options.node.crossing_heuristic
+        # 列的成员在排序过程中不变，块只需划分一次
+        blocks = [self.column_blocks(column) for column in columns]
+        # 第一遍从右往左排序（与原先的单遍排序一致），之后交替上下扫描并交换相邻块，
+        # 交叉数不再下降时停止并保留最好的结果
+        self.sweep_up(columns, blocks, heuristic)
+        if self.options.node.crossing_sweeps <= 0:
+            return
+        best = [column.copy() for column in columns]
+        best_crossings = self.count_crossings(columns)
+        for _ in range(self.options.node.crossing_sweeps):
+            if best_crossings == 0:
+                break
+            instrument.count("crossing_sweeps")
+            self.sweep_down(columns, blocks, heuristic)
+            self.sweep_up(columns, blocks, heuristic)
+            self.adjacent_swap(columns, blocks)
+            crossings = self.count_crossings(columns)
+            if crossings >= best_crossings:
+                break
+            best = [column.copy() for column in columns]
+            best_crossings = crossings
+        columns[:] = best
 
     def get_logic_order(self, nodes: List[int]) -> List[List[int]]:
         out_edges = self.workflow_reader.build_graph(nodes)
@@ -113,12 +221,12 @@ class StandardOrder(object):
 
 
 class MainBranchShader:
-    def __init__(self, workflow_reader: WorkflowReader) -> None:
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
         self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
     
     def find_main_path(self, nodes: List[int]) -> List[int]:
-        links = [(i.input_node_id, i.output_node_id) for i in self.workflow_reader.workflow_data.links]
-        graph = self.workflow_reader.build_graph(nodes=nodes, links=links, output_graph=True)
+        graph = self.workflow_reader.build_graph(nodes=nodes, output_graph=True)
         
         topological_layers = AlgorithmTool.topological_sort(graph)
         topological_order = list(DataTool.flatten_generator(topological_layers))
@@ -146,8 +254,8 @@ class MainBranchShader:
         return main_path
 
     def set_color_for_main_path(self, nodes: List[int]) -> None:
-        color = NodeOptions.main_path_color
-        bgcolor = NodeOptions.main_path_bg_color
+        color = self.options.node.main_path_color
+        bgcolor = self.options.node.main_path_bg_color
         main_path = set(self.find_main_path(nodes))
         for node in self.workflow_reader.workflow_data.nodes:
             if node.id in main_path:
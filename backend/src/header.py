@@ -1,5 +1,9 @@
-from dataclasses import dataclass, fields
-from typing import List, Dict, Any, Self, Union
+from dataclasses import dataclass, field, fields, replace
+import copy
+from typing import List, Dict, Any, Self, Union, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .index import GraphIndex
 
 
 @dataclass
@@ -28,6 +32,10 @@ class NodeProperty:
         else:
             raise TypeError(f"Unsupported type for {cls.__name__} creation")
 
+    def __reduce__(self):
+        # 子类把 __dict__ 改写成了导出用的 {"0": .., "1": ..}，默认的 pickle 会读到它，发给子进程时按字段重建
+        return type(self), tuple(getattr(self, field.name) for field in fields(self))
+
 
 @dataclass
 class NodePos(NodeProperty):
@@ -77,6 +85,20 @@ class Node:
             bgcolor=node_dict.get("bgcolor", "#533")
         )
 
+    def clone(self) -> Self:
+        # 只复制布局过程中会被修改的部分：坐标、尺寸、flags 以及端口上的 link/links
+        return replace(
+            self,
+            pos=NodePos(self.pos.x, self.pos.y),
+            size=NodeSize(self.size.width, self.size.height),
+            inputs=[dict(slot) for slot in self.inputs],
+            outputs=[
+                {**slot, "links": list(slot["links"])} if isinstance(slot.get("links"), list) else dict(slot)
+                for slot in self.outputs
+            ],
+            flags=copy.deepcopy(self.flags)
+        )
+
 
 @dataclass
 class Link:
@@ -121,6 +143,9 @@ class Group:
             flags=group_dict.get("flags", {})
         )
 
+    def clone(self) -> Self:
+        return replace(self, bounding=list(self.bounding))
+
 
 @dataclass
 class WorkflowData:
@@ -131,6 +156,7 @@ class WorkflowData:
     last_node_id: int
     last_link_id: int
     raw_data: dict
+    graph_index: Optional["GraphIndex"] = field(default=None, init=False, repr=False, compare=False)
 
     @classmethod
     def from_dict(cls, workflow_dict: Dict[str, Any]) -> Self:
@@ -144,3 +170,19 @@ class WorkflowData:
             raw_data=workflow_dict
         )
 
+    def clone(self) -> Self:
+        # raw_data 与原对象共享（导出时不修改原始数据即可），只有会被就地修改的 extra 单独复制
+        raw_data = dict(self.raw_data)
+        extra = copy.deepcopy(self.extra)
+        if "extra" in raw_data:
+            raw_data["extra"] = extra
+        return WorkflowData(
+            nodes=[node.clone() for node in self.nodes],
+            links=[replace(link) for link in self.links],
+            groups=[group.clone() for group in self.groups],
+            extra=extra,
+            last_node_id=self.last_node_id,
+            last_link_id=self.last_link_id,
+            raw_data=raw_data
+        )
+
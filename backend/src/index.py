@@ -0,0 +1,141 @@
+from typing import Dict, List, Tuple, Sequence, Iterable, Optional
+from collections import defaultdict
+
+from .header import WorkflowData, Node, Link
+
+
+
+class GraphIndex(object):
+    # 同一个 WorkflowData 上的所有 WorkflowGraph 共享一份索引，由 WorkflowWriter 增量维护
+    def __init__(self, workflow_data: WorkflowData) -> None:
+        self.id_to_node: Dict[int, Node] = {node.id: node for node in workflow_data.nodes}
+        self.id_to_link: Dict[int, Link] = {}
+        self.out_links: defaultdict[int, Dict[int, Link]] = defaultdict(dict)
+        self.in_links: defaultdict[int, Dict[int, Link]] = defaultdict(dict)
+        self.input_port_links: defaultdict[Tuple[int, int], Dict[int, Link]] = defaultdict(dict)
+        self.output_port_links: defaultdict[Tuple[int, int], Dict[int, Link]] = defaultdict(dict)
+        self.type_links: defaultdict[str, Dict[int, Link]] = defaultdict(dict)
+        for link in workflow_data.links:
+            self.add_link(link)
+
+    @classmethod
+    def of(cls, workflow_data: WorkflowData) -> "GraphIndex":
+        if workflow_data.graph_index is None:
+            workflow_data.graph_index = cls(workflow_data)
+        return workflow_data.graph_index
+
+    def add_node(self, node: Node) -> None:
+        self.id_to_node[node.id] = node
+
+    def remove_node(self, node_id: int) -> None:
+        self.id_to_node.pop(node_id, None)
+        for link in list(self.out_links.pop(node_id, {}).values()):
+            self.remove_link(link)
+        for link in list(self.in_links.pop(node_id, {}).values()):
+            self.remove_link(link)
+
+    def add_link(self, link: Link) -> None:
+        link_id = link.link_id
+        self.id_to_link[link_id] = link
+        self.out_links[link.input_node_id][link_id] = link
+        self.in_links[link.output_node_id][link_id] = link
+        self.input_port_links[(link.input_node_id, link.input_port)][link_id] = link
+        self.output_port_links[(link.output_node_id, link.output_port)][link_id] = link
+        self.type_links[link.link_type][link_id] = link
+
+    def remove_link(self, link: Link) -> None:
+        link_id = link.link_id
+        if self.id_to_link.pop(link_id, None) is None:
+            return
+        self._discard(self.out_links, link.input_node_id, link_id)
+        self._discard(self.in_links, link.output_node_id, link_id)
+        self._discard(self.input_port_links, (link.input_node_id, link.input_port), link_id)
+        self._discard(self.output_port_links, (link.output_node_id, link.output_port), link_id)
+        self._discard(self.type_links, link.link_type, link_id)
+
+    @staticmethod
+    def _discard(buckets: Dict, key, link_id: int) -> None:
+        bucket = buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(link_id, None)
+        if not bucket:
+            del buckets[key]
+
+    def query(
+        self,
+        input_node_id: Optional[int] = None,
+        input_port: Optional[int] = None,
+        output_node_id: Optional[int] = None,
+        output_port: Optional[int] = None,
+        link_type: Optional[str] = None,
+    ) -> List[Link]:
+        buckets: List[Dict[int, Link]] = []
+        residual: List[Tuple[str, int]] = []
+        if input_node_id is not None:
+            if input_port is not None:
+                buckets.append(self.input_port_links.get((input_node_id, input_port), {}))
+            else:
+                buckets.append(self.out_links.get(input_node_id, {}))
+        elif input_port is not None:
+            residual.append(("input_port", input_port))
+        if output_node_id is not None:
+            if output_port is not None:
+                buckets.append(self.output_port_links.get((output_node_id, output_port), {}))
+            else:
+                buckets.append(self.in_links.get(output_node_id, {}))
+        elif output_port is not None:
+            residual.append(("output_port", output_port))
+        if link_type is not None:
+            buckets.append(self.type_links.get(link_type, {}))
+
+        if not buckets and not residual:
+            return list()
+        # 从最小的桶出发，其余条件只做 O(1) 的成员判断
+        buckets.sort(key=len)
+        candidates = buckets[0] if buckets else self.id_to_link
+        others = buckets[1:]
+        return [
+            link for link_id, link in candidates.items()
+            if all(link_id in bucket for bucket in others)
+            and all(getattr(link, attr_name) == value for attr_name, value in residual)
+        ]
+
+    def successors(self, node_id: int) -> List[int]:
+        return [link.output_node_id for link in self.out_links.get(node_id, {}).values()]
+
+    def predecessors(self, node_id: int) -> List[int]:
+        return [link.input_node_id for link in self.in_links.get(node_id, {}).values()]
+
+    def links_from(self, node_id: int, port: int | None = None) -> List[Link]:
+        if port is None:
+            return list(self.out_links.get(node_id, {}).values())
+        return list(self.input_port_links.get((node_id, port), {}).values())
+
+    def links_to(self, node_id: int, port: int | None = None) -> List[Link]:
+        if port is None:
+            return list(self.in_links.get(node_id, {}).values())
+        return list(self.output_port_links.get((node_id, port), {}).values())
+
+    def subgraph(self, nodes: Sequence[int], output_graph: bool = True) -> Dict[int, List[int]]:
+        # O(V+E)：只遍历子图内节点的邻接表，保留重复边（重复边代表多根线）
+        edges: Dict[int, List[int]] = {node: [] for node in nodes}
+        if output_graph:
+            for node, neighbors in edges.items():
+                for link in self.out_links.get(node, {}).values():
+                    if link.output_node_id in edges:
+                        neighbors.append(link.output_node_id)
+        else:
+            for node, neighbors in edges.items():
+                for link in self.in_links.get(node, {}).values():
+                    if link.input_node_id in edges:
+                        neighbors.append(link.input_node_id)
+        return edges
+
+    def inner_links(self, nodes: Iterable[int]) -> List[Link]:
+        node_set = dict.fromkeys(nodes)
+        return [
+            link for node in node_set
+            for link in self.out_links.get(node, {}).values()
+            if link.output_node_id in node_set
+        ]
@@ -0,0 +1,182 @@
+from typing import Dict, List, Tuple, Any
+from collections import defaultdict
+import math
+
+from .header import WorkflowData, Node, Link
+from .parser import WorkflowReader
+from .core import MainBranchShader
+from .Utils import AlgorithmTool
+from .spatial import SpatialGrid, Point, Rect
+from .setting import LayoutOptions, COLLAPSE_HEIGHT
+
+
+
+class LayoutMetrics(object):
+    # ComfyUI 中端口的行高，第 slot 个端口的中心在 pos.y + (slot + 0.7) * slot_height
+    slot_height: int = 20
+
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
+        self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
+
+    @classmethod
+    def of_workflow(cls, workflow_dict: Dict[str, Any], options: LayoutOptions | None = None) -> "LayoutMetrics":
+        # 直接测量 layout_workflow 的输出，只读取数据，不修改 workflow_dict
+        return cls(WorkflowReader(WorkflowData.from_dict(workflow_dict)), options)
+
+    @staticmethod
+    def rect(node: Node) -> Rect:
+        size = WorkflowReader.real_size(node)
+        return (node.pos.x, node.pos.y, node.pos.x + size.width, node.pos.y + size.height)
+
+    def port_point(self, node: Node, slot: int, output: bool) -> Point:
+        x0, y0, x1, _ = self.rect(node)
+        x = x1 if output else x0
+        if node.flags and node.flags.get("collapsed", False):
+            # 折叠节点的连线都连在标题栏中央
+            return x, y0 - COLLAPSE_HEIGHT / 2
+        return x, y0 + (slot + 0.7) * self.slot_height
+
+    def derive_columns(self) -> List[List[int]]:
+        # 没有传入 columns 时按 x 坐标分列（同列节点的 x 相同），列内按 y 排序
+        by_x: defaultdict[float, List[Node]] = defaultdict(list)
+        for node in self.workflow_reader.workflow_data.nodes:
+            by_x[node.pos.x].append(node)
+        return [
+            [node.id for node in sorted(by_x[x], key=lambda node: node.pos.y)]
+            for x in sorted(by_x)
+        ]
+
+    def link_segments(self) -> List[Tuple[Link, Point, Point]]:
+        # 连线按直线段近似：上游节点的输出端口 -> 下游节点的输入端口
+        id_to_node = self.workflow_reader.id_to_node
+        segments = []
+        for link in self.workflow_reader.workflow_data.links:
+            source = id_to_node.get(link.input_node_id)
+            target = id_to_node.get(link.output_node_id)
+            if source is None or target is None:
+                continue
+            segments.append((
+                link,
+                self.port_point(source, link.input_port, True),
+                self.port_point(target, link.output_port, False)
+            ))
+        return segments
+
+    @staticmethod
+    def crossings(node_to_col: Dict[int, int], segments: List[Tuple[Link, Point, Point]]) -> int:
+        # 只统计相邻两列之间的连线，两列之间的交叉数即 (起点 y, 终点 y) 排序后终点 y 的逆序对数
+        between: defaultdict[int, List[Tuple[float, float]]] = defaultdict(list)
+        for link, start, end in segments:
+            col = node_to_col.get(link.input_node_id)
+            if col is not None and node_to_col.get(link.output_node_id) == col + 1:
+                between[col].append((start[1], end[1]))
+        crossings = 0
+        for edges in between.values():
+            rank = {y: idx for idx, y in enumerate(sorted({end_y for _, end_y in edges}))}
+            crossings += AlgorithmTool.count_crossings([(start_y, rank[end_y]) for start_y, end_y in edges], len(rank))
+        return crossings
+
+    @staticmethod
+    def column_spans(node_to_col: Dict[int, int], segments: List[Tuple[Link, Point, Point]]) -> List[int]:
+        return [
+            node_to_col[link.output_node_id] - node_to_col[link.input_node_id]
+            for link, _, _ in segments
+            if link.input_node_id in node_to_col and link.output_node_id in node_to_col
+        ]
+
+    @staticmethod
+    def segment_hits_rect(start: Point, end: Point, rect: Rect) -> bool:
+        # Liang-Barsky 裁剪，线段在矩形内部的部分长度大于 0 才算穿过
+        (x0, y0), (x1, y1) = start, end
+        dx, dy = x1 - x0, y1 - y0
+        t0, t1 = 0.0, 1.0
+        for p, q in ((-dx, x0 - rect[0]), (dx, rect[2] - x0), (-dy, y0 - rect[1]), (dy, rect[3] - y0)):
+            if p == 0:
+                if q <= 0:
+                    return False
+                continue
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 >= t1:
+                return False
+        return True
+
+    def links_through_nodes(self, node_ids: List[int], grid: SpatialGrid, segments: List[Tuple[Link, Point, Point]]) -> int:
+        # 穿过其他节点（不含连线两端的节点）的连线数，每根线只计一次
+        through = 0
+        for link, start, end in segments:
+            endpoints = (link.input_node_id, link.output_node_id)
+            for idx in grid.along_segment(start, end):
+                if node_ids[idx] not in endpoints and self.segment_hits_rect(start, end, grid.rects[idx]):
+                    through += 1
+                    break
+        return through
+
+    def main_path_straightness(self) -> Dict[str, float | int]:
+        # 主路径上相邻节点中心的连线总长与首尾直线距离之比，1 表示完全水平对齐
+        nodes = [node.id for node in self.workflow_reader.workflow_data.nodes]
+        if not nodes:
+            return {"main_path_nodes": 0, "main_path_straightness": 1.0, "main_path_y_deviation": 0.0}
+        main_path = MainBranchShader(self.workflow_reader, self.options).find_main_path(nodes)
+        centers = []
+        for node_id in main_path:
+            x0, y0, x1, y1 = self.rect(self.workflow_reader.id_to_node[node_id])
+            centers.append(((x0 + x1) / 2, (y0 + y1) / 2))
+        path_length = sum(math.dist(a, b) for a, b in zip(centers, centers[1:]))
+        deviation = sum(abs(a[1] - b[1]) for a, b in zip(centers, centers[1:]))
+        straightness = math.dist(centers[0], centers[-1]) / path_length if path_length else 1.0
+        return {
+            "main_path_nodes": len(main_path),
+            "main_path_straightness": straightness,
+            "main_path_y_deviation": deviation
+        }
+
+    def measure(self, columns: List[List[int]] | None = None) -> Dict[str, Any]:
+        # 在 modify_node_layout 之后调用；排序 + 网格分桶，整体接近 O((V+E) log V)
+        columns = columns if columns is not None else self.derive_columns()
+        node_to_col = self.workflow_reader.node_to_col(columns)
+        nodes = self.workflow_reader.workflow_data.nodes
+        node_ids = [node.id for node in nodes]
+        rects = [self.rect(node) for node in nodes]
+        grid = SpatialGrid.of_rects(rects)
+        segments = self.link_segments()
+        lengths = [math.dist(start, end) for _, start, end in segments]
+        spans = self.column_spans(node_to_col, segments)
+        overlaps = [area for _, _, area in grid.overlapping_pairs()]
+        metrics: Dict[str, Any] = {
+            "nodes": len(nodes),
+            "links": len(segments),
+            "columns": len(columns),
+            "crossings": self.crossings(node_to_col, segments),
+            "total_link_length": sum(lengths),
+            "max_link_length": max(lengths, default=0.0),
+            "mean_link_length": sum(lengths) / len(lengths) if lengths else 0.0,
+            "max_column_span": max((abs(span) for span in spans), default=0),
+            "mean_column_span": sum(abs(span) for span in spans) / len(spans) if spans else 0.0,
+            # 跨越多列的连线、同列堆叠的连线以及指向左侧的连线
+            "long_links": sum(1 for span in spans if span > 1),
+            "same_column_links": sum(1 for span in spans if span == 0),
+            "backward_links": sum(1 for span in spans if span < 0),
+            "overlapping_pairs": len(overlaps),
+            "overlap_area": float(sum(overlaps)),
+            "links_through_nodes": self.links_through_nodes(node_ids, grid, segments),
+        }
+        if rects:
+            width = max(rect[2] for rect in rects) - min(rect[0] for rect in rects)
+            height = max(rect[3] for rect in rects) - min(rect[1] for rect in rects)
+        else:
+            width = height = 0
+        area = width * height
+        metrics.update({
+            "bbox_width": width,
+            "bbox_height": height,
+            "bbox_area": area,
+            # 节点面积之和占包围盒面积的比例，越大布局越紧凑
+            "node_area_ratio": sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects) / area if area else 0.0,
+        })
+        metrics.update(self.main_path_straightness())
+        return {key: round(value, 3) if isinstance(value, float) else value for key, value in metrics.items()}
@@ -0,0 +1,142 @@
+from typing import Dict, List, Tuple
+from dataclasses import replace
+
+from .header import WorkflowData, Link
+from .parser import WorkflowReader
+from .core import StandardOrder
+from .setting import LayoutOptions
+from . import instrument
+
+
+
+class MultilevelOrder(object):
+    # 多层排序：只有一个下游的节点并入下游，收缩成以没有下游或有多个下游的节点为根的树，每棵树成为一个超节点，
+    # 在粗化后的图上排序，最后把每个超节点按深度展开回若干相邻的列。
+    # 粗图上原来连向不同节点的线可能落到同一个超节点上，又出现只有一个下游的节点，
+    # 收缩后节点数不超过原来的 min_reduction 且不少于 min_coarse_nodes 时再收缩一层，否则直接排序
+    min_reduction: float = 0.8
+    min_coarse_nodes: int = 200
+    # 粗图上相邻块交换的轮数上限，保证排序的耗时随节点数近似线性增长
+    swap_passes: int = 2
+
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
+        self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
+
+    @staticmethod
+    def logic_order(workflow_reader: WorkflowReader, options: LayoutOptions, nodes: List[int]) -> List[List[int]]:
+        # 节点数达到 multilevel_threshold（大于 0）时使用多层排序，否则直接用 StandardOrder
+        threshold = options.node.multilevel_threshold
+        if threshold > 0 and len(nodes) >= threshold:
+            return MultilevelOrder(workflow_reader, options).get_logic_order(nodes)
+        return StandardOrder(workflow_reader, options).get_logic_order(nodes=nodes)
+
+    def find_trees(self, nodes: List[int]) -> Dict[int, List[List[int]]]:
+        # 所有输出都连向同一个节点的节点是它的子节点，固定列的节点不并入下游。
+        # 每棵树按深度分层，第 k 层是到根距离为 k 的节点，同一父节点的子节点按连入父节点的最小端口排序；
+        # 树按根在 nodes 中的顺序排列
+        graph_index = self.workflow_reader.graph_index
+        id_to_node = self.workflow_reader.id_to_node
+        node_set = set(nodes)
+        children: Dict[int, List[Tuple[int, int]]] = {}
+        roots: List[int] = []
+        for node in nodes:
+            out_links = [link for link in graph_index.links_from(node) if link.output_node_id in node_set]
+            consumers = {link.output_node_id for link in out_links}
+            if len(consumers) == 1 and id_to_node[node].type not in StandardOrder.fixed_col_nodes:
+                port = min(link.output_port for link in out_links)
+                children.setdefault(consumers.pop(), []).append((port, node))
+            else:
+                roots.append(node)
+        trees: Dict[int, List[List[int]]] = {}
+        for root in roots:
+            levels = [[root]]
+            while True:
+                level = [child for node in levels[-1] for _, child in sorted(children.get(node, ()))]
+                if not level:
+                    break
+                levels.append(level)
+            trees[root] = levels
+        return trees
+
+    def coarse_workflow(self, trees: Dict[int, List[List[int]]], owner: Dict[int, int]) -> WorkflowData:
+        # 超节点沿用根节点的 id 和类型；树内的连线都连向父节点，只需要看根连出的线。
+        # 两个超节点之间的多根线只保留连入端口最小的一根，粗图排序的耗时随连线数增长
+        id_to_node = self.workflow_reader.id_to_node
+        pair_links: Dict[Tuple[int, int], Link] = {}
+        for root in trees:
+            for link in self.workflow_reader.graph_index.links_from(root):
+                target = owner.get(link.output_node_id)
+                if target is None or target == root:
+                    continue
+                kept = pair_links.get((root, target))
+                if kept is None or link.output_port < kept.output_port:
+                    pair_links[(root, target)] = link
+        links = [replace(link, output_node_id=target) for (_, target), link in pair_links.items()]
+        nodes = [id_to_node[root] for root in trees]
+        return WorkflowData(nodes, links, [], {}, 0, 0, {})
+
+    @staticmethod
+    def expand(coarse_columns: List[List[int]], trees: Dict[int, List[List[int]]]) -> Tuple[List[List[int]], List[int]]:
+        # 每个粗列展开成宽度为其中最深的树的一段，树在段内靠右：根在段的最后一列，第 k 层在它左边第 k 列。
+        # 同时返回宽度大于 1 的段所占的列号，这些列中的顺序只由粗图决定，需要再局部调整
+        columns: List[List[int]] = []
+        expanded: List[int] = []
+        for coarse_column in coarse_columns:
+            width = max(len(trees[root]) for root in coarse_column)
+            band: List[List[int]] = [[] for _ in range(width)]
+            for root in coarse_column:
+                for depth, level in enumerate(trees[root]):
+                    band[width - 1 - depth].extend(level)
+            if width > 1:
+                expanded.extend(range(len(columns), len(columns) + width))
+            columns.extend(band)
+        return columns, expanded
+
+    def refine(self, columns: List[List[int]], expanded: List[int]) -> None:
+        # 展开后的局部调整：与 StandardOrder.up_down_adjust 相同的上下扫描和相邻块交换，但只重排展开出的列，
+        # 交叉数也只统计与这些列相邻的列间；最多 crossing_sweeps 轮，交叉数不再下降时停止并保留最好的结果
+        if not expanded or self.options.node.crossing_sweeps <= 0:
+            return
+        order = StandardOrder(self.workflow_reader, self.options)
+        order.swap_passes = self.swap_passes
+        # 展开出的列中没有同列的连线（树内的线连向右边一列，超节点之间的线跨段），每个节点单独成块
+        blocks: List[List[List[int]]] = [[] for _ in columns]
+        for col in expanded:
+            blocks[col] = [[node] for node in columns[col]]
+        heuristic = self.options.node.crossing_heuristic
+        best = [column.copy() for column in columns]
+        best_crossings = order.count_crossings(columns, expanded)
+        instrument.count("multilevel_refined_columns", len(expanded))
+        for _ in range(self.options.node.crossing_sweeps):
+            if best_crossings == 0:
+                break
+            instrument.count("multilevel_refine_sweeps")
+            order.sweep_down(columns, blocks, heuristic, expanded)
+            order.sweep_up(columns, blocks, heuristic, expanded)
+            order.adjacent_swap(columns, blocks, expanded)
+            crossings = order.count_crossings(columns, expanded)
+            if crossings >= best_crossings:
+                break
+            best = [column.copy() for column in columns]
+            best_crossings = crossings
+        columns[:] = best
+
+    def get_logic_order(self, nodes: List[int]) -> List[List[int]]:
+        trees = self.find_trees(nodes)
+        owner = {node: root for root, levels in trees.items() for level in levels for node in level}
+        instrument.count("multilevel_coarse_nodes", len(trees))
+        coarse_data = self.coarse_workflow(trees, owner)
+        # 粗图上不做同列堆叠，保证展开后所有连线都从左列连向右列
+        coarse_options = replace(self.options, node=replace(self.options.node, same_column_stacking_strength=0))
+        coarse_reader = WorkflowReader(coarse_data)
+        heads = list(trees)
+        if len(heads) <= len(nodes) * self.min_reduction and len(heads) >= self.min_coarse_nodes:
+            coarse_columns = MultilevelOrder(coarse_reader, coarse_options).get_logic_order(heads)
+        else:
+            coarse_order = StandardOrder(coarse_reader, coarse_options)
+            coarse_order.swap_passes = self.swap_passes
+            coarse_columns = coarse_order.get_logic_order(nodes=heads)
+        columns, expanded = self.expand(coarse_columns, trees)
+        self.refine(columns, expanded)
+        return columns
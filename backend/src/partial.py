@@ -0,0 +1,93 @@
+from typing import List, Iterable, Tuple
+
+from .parser import WorkflowReader, WorkflowWriter
+from .pos_caculate import NodePosCalculator
+from .multilevel import MultilevelOrder
+from .Utils import DataTool
+from .setting import LayoutOptions
+from . import instrument
+
+
+
+class PartialLayout(object):
+    # 只布局选中的节点：在选区内部分层排序，选区外的相邻节点作为固定锚点参与中位数目标和 PAVA，
+    # 结果放回选区原来的包围盒内，选区外的节点、分组和折叠状态都不变。
+    # 只访问选中节点及其连线，耗时与选区大小相关，与整个工作流的大小无关
+    # 没有任何锚点的节点在 PAVA 中的权重，只跟随同列前一个节点堆叠，不拉动有锚点的节点
+    free_weight: float = 1e-3
+
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
+        self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
+
+    def anchor_centers(self, node_id: int, selection: set, placed: set) -> List[float]:
+        # 选区外的上下游节点始终是锚点；选区内只有已经放好的上游节点（左边的列）才算
+        graph_index = self.workflow_reader.graph_index
+        id_to_node = self.workflow_reader.id_to_node
+        neighbors = [u for u in graph_index.predecessors(node_id) if u not in selection or u in placed]
+        neighbors += [v for v in graph_index.successors(node_id) if v not in selection]
+        return [
+            id_to_node[neighbor].pos.y + WorkflowReader.real_size(id_to_node[neighbor]).height / 2
+            for neighbor in neighbors if neighbor in id_to_node
+        ]
+
+    def desired_positions(self, column: List[int], selection: set, placed: set, top: float) -> Tuple[List[float], List[float]]:
+        # 有锚点的节点以锚点中心的中位数为目标（与 highly_align 一致）；没有锚点的节点紧接在同列前一个节点之后，
+        # 整列都没有锚点时从选区顶部开始堆叠
+        id_to_node = self.workflow_reader.id_to_node
+        gap_y = self.options.node.gap_y
+        targets: List[float | None] = []
+        for node in column:
+            centers = self.anchor_centers(node, selection, placed)
+            targets.append(DataTool.get_median(centers) if centers else None)
+        weights = [1.0 if target is not None else self.free_weight for target in targets]
+        first = next((idx for idx, target in enumerate(targets) if target is not None), None)
+        if first is None:
+            targets[0] = top
+            first = 0
+        for idx in range(first - 1, -1, -1):
+            targets[idx] = targets[idx + 1] - WorkflowReader.real_size(id_to_node[column[idx]]).height - gap_y
+        for idx in range(first + 1, len(column)):
+            if targets[idx] is None:
+                targets[idx] = targets[idx - 1] + WorkflowReader.real_size(id_to_node[column[idx - 1]]).height + gap_y
+        return targets, weights
+
+    def layout(self, node_ids: Iterable[int]) -> List[List[int]]:
+        id_to_node = self.workflow_reader.id_to_node
+        # 保持调用方给出的顺序，分层时同列节点按它排列
+        nodes = list(dict.fromkeys(node for node in node_ids if node in id_to_node))
+        if not nodes:
+            return []
+        selection = set(nodes)
+        instrument.count("partial_nodes", len(nodes))
+        x0, y0, x1, y1 = self.workflow_reader.bounding_box(nodes)
+        columns = MultilevelOrder.logic_order(self.workflow_reader, self.options, nodes)
+        WorkflowWriter(self.workflow_reader.workflow_data, self.options).align_node_dimensions(columns)
+        self.place(columns, selection, x0, y0)
+        self.fit_region(selection, (x0, y0, x1, y1))
+        return columns
+
+    def place(self, columns: List[List[int]], selection: set, x0: float, top: float) -> None:
+        pos_caculator = NodePosCalculator(self.workflow_reader, self.options)
+        id_to_node = self.workflow_reader.id_to_node
+        gap_x = self.options.node.gap_x
+        placed: set = set()
+        x = x0
+        for column in columns:
+            desired_y, weights = self.desired_positions(column, selection, placed, top)
+            pos_caculator.fit_column(column, desired_y, weights, x)
+            placed.update(column)
+            x += max(WorkflowReader.real_size(id_to_node[node]).width for node in column) + gap_x
+
+    def fit_region(self, selection: set, region: Tuple[float, float, float, float]) -> None:
+        # 布局结果比原包围盒矮时整体平移到包围盒内（尽量少移动），更高时与包围盒顶部对齐；
+        # 水平方向总是从包围盒左边开始，放不下时向右延伸
+        x0, y0, x1, y1 = region
+        _, top, _, bottom = self.workflow_reader.bounding_box(selection)
+        if bottom - top > y1 - y0:
+            dy = y0 - top
+        else:
+            dy = min(max(0, y0 - top), y1 - bottom)
+        id_to_node = self.workflow_reader.id_to_node
+        for node in selection:
+            id_to_node[node].pos.y += dy
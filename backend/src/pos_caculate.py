@@ -1,52 +1,63 @@
-from typing import List, Literal, Set, Tuple
+from typing import Dict, List, Literal, Set, Tuple
 from collections import defaultdict, deque
+import math
 
 from .header import Node
 from .parser import WorkflowReader, WorkflowWriter
+from .core import MainBranchShader
+from .vectorized import VectorizedPosCalculator, HAS_NUMPY
 from .Utils import DataTool, AlgorithmTool
-from .setting import NodeOptions, GroupOptions
+from .spatial import SpatialGrid
+from .setting import LayoutOptions
+from . import instrument
 
 
 
 class GroupPosCalulator(object):
-    def __init__(self, workflow_reader: WorkflowReader) -> None:
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
         self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
+
+    @staticmethod
+    def node_rect(node: Node) -> Tuple[float, float, float, float]:
+        return (node.pos.x, node.pos.y, node.pos.x + node.size.width, node.pos.y + node.size.height)
+
+    def node_index(self) -> SpatialGrid:
+        nodes = self.workflow_reader.workflow_data.nodes
+        return SpatialGrid.of_rects([self.node_rect(node) for node in nodes], nodes)
 
     def get_orig_groups(self) -> defaultdict[int, list[Node]]:
+        # 只检查与分组矩形落在同一批网格里的节点，不再逐个比较所有节点和所有分组
         contain_table: defaultdict[int, list[Node]] = defaultdict(list)
-        nodes = self.workflow_reader.workflow_data.nodes
+        node_index = self.node_index()
         for group in self.workflow_reader.workflow_data.groups:
             box = group.bounding
             group_coord = (box[0], box[1], box[0] + box[2], box[1] + box[3])
-            for node in nodes:
-                node_coord = (node.pos.x, node.pos.y, node.pos.x + node.size.width, node.pos.y + node.size.height)
-                S_node = node.size.width * node.size.height
-                intersect_area = AlgorithmTool.rectangle_intersection_area(node_coord, group_coord)
-                if intersect_area / S_node > GroupOptions.group_contain_propertion:
-                    contain_table[group.id].append(node)
+            members = node_index.contained(group_coord, self.options.group.group_contain_propertion)
+            if members:
+                contain_table[group.id].extend(members)
         return contain_table
 
     def modify_group_layout(self, orig_groups: defaultdict[int, list[Node]]) -> None:
-        group_opt = GroupOptions
-        workflow_writer = WorkflowWriter(self.workflow_reader.workflow_data)
+        group_opt = self.options.group
+        workflow_writer = WorkflowWriter(self.workflow_reader.workflow_data, self.options)
         id_to_group = {group.id: group for group in workflow_writer.workflow_data.groups}
         undistributed_y_offset = 1
+        # 节点已经布局完毕，按新坐标重建一次索引，所有分组共用
+        node_index = self.node_index() if orig_groups else None
         for group_id, group in orig_groups.items():
             min_x = min(node.pos.x for node in group)
             min_y = min(node.pos.y for node in group)
             max_x = max(node.pos.x + node.size.width for node in group)
             max_y = max(node.pos.y + node.size.height for node in group)
-            new_group = []
-            for node in self.workflow_reader.workflow_data.nodes:
-                node_coord = (node.pos.x, node.pos.y, node.pos.x + node.size.width, node.pos.y + node.size.height)
-                S_node: int = max(node.size.width * node.size.height, 1)
-                intersect_area = AlgorithmTool.rectangle_intersection_area(node_coord, (min_x, min_y, max_x, max_y))
-                if intersect_area / S_node > group_opt.group_contain_propertion:
-                    new_group.append(node)
-            if not new_group:
+            # 只用到新区域内节点的数量：数到比例判定必然失败的数量就可以停止
+            propertion = group_opt.same_group_node_propertion
+            limit = math.ceil(len(group) / propertion) + 1 if propertion > 0 else 1
+            new_group_size = node_index.count_contained((min_x, min_y, max_x, max_y), group_opt.group_contain_propertion, limit)
+            if not new_group_size:
                 continue
             group_obj = id_to_group[group_id]
-            if len(group) / len(new_group) > group_opt.same_group_node_propertion:
+            if len(group) / new_group_size > propertion:
                 heading_size = group_obj.font_size * group_opt.heading_size_multiplier
                 group_obj.bounding = [
                     min_x - group_opt.padding, min_y - heading_size, 
@@ -62,12 +73,17 @@ class GroupPosCalulator(object):
 
 
 class NodePosCalculator(object):
-    def __init__(self, workflow_reader: WorkflowReader) -> None:
+    # auto 模式下，节点数达到该阈值才使用 numpy 后端，小工作流上数组转换的开销大于收益
+    vectorize_threshold: int = 2000
+
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
         self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
 
     def get_adjoin_links(self, columns: List[List[int]], diff: int = 2) -> Set[Tuple[int, int]]:
         node_to_col = self.workflow_reader.node_to_col(columns)
         ajoin_links = set()
+        instrument.count("links_scanned", len(self.workflow_reader.workflow_data.links))
         for link in self.workflow_reader.workflow_data.links:
             input_col = node_to_col.get(link.output_node_id, 0)
             output_col = node_to_col.get(link.input_node_id, 0)
@@ -77,8 +93,13 @@ class NodePosCalculator(object):
                 ajoin_links.add((link.input_node_id, link.output_node_id))
         return ajoin_links
 
+    def get_adjoin_input_edges(self, columns: List[List[int]]) -> Dict[int, List[int]]:
+        nodes = list(DataTool.flatten_generator(columns))
+        adjoin_links = self.get_adjoin_links(columns)
+        return self.workflow_reader.build_graph(nodes=nodes, links=adjoin_links, output_graph=False)
+
     def get_accumulate_offsets(self, column: List[Node]) -> List[int]:
-        gap_y = NodeOptions.gap_y
+        gap_y = self.options.node.gap_y
         offsets: List[int] = []
         current_offset = 0
         for node in column:
@@ -87,6 +108,27 @@ class NodePosCalculator(object):
         offsets.append(current_offset)
         return offsets
 
+    def node_weights(
+            self,
+            columns: List[List[int]],
+            weight_by: Literal["uniform", "height", "fan_in", "main_path"] = "uniform"
+        ) -> Dict[int, float]:
+        # highly_align 中 PAVA 的节点权重，权重越大的节点越贴近它的目标位置
+        nodes = list(DataTool.flatten_generator(columns))
+        if weight_by == "uniform":
+            return {node: 1.0 for node in nodes}
+        elif weight_by == "height":
+            id_to_node = self.workflow_reader.id_to_node
+            return {node: max(float(WorkflowReader.real_size(id_to_node[node]).height), 1.0) for node in nodes}
+        elif weight_by == "fan_in":
+            input_edges = self.workflow_reader.build_graph(nodes=nodes, output_graph=False)
+            return {node: 1.0 + len(input_edges[node]) for node in nodes}
+        elif weight_by == "main_path":
+            main_path = set(MainBranchShader(self.workflow_reader, self.options).find_main_path(nodes))
+            return {node: self.options.node.main_path_weight if node in main_path else 1.0 for node in nodes}
+        else:
+            raise ValueError("Cannot recognize the weight type.")
+
     def align_pos(self, node_id: int, align: str) -> int | float:
         node = self.workflow_reader.id_to_node[node_id]
         if align == "top":
@@ -115,7 +157,7 @@ class NodePosCalculator(object):
             base_y: int = 0,
             align: Literal["top", "center", "bottom"] = "top"
         ) -> None:
-        gap_x = NodeOptions.gap_x
+        gap_x = self.options.node.gap_x
         columns_objectification = [[self.workflow_reader.id_to_node[j] for j in i] for i in columns]
         x0 = base_x
         for column in columns_objectification:
@@ -135,10 +177,8 @@ class NodePosCalculator(object):
             base_y: int = 0,
             align: Literal["top", "center", "bottom"] = "center"
         ) -> None:
-        gap_x = NodeOptions.gap_x
-        nodes = list(DataTool.flatten_generator(columns))
-        adjoin_links = self.get_adjoin_links(columns)
-        input_edges = self.workflow_reader.build_graph(nodes=nodes, links=adjoin_links, output_graph=False)
+        gap_x = self.options.node.gap_x
+        input_edges = self.get_adjoin_input_edges(columns)
         columns_objectification = [[self.workflow_reader.id_to_node[j] for j in i] for i in columns]
         x0 = base_x
         for column in columns_objectification:
@@ -166,13 +206,13 @@ class NodePosCalculator(object):
             columns: List[List[int]], 
             base_x: int = 0, 
             base_y: int = 0, 
-            align: Literal["top", "center", "bottom"] = "top"
+            align: Literal["top", "center", "bottom"] = "top",
+            weights: Dict[int, float] | None = None
         ) -> None:
-        gap_x = NodeOptions.gap_x
-        gap_y = NodeOptions.gap_y
-        nodes = list(DataTool.flatten_generator(columns))
-        adjoin_links = self.get_adjoin_links(columns)
-        input_edges = self.workflow_reader.build_graph(nodes=nodes, links=adjoin_links, output_graph=False)
+        gap_x = self.options.node.gap_x
+        gap_y = self.options.node.gap_y
+        weights = weights if weights is not None else {}
+        input_edges = self.get_adjoin_input_edges(columns)
         columns_objectification = [[self.workflow_reader.id_to_node[j] for j in i] for i in columns]
         x0 = base_x
         for column in columns_objectification:
@@ -198,7 +238,7 @@ class NodePosCalculator(object):
                 for i in range(1, n):
                     c[i] = c[i-1] + k[i-1]
                 m_prime = [desired_y_list[i] - c[i] for i in range(n)]
-                z = AlgorithmTool.pava_algorithm(m_prime)
+                z = AlgorithmTool.pava_algorithm(m_prime, [weights.get(node.id, 1.0) for node in locate_nodes])
                 x = [z[i] + c[i] for i in range(n)]
             else:
                 x = desired_y_list
@@ -229,19 +269,42 @@ class NodePosCalculator(object):
             col_widths = [WorkflowReader.real_size(node).width for node in column]
             x0 += (max(col_widths) + gap_x)
 
+    def fit_column(self, column: List[int], desired_y: List[float], weights: List[float], x: float) -> None:
+        # 按 column 的顺序放置一列，相邻节点之间至少留 gap_y，使 Σ w·(y - desired_y)² 最小（与 highly_align 相同的 PAVA 变换）
+        id_to_node = self.workflow_reader.id_to_node
+        offsets = self.get_accumulate_offsets([id_to_node[node] for node in column])
+        fitted = AlgorithmTool.pava_algorithm([y - offset for y, offset in zip(desired_y, offsets)], weights)
+        for node, y, offset in zip(column, fitted, offsets):
+            id_to_node[node].pos.x = x
+            id_to_node[node].pos.y = y + offset
+
     def modify_node_layout(
             self,
             columns: List[List[int]], 
             base_x: int = 0, 
             base_y: int = 0, 
             align: Literal["top", "center", "bottom"] = "top",
-            method: Literal["simple_align", "average_align", "highly_align"] = "highly_align"
+            method: Literal["simple_align", "average_align", "highly_align"] = "highly_align",
+            weight_by: Literal["uniform", "height", "fan_in", "main_path"] | None = None,
+            backend: Literal["auto", "python", "numpy"] | None = None
         ) -> None:
+        # numpy 后端是可选的，未安装 numpy 时回退到纯 Python 实现
+        backend = backend or self.options.node.placement_backend
+        if backend == "auto":
+            vectorized = HAS_NUMPY and sum(len(column) for column in columns) >= self.vectorize_threshold
+        else:
+            vectorized = backend == "numpy" and HAS_NUMPY
         if method == "simple_align":
             self.simple_align_calculator(columns, base_x, base_y, align)
         elif method == "average_align":
+            # 每列只有一次求和，纯 Python 实现已经足够快，numpy 后端只用于 highly_align
             self.average_align_calculator(columns, base_x, base_y, align)
         elif method == "highly_align":
-            self.highly_align_calculator(columns, base_x, base_y, align)
+            weights = self.node_weights(columns, weight_by or self.options.node.pava_weight)
+            if vectorized:
+                input_edges = self.get_adjoin_input_edges(columns)
+                VectorizedPosCalculator(self.workflow_reader, self.options).highly_align_calculator(columns, input_edges, base_x, base_y, align, weights)
+            else:
+                self.highly_align_calculator(columns, base_x, base_y, align, weights)
         else:
             raise ValueError("Cannot recognize the layout method.")
@@ -1,5 +1,7 @@
-from typing import List, Dict, Union, Literal, Any
+from typing import ClassVar, Dict, Tuple, Union, Literal, Any, get_args, get_origin
+from dataclasses import dataclass, field, fields, asdict
 from pathlib import Path
+import threading
 import json
 
 
@@ -12,7 +14,73 @@ COLLAPSE_WIDTH = 150
 COLLAPSE_HEIGHT = 30
 
 
+class ConfigRegistry(object):
+    # 进程内共享的配置/模板缓存，按文件的 mtime 和大小判断是否需要重新读取。
+    # 返回的对象被所有调用方共享，只读使用，需要修改时先复制
+    _entries: Dict[Path, Tuple[Tuple[int, int], Any]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str | Path) -> Any:
+        path = Path(path)
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        with cls._lock:
+            entry = cls._entries.get(path)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+        with cls._lock:
+            cls._entries[path] = (version, value)
+        return value
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
+
+
+# 选项只在 NodeSetting / GroupSetting 中声明一次，NodeOptions / GroupOptions 的类属性按它们的字段生成（见文件末尾）
 class NodeOptions(object):
+    @classmethod
+    def load_setting(cls) -> None:
+        cls.update_setting(ConfigRegistry.load(NODE_OPTIONS))
+
+    @classmethod
+    def as_dict(cls) -> Dict[str, Any]:
+        return {item.name: getattr(cls, item.name) for item in fields(NodeSetting)}
+
+    @classmethod
+    def update_setting(cls, options: Dict[str, Any]) -> None:
+        setting = NodeSetting.from_dict(options)
+        for item in fields(NodeSetting):
+            value = getattr(setting, item.name)
+            setattr(cls, item.name, list(value) if isinstance(value, tuple) else value)
+
+
+
+class GroupOptions(object):
+    @classmethod
+    def as_dict(cls) -> Dict[str, Any]:
+        return {item.name: getattr(cls, item.name) for item in fields(GroupSetting)}
+
+    @classmethod
+    def load_setting(cls) -> None:
+        cls.update_setting(ConfigRegistry.load(GROUP_OPTIONS))
+
+    @classmethod
+    def update_setting(cls, options: Dict[str, Union[int, bool]]) -> None:
+        setting = GroupSetting.from_dict(options)
+        for item in fields(GroupSetting):
+            setattr(cls, item.name, getattr(setting, item.name))
+
+
+
+# NodeOptions / GroupOptions 只保存从配置文件读到的默认值；每次布局使用不可变的 LayoutOptions，
+# 由调用方一路传给 StandardOrder、WorkflowWriter、NodePosCalculator 等，多线程下各请求互不影响
+@dataclass(frozen=True)
+class NodeSetting:
     gap_x: int = 100
     gap_y: int = 50
     same_column_stacking_strength: int = 1
@@ -21,38 +89,55 @@ class NodeOptions(object):
     set_color_for_main_path: bool = True
     layout_calculator: Literal["simple_align", "average_align", "highly_align"] = "highly_align"
     calculator_align: Literal["bottom", "center", "top"] = "center"
+    pava_weight: Literal["uniform", "height", "fan_in", "main_path"] = "uniform"
+    main_path_weight: float = 4.0
+    placement_backend: Literal["auto", "python", "numpy"] = "auto"
+    crossing_heuristic: Literal["barycenter", "median"] = "barycenter"
+    crossing_sweeps: int = 4
+    component_layout: bool = False
+    component_workers: int = 0
+    multilevel_threshold: int = 0
+    hierarchical_groups: bool = False
     main_path_bg_color: str = "#FFCBA4"
     main_path_color: str = "#E0B390"
-    fixed_fold_nodes: List[str] = []
-    fixed_unfold_nodes: List[str] = []
+    fixed_fold_nodes: Tuple[str, ...] = ()
+    fixed_unfold_nodes: Tuple[str, ...] = ()
+    # 数值选项的取值范围（None 表示不限），超出时截断；Literal 选项的可选值就是注解中列出的值
+    bounds: ClassVar[Dict[str, Tuple[float | None, float | None]]] = {
+        "same_column_stacking_strength": (0, 7),
+        "main_path_weight": (1.0, None),
+        "crossing_sweeps": (0, None),
+        "component_workers": (0, None),
+        "multilevel_threshold": (0, None),
+    }
 
     @classmethod
-    def load_setting(cls) -> None:
-        with open(NODE_OPTIONS, "r", encoding="utf-8") as f:
-            options: dict = json.load(f)
-            cls.update_setting(options)
-
-    @classmethod
-    def update_setting(cls, options: Dict[str, Any]) -> None:
-        cls.gap_x = options.get("gap_x", 100)
-        cls.gap_y = options.get("gap_y", 50)
-        cls.same_column_stacking_strength = max(min(int(options.get("same_column_stacking_strength", 1)), 7), 0)
-        cls.remove_nails = options.get("remove_nails", True)
-        cls.remove_intermediate_nodes = options.get("remove_intermediate_nodes", True)
-        cls.set_color_for_main_path = options.get("set_color_for_main_path", True)
-        layout_calculator = options.get("layout_calculator", "highly_align")
-        if layout_calculator not in ("simple_align", "average_align", "highly_align"):
-            layout_calculator = "highly_align"
-        cls.layout_calculator = layout_calculator
-        cls.calculator_align = options.get("calculator_align", "center")
-        cls.main_path_bg_color = options.get("main_path_bg_color", "#FFCBA4")
-        cls.main_path_color = options.get("main_path_color", "#E0B390")
-        cls.fixed_fold_nodes = options.get("fixed_fold_nodes", [])
-        cls.fixed_unfold_nodes = options.get("fixed_unfold_nodes", [])
+    def from_dict(cls, options: Dict[str, Any]) -> "NodeSetting":
+        values: Dict[str, Any] = {}
+        for item in fields(cls):
+            value = options.get(item.name, item.default)
+            if get_origin(item.type) is Literal:
+                # 不认识的取值退回默认值
+                if value not in get_args(item.type):
+                    value = item.default
+            elif get_origin(item.type) is tuple:
+                value = tuple(value)
+            elif item.type is bool:
+                value = bool(value)
+            elif item.name in cls.bounds:
+                low, high = cls.bounds[item.name]
+                value = item.type(value)
+                value = max(value, low) if low is not None else value
+                value = min(value, high) if high is not None else value
+            values[item.name] = value
+        return cls(**values)
 
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
 
 
-class GroupOptions(object):
+@dataclass(frozen=True)
+class GroupSetting:
     group_contain_propertion: float = 0.8
     same_group_node_propertion: float = 0.9
     padding: int = 20
@@ -63,19 +148,44 @@ class GroupOptions(object):
     undistrubuted_y_step: int = 300
 
     @classmethod
-    def load_setting(cls) -> None:
-        with open(GROUP_OPTIONS, "r", encoding="utf-8") as f:
-            options: dict = json.load(f)
-            cls.update_setting(options)
+    def from_dict(cls, options: Dict[str, Any]) -> "GroupSetting":
+        return cls(**{item.name: options.get(item.name, item.default) for item in fields(cls)})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class LayoutOptions:
+    node: NodeSetting = field(default_factory=NodeSetting)
+    group: GroupSetting = field(default_factory=GroupSetting)
 
     @classmethod
-    def update_setting(cls, options: Dict[str, Union[int, bool]]) -> None:
-        cls.group_contain_propertion = options.get("group_contain_propertion", 0.8)
-        cls.same_group_node_propertion = options.get("same_group_node_propertion", 0.9)
-        cls.padding = options.get("padding", 20)
-        cls.heading_size_multiplier = options.get("heading_size_multiplier", 2)
-        cls.undistrubuted_x = options.get("undistrubuted_x", -1000)
-        cls.undistrubuted_width = options.get("undistrubuted_width", 500)
-        cls.undistrubuted_height = options.get("undistrubuted_height", 200)
-        cls.undistrubuted_y_step = options.get("undistrubuted_y_step", 300)
+    def current(cls) -> "LayoutOptions":
+        # 以配置文件中的设置为基准
+        return cls(NodeSetting.from_dict(NodeOptions.as_dict()), GroupSetting.from_dict(GroupOptions.as_dict()))
+
+    @classmethod
+    def resolve(cls, options: Union["LayoutOptions", Dict[str, Any], None] = None) -> "LayoutOptions":
+        if isinstance(options, LayoutOptions):
+            return options
+        return cls.current().merge(options or {})
+
+    def merge(self, options: Dict[str, Any]) -> "LayoutOptions":
+        # options 为扁平字典，节点设置和分组设置的字段名互不重复，按字段名分别覆盖
+        node = self.node.as_dict()
+        group = self.group.as_dict()
+        for name, value in options.items():
+            if name in node:
+                node[name] = value
+            elif name in group:
+                group[name] = value
+        return LayoutOptions(NodeSetting.from_dict(node), GroupSetting.from_dict(group))
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {"node": self.node.as_dict(), "group": self.group.as_dict()}
+
+
 
+NodeOptions.update_setting({})
+GroupOptions.update_setting({})
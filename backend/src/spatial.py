@@ -0,0 +1,219 @@
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+from collections import defaultdict
+import bisect
+import math
+
+from .Utils import DataTool, AlgorithmTool
+from . import instrument
+
+
+
+Point = Tuple[float, float]
+Rect = Tuple[float, float, float, float]
+
+
+class SpatialGrid(object):
+    # 均匀网格空间索引：每个矩形登记在它覆盖的所有格子里，查询时只检查查询区域覆盖的格子。
+    # 格子边长取矩形宽高中位数的较大值，每个矩形平均只落在少数几个格子里，
+    # 相交、包含和最近邻查询的代价与结果附近的矩形数量相关，与矩形总数无关
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = max(cell_size, 1.0)
+        self.cells: defaultdict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.rects: List[Rect] = []
+        self.keys: List[Any] = []
+        # 每个矩形的面积，按不小于 1 计算，避免除以 0
+        self.areas: List[float] = []
+        # 每一行有矩形的格子的列号（有序），以及有矩形的格子的范围 (cx0, cy0, cx1, cy1)，
+        # 大范围查询时只访问范围内的行，在行内二分出列的区间，不遍历全部格子
+        self.rows: Dict[int, List[int]] = {}
+        self.extent: Tuple[int, int, int, int] | None = None
+
+    @classmethod
+    def of_rects(cls, rects: Sequence[Rect], keys: Sequence[Any] | None = None, cell_size: float | None = None) -> "SpatialGrid":
+        # keys 为每个矩形对应的对象（如节点 id），省略时为矩形的下标
+        grid = cls(cell_size if cell_size is not None else cls.grid_size(rects))
+        for idx, rect in enumerate(rects):
+            grid.insert(rect, keys[idx] if keys is not None else idx)
+        return grid
+
+    @staticmethod
+    def grid_size(rects: Sequence[Rect]) -> float:
+        if not rects:
+            return 1.0
+        width = DataTool.get_median([x1 - x0 for x0, _, x1, _ in rects])
+        height = DataTool.get_median([y1 - y0 for _, y0, _, y1 in rects])
+        return max(width, height, 1.0)
+
+    @staticmethod
+    def area(rect: Rect) -> float:
+        return max(0, rect[2] - rect[0]) * max(0, rect[3] - rect[1])
+
+    def cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, rect: Rect, key: Any = None) -> int:
+        idx = len(self.rects)
+        self.rects.append(rect)
+        self.keys.append(idx if key is None else key)
+        self.areas.append(max(self.area(rect), 1))
+        cx0, cy0 = self.cell_of(rect[0], rect[1])
+        cx1, cy1 = self.cell_of(rect[2], rect[3])
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                if (cx, cy) not in self.cells:
+                    bisect.insort(self.rows.setdefault(cy, []), cx)
+                self.cells[(cx, cy)].append(idx)
+        if self.extent is None:
+            self.extent = (cx0, cy0, cx1, cy1)
+        else:
+            ex0, ey0, ex1, ey1 = self.extent
+            self.extent = (min(ex0, cx0), min(ey0, cy0), max(ex1, cx1), max(ey1, cy1))
+        return idx
+
+    def buckets(self, rect: Rect) -> Iterator[List[int]]:
+        # rect 覆盖的、有矩形的格子；先裁剪到有矩形的范围内，
+        # 裁剪后仍比已有的格子数多（查询区域大而网格稀疏）时按行二分，否则逐格查找
+        if self.extent is None:
+            return
+        ex0, ey0, ex1, ey1 = self.extent
+        cx0, cy0 = self.cell_of(rect[0], rect[1])
+        cx1, cy1 = self.cell_of(rect[2], rect[3])
+        cx0, cy0, cx1, cy1 = max(cx0, ex0), max(cy0, ey0), min(cx1, ex1), min(cy1, ey1)
+        if cx0 > cx1 or cy0 > cy1:
+            return
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            for cy in range(cy0, cy1 + 1):
+                row = self.rows.get(cy)
+                if row is None:
+                    continue
+                for cx in row[bisect.bisect_left(row, cx0):bisect.bisect_right(row, cx1)]:
+                    yield self.cells[(cx, cy)]
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    members = self.cells.get((cx, cy))
+                    if members is not None:
+                        yield members
+
+    def candidates(self, rect: Rect) -> List[int]:
+        # 与 rect 覆盖的格子有交集的矩形下标，去重后按插入顺序返回
+        found = set()
+        for members in self.buckets(rect):
+            found.update(members)
+        instrument.count("spatial_candidates", len(found))
+        return sorted(found)
+
+    def intersecting(self, rect: Rect) -> List[Any]:
+        # 与 rect 的相交面积大于 0 的矩形
+        return [self.keys[idx] for idx in self.candidates(rect) if AlgorithmTool.rectangle_intersection_area(self.rects[idx], rect) > 0]
+
+    def contained(self, rect: Rect, proportion: float) -> List[Any]:
+        # 落在 rect 内的面积占自身面积的比例超过 proportion 的矩形（面积按不小于 1 计算）
+        # 大分组一次会检查上千个候选，这里展开相交面积的计算，不逐个调用函数
+        left, top, right, bottom = rect
+        rects, areas, keys = self.rects, self.areas, self.keys
+        result = []
+        for idx in self.candidates(rect):
+            x0, y0, x1, y1 = rects[idx]
+            width = (x1 if x1 < right else right) - (x0 if x0 > left else left)
+            height = (y1 if y1 < bottom else bottom) - (y0 if y0 > top else top)
+            if width > 0 and height > 0 and width * height / areas[idx] > proportion:
+                result.append(keys[idx])
+        return result
+
+    def count_contained(self, rect: Rect, proportion: float, limit: int | None = None) -> int:
+        # 与 contained 的条件相同，只计数；数到 limit 就停止，返回 min(数量, limit)
+        left, top, right, bottom = rect
+        rects, areas = self.rects, self.areas
+        seen = set()
+        count = 0
+        for members in self.buckets(rect):
+            for idx in members:
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                x0, y0, x1, y1 = rects[idx]
+                width = (x1 if x1 < right else right) - (x0 if x0 > left else left)
+                height = (y1 if y1 < bottom else bottom) - (y0 if y0 > top else top)
+                if width > 0 and height > 0 and width * height / areas[idx] > proportion:
+                    count += 1
+                    if count == limit:
+                        instrument.count("spatial_candidates", len(seen))
+                        return count
+        instrument.count("spatial_candidates", len(seen))
+        return count
+
+    @staticmethod
+    def distance(point: Point, rect: Rect) -> float:
+        dx = max(rect[0] - point[0], 0, point[0] - rect[2])
+        dy = max(rect[1] - point[1], 0, point[1] - rect[3])
+        return math.hypot(dx, dy)
+
+    def ring(self, center: Tuple[int, int], radius: int) -> Iterator[Tuple[int, int]]:
+        # 与 center 的切比雪夫距离恰好为 radius 的格子
+        cx, cy = center
+        if radius == 0:
+            yield center
+            return
+        for x in range(cx - radius, cx + radius + 1):
+            yield x, cy - radius
+            yield x, cy + radius
+        for y in range(cy - radius + 1, cy + radius):
+            yield cx - radius, y
+            yield cx + radius, y
+
+    def nearest(self, point: Point) -> Any | None:
+        # 从点所在的格子向外逐圈搜索；第 r 圈以外的矩形离点至少 r 个格子边长，已找到更近的就停止
+        if not self.rects:
+            return None
+        center = self.cell_of(*point)
+        ex0, ey0, ex1, ey1 = self.extent
+        max_radius = max(abs(center[0] - ex0), abs(center[0] - ex1), abs(center[1] - ey0), abs(center[1] - ey1))
+        best, best_distance = None, math.inf
+        for radius in range(max_radius + 1):
+            for cell in self.ring(center, radius):
+                for idx in self.cells.get(cell, ()):
+                    distance = self.distance(point, self.rects[idx])
+                    if distance < best_distance or (distance == best_distance and idx < best):
+                        best, best_distance = idx, distance
+            if best_distance <= radius * self.cell_size:
+                break
+        return self.keys[best]
+
+    def overlapping_pairs(self) -> Iterator[Tuple[Any, Any, float]]:
+        # 同一格子内两两比较；两个矩形可能同时出现在多个格子里，只在相交区域左上角所在的格子里返回一次
+        for cell, members in self.cells.items():
+            for i in range(len(members)):
+                a = self.rects[members[i]]
+                for j in range(i + 1, len(members)):
+                    b = self.rects[members[j]]
+                    left, top = max(a[0], b[0]), max(a[1], b[1])
+                    right, bottom = min(a[2], b[2]), min(a[3], b[3])
+                    if left >= right or top >= bottom:
+                        continue
+                    if self.cell_of(left, top) != cell:
+                        continue
+                    yield self.keys[members[i]], self.keys[members[j]], (right - left) * (bottom - top)
+
+    def segment_cells(self, start: Point, end: Point) -> Iterator[Tuple[int, int]]:
+        # 按列遍历线段经过的格子，每一列只取线段在该列 x 范围内的 y 区间
+        size = self.cell_size
+        (x0, y0), (x1, y1) = sorted((start, end))
+        for cx in range(math.floor(x0 / size), math.floor(x1 / size) + 1):
+            if x1 == x0:
+                ya, yb = y0, y1
+            else:
+                slope = (y1 - y0) / (x1 - x0)
+                ya = y0 + (max(x0, cx * size) - x0) * slope
+                yb = y0 + (min(x1, (cx + 1) * size) - x0) * slope
+            for cy in range(math.floor(min(ya, yb) / size), math.floor(max(ya, yb) / size) + 1):
+                yield cx, cy
+
+    def along_segment(self, start: Point, end: Point) -> Iterator[Any]:
+        # 线段经过的格子里的矩形，按经过的先后顺序，每个矩形只返回一次
+        seen = set()
+        for cell in self.segment_cells(start, end):
+            for idx in self.cells.get(cell, ()):
+                if idx not in seen:
+                    seen.add(idx)
+                    yield self.keys[idx]
@@ -0,0 +1,46 @@
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.header import WorkflowData
+from core.parser import WorkflowReader, WorkflowWriter
+from core.core import StandardOrder
+from core.multilevel import MultilevelOrder
+from workflow_generator import generate_workflow
+
+
+
+def prepare(size: int) -> WorkflowReader:
+    workflow_data = WorkflowData.from_dict(generate_workflow(size, group_ratio=0))
+    WorkflowWriter(workflow_data).remove_unnecessary_nodes()
+    return WorkflowReader(workflow_data)
+
+
+def order(workflow_reader: WorkflowReader, multilevel: bool) -> Tuple[float, List[List[int]]]:
+    nodes = [node.id for node in workflow_reader.workflow_data.nodes]
+    start = time.perf_counter()
+    if multilevel:
+        columns = MultilevelOrder(workflow_reader).get_logic_order(nodes)
+    else:
+        columns = StandardOrder(workflow_reader).get_logic_order(nodes=nodes)
+    return time.perf_counter() - start, columns
+
+
+def main() -> None:
+    for size in (10_000, 20_000, 40_000):
+        workflow_reader = prepare(size)
+        standard_order = StandardOrder(workflow_reader)
+        flat_time, flat_columns = order(workflow_reader, False)
+        multilevel_time, multilevel_columns = order(workflow_reader, True)
+        print(
+            f"n={size:>6}: flat {flat_time * 1000:8.1f} ms, multilevel {multilevel_time * 1000:8.1f} ms, "
+            f"speedup {flat_time / multilevel_time:5.2f}x, "
+            f"crossings {standard_order.count_crossings(flat_columns)} -> {standard_order.count_crossings(multilevel_columns)}, "
+            f"columns {len(flat_columns)} -> {len(multilevel_columns)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import sys
+import copy
+import json
+import math
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Callable, Any
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.header import WorkflowData
+from core.pipeline import LayoutPipeline, LayoutState
+from core.setting import LayoutOptions
+from workflow_generator import generate_workflow
+
+
+
+METHODS = ("simple_align", "average_align", "highly_align")
+
+
+def run_stages(workflow_dict: Dict[str, Any], measure: Callable[[str, Callable[[], Any]], Any]) -> None:
+    # 按 LayoutPipeline 的阶段顺序执行，node_layout 分别用三种计算器在检查点副本上各跑一次，
+    # 之后的阶段沿用 highly_align 的结果
+    options = LayoutOptions.current()
+    pipeline = LayoutPipeline(options)
+    workflow_dict = copy.deepcopy(workflow_dict)
+    state: LayoutState = measure("parse", lambda: LayoutState(WorkflowData.from_dict(workflow_dict)))
+    for stage in pipeline.stages:
+        if stage.name != "node_layout":
+            measure(stage.name, lambda: getattr(pipeline, stage.name)(state))
+            continue
+        checkpoint = state.clone()
+        for method in METHODS:
+            method_state = checkpoint.clone()
+            method_pipeline = LayoutPipeline(options.merge({"layout_calculator": method}))
+            measure(method, lambda: method_pipeline.node_layout(method_state))
+            if method == "highly_align":
+                state = method_state
+    measure("export", lambda: json.dumps(state.workflow_writer.to_dict(), ensure_ascii=False))
+
+
+def time_stages(workflow_dict: Dict[str, Any]) -> Dict[str, float]:
+    seconds: Dict[str, float] = {}
+
+    def measure(name: str, func: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = func()
+        seconds[name] = time.perf_counter() - start
+        return result
+
+    run_stages(workflow_dict, measure)
+    return seconds
+
+
+def peak_memory(workflow_dict: Dict[str, Any]) -> Dict[str, int]:
+    # tracemalloc 会明显拖慢执行，峰值内存单独跑一遍，不影响计时结果
+    peaks: Dict[str, int] = {}
+
+    def measure(name: str, func: Callable[[], Any]) -> Any:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        result = func()
+        peaks[name] = tracemalloc.get_traced_memory()[1] - base
+        return result
+
+    tracemalloc.start()
+    try:
+        run_stages(workflow_dict, measure)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def scaling_exponent(sizes: List[int], timings: List[float]) -> float:
+    # log(time) 对 log(n) 的最小二乘斜率；过短的计时噪声太大，不参与拟合
+    points = [(math.log(n), math.log(t)) for n, t in zip(sizes, timings) if t > 1e-4]
+    if len(points) < 2:
+        return float("nan")
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    if denominator == 0:
+        return float("nan")
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="time every layout stage on synthetic workflows of increasing size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 5_000, 20_000, 50_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="timing runs per size, the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", help="write the raw results to this file")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        workflow_dict = generate_workflow(size, args.seed)
+        runs = [time_stages(workflow_dict) for _ in range(max(args.repeat, 1))]
+        seconds = {name: min(run[name] for run in runs) for name in runs[0]}
+        memory = {} if args.no_memory else peak_memory(workflow_dict)
+        nodes = len(workflow_dict["nodes"])
+        results.append({"size": size, "nodes": nodes, "links": len(workflow_dict["links"]), "seconds": seconds, "peak_bytes": memory})
+        print(f"n={nodes:>6} links={len(workflow_dict['links']):>6} groups={len(workflow_dict['groups']):>5}", flush=True)
+        for name, elapsed in seconds.items():
+            peak = f"{memory[name] / 2 ** 20:9.2f} MiB" if name in memory else ""
+            print(f"    {name:<26} {elapsed * 1000:10.1f} ms {peak}", flush=True)
+
+    stages = list(results[0]["seconds"]) if results else []
+    sizes = [result["nodes"] for result in results]
+    exponents = {name: scaling_exponent(sizes, [result["seconds"][name] for result in results]) for name in stages}
+    print("scaling exponents (time ~ n^k):")
+    for name, exponent in exponents.items():
+        print(f"    {name:<26} {exponent:6.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "exponents": exponents}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import sys
+import copy
+import time
+from pathlib import Path
+from typing import Dict, List, Any
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.header import WorkflowData
+from core.parser import WorkflowReader, WorkflowWriter
+from core.core import StandardOrder
+from core.pos_caculate import NodePosCalculator
+from core.vectorized import HAS_NUMPY
+from workflow_generator import generate_workflow
+
+
+
+def prepare(workflow_dict: Dict[str, Any]) -> tuple[WorkflowData, List[List[int]]]:
+    workflow_data = WorkflowData.from_dict(copy.deepcopy(workflow_dict))
+    workflow_reader = WorkflowReader(workflow_data)
+    columns = StandardOrder(workflow_reader).get_logic_order([node.id for node in workflow_data.nodes])
+    WorkflowWriter(workflow_data).align_node_dimensions(columns)
+    return workflow_data, columns
+
+
+def place(workflow_data: WorkflowData, columns: List[List[int]], method: str, backend: str) -> float:
+    pos_caculator = NodePosCalculator(WorkflowReader(workflow_data))
+    start = time.perf_counter()
+    pos_caculator.modify_node_layout(columns, align="center", method=method, backend=backend)
+    return time.perf_counter() - start
+
+
+def max_position_diff(a: WorkflowData, b: WorkflowData) -> float:
+    return max(
+        max(abs(x.pos.x - y.pos.x), abs(x.pos.y - y.pos.y))
+        for x, y in zip(a.nodes, b.nodes)
+    )
+
+
+def main() -> None:
+    if not HAS_NUMPY:
+        print("numpy is not installed, only the python backend is available")
+        return
+    for size in (1_000, 5_000, 20_000):
+        workflow_dict = generate_workflow(size)
+        for method in ("highly_align",):
+            python_data, columns = prepare(workflow_dict)
+            numpy_data, _ = prepare(workflow_dict)
+            python_time = place(python_data, columns, method, "python")
+            numpy_time = place(numpy_data, columns, method, "numpy")
+            print(
+                f"n={size:>6} {method:>13}: python {python_time * 1000:8.1f} ms, "
+                f"numpy {numpy_time * 1000:8.1f} ms, speedup {python_time / numpy_time:5.2f}x, "
+                f"max diff {max_position_diff(python_data, numpy_data):.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import sys
+import math
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.Utils import AlgorithmTool
+from workflow_generator import generate_workflow
+
+
+
+def workflow_dag(node_count: int, seed: int = 0) -> Dict[int, List[int]]:
+    # 与其他基准相同形状的工作流，按连线建立邻接表
+    workflow = generate_workflow(node_count, seed)
+    graph: Dict[int, List[int]] = {node["id"]: [] for node in workflow["nodes"]}
+    for _, source, _, target, _, _ in workflow["links"]:
+        graph[source].append(target)
+    return graph
+
+
+def chain_dag(node_count: int) -> Dict[int, List[int]]:
+    return {node: [node + 1] if node + 1 < node_count else [] for node in range(node_count)}
+
+
+def measure(graph: Dict[int, List[int]], repeat: int = 3) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        AlgorithmTool.topological_sort(graph)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    sizes = [1_000, 10_000, 100_000]
+    for name, factory in (("workflow", workflow_dag), ("chain", chain_dag)):
+        timings = []
+        for size in sizes:
+            elapsed = measure(factory(size))
+            timings.append(elapsed)
+            print(f"{name:>8} n={size:>7}: {elapsed * 1000:9.2f} ms")
+        exponent = math.log(timings[-1] / timings[0]) / math.log(sizes[-1] / sizes[0])
+        print(f"{name:>8} scaling exponent: {exponent:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+from typing import Dict, List, Tuple, Any, Optional
+
+
+
+# 每种节点的 (输入, 输出, 宽度范围, 高度范围)，端口为 (名称, 类型)
+NODE_TYPES: Dict[str, Tuple[List[Tuple[str, str]], List[Tuple[str, str]], Tuple[int, int], Tuple[int, int]]] = {
+    "CheckpointLoaderSimple": ([], [("MODEL", "MODEL"), ("CLIP", "CLIP"), ("VAE", "VAE")], (300, 420), (98, 130)),
+    "LoraLoader": ([("model", "MODEL"), ("clip", "CLIP")], [("MODEL", "MODEL"), ("CLIP", "CLIP")], (300, 360), (126, 160)),
+    "CLIPTextEncode": ([("clip", "CLIP")], [("CONDITIONING", "CONDITIONING")], (400, 460), (150, 220)),
+    "EmptyLatentImage": ([], [("LATENT", "LATENT")], (300, 320), (106, 110)),
+    "LoadImage": ([], [("IMAGE", "IMAGE"), ("MASK", "MASK")], (300, 400), (300, 450)),
+    "VAEEncode": ([("pixels", "IMAGE"), ("vae", "VAE")], [("LATENT", "LATENT")], (210, 240), (46, 50)),
+    "KSampler": (
+        [("model", "MODEL"), ("positive", "CONDITIONING"), ("negative", "CONDITIONING"), ("latent_image", "LATENT")],
+        [("LATENT", "LATENT")], (300, 320), (262, 480)
+    ),
+    "LatentUpscale": ([("samples", "LATENT")], [("LATENT", "LATENT")], (300, 320), (130, 140)),
+    "VAEDecode": ([("samples", "LATENT"), ("vae", "VAE")], [("IMAGE", "IMAGE")], (210, 240), (46, 50)),
+    "ImageScale": ([("image", "IMAGE")], [("IMAGE", "IMAGE")], (300, 320), (130, 140)),
+    "ImageSharpen": ([("image", "IMAGE")], [("IMAGE", "IMAGE")], (300, 320), (106, 110)),
+    "SaveImage": ([("images", "IMAGE")], [], (300, 600), (270, 600)),
+    "PreviewImage": ([("images", "IMAGE")], [], (300, 600), (250, 600)),
+}
+
+
+class WorkflowGenerator(object):
+    # 生成 ComfyUI 形状的工作流：若干条出图流水线共享 checkpoint（loader 扇出），每条流水线包含
+    # LoRA 链、正负提示词、若干级采样器（高清修复链）、解码和后处理；部分连线经过 Reroute 链或
+    # SetNode/GetNode 中转，部分节点折叠，共享同一 loader 的流水线放进同一个分组。相同 seed 结果相同
+    def __init__(
+            self,
+            seed: int = 0,
+            reroute_ratio: float = 0.08,
+            set_get_ratio: float = 0.05,
+            collapse_ratio: float = 0.05,
+            group_ratio: float = 0.7
+        ) -> None:
+        self.rng = random.Random(seed)
+        self.reroute_ratio = reroute_ratio
+        self.set_get_ratio = set_get_ratio
+        self.collapse_ratio = collapse_ratio
+        self.group_ratio = group_ratio
+        self.nodes: List[Dict[str, Any]] = []
+        self.links: List[List[Any]] = []
+        self.groups: List[Dict[str, Any]] = []
+        # 同一个输出端口只创建一个 SetNode，之后的消费者都用 GetNode 取值
+        self.set_names: Dict[Tuple[int, int], str] = {}
+        self.origin = (0.0, 0.0)
+
+    def node(self, node_id: int) -> Dict[str, Any]:
+        return self.nodes[node_id - 1]
+
+    def place(self, width: float, height: float) -> List[float]:
+        # 未布局的工作流：节点散落在所属流水线的区域内
+        x0, y0 = self.origin
+        return [x0 + self.rng.uniform(0, 3000 - width), y0 + self.rng.uniform(0, 1800 - height)]
+
+    def add_node(
+            self,
+            type: str,
+            inputs: List[Tuple[str, str]],
+            outputs: List[Tuple[str, str]],
+            size: Tuple[float, float],
+            widgets_values: Optional[List[Any]] = None
+        ) -> int:
+        node_id = len(self.nodes) + 1
+        collapsed = type not in ("Reroute", "SetNode", "GetNode") and self.rng.random() < self.collapse_ratio
+        self.nodes.append({
+            "id": node_id,
+            "type": type,
+            "pos": self.place(*size),
+            "size": list(size),
+            "flags": {"collapsed": True} if collapsed else {},
+            "order": node_id - 1,
+            "mode": 0,
+            "inputs": [{"name": name, "type": link_type, "link": None} for name, link_type in inputs],
+            "outputs": [
+                {"name": name, "type": link_type, "slot_index": slot, "links": []}
+                for slot, (name, link_type) in enumerate(outputs)
+            ],
+            "properties": {"Node name for S&R": type},
+            "widgets_values": widgets_values if widgets_values is not None else [],
+        })
+        return node_id
+
+    def add(self, type: str) -> int:
+        inputs, outputs, width, height = NODE_TYPES[type]
+        size = (self.rng.randint(*width), self.rng.randint(*height))
+        return self.add_node(type, inputs, outputs, size)
+
+    def connect(self, source: int, source_slot: int, target: int, target_slot: int) -> None:
+        link_id = len(self.links) + 1
+        link_type = self.node(source)["outputs"][source_slot]["type"]
+        self.links.append([link_id, source, source_slot, target, target_slot, link_type])
+        self.node(source)["outputs"][source_slot]["links"].append(link_id)
+        self.node(target)["inputs"][target_slot]["link"] = link_id
+
+    def route(self, source: int, source_slot: int, target: int, target_slot: int) -> None:
+        # 连线可能经过 1~3 个 Reroute，或者通过 SetNode/GetNode 远距离传递
+        link_type = self.node(source)["outputs"][source_slot]["type"]
+        draw = self.rng.random()
+        if draw < self.set_get_ratio:
+            name = self.set_names.get((source, source_slot))
+            if name is None:
+                name = f"{link_type}_{len(self.set_names)}"
+                self.set_names[(source, source_slot)] = name
+                set_node = self.add_node("SetNode", [(link_type, link_type)], [("*", "*")], (210, 58), [name])
+                self.connect(source, source_slot, set_node, 0)
+            get_node = self.add_node("GetNode", [], [(link_type, link_type)], (210, 58), [name])
+            source, source_slot = get_node, 0
+        elif draw < self.set_get_ratio + self.reroute_ratio:
+            for _ in range(self.rng.randint(1, 3)):
+                reroute = self.add_node("Reroute", [("", "*")], [("", link_type)], (75, 26))
+                self.connect(source, source_slot, reroute, 0)
+                source, source_slot = reroute, 0
+        self.connect(source, source_slot, target, target_slot)
+
+    def add_pipeline(self, loader: int) -> None:
+        model, clip = (loader, 0), (loader, 1)
+        for _ in range(self.rng.choice([0, 0, 1, 1, 2, 3])):
+            lora = self.add("LoraLoader")
+            self.route(*model, lora, 0)
+            self.route(*clip, lora, 1)
+            model, clip = (lora, 0), (lora, 1)
+        positive, negative = self.add("CLIPTextEncode"), self.add("CLIPTextEncode")
+        self.route(*clip, positive, 0)
+        self.route(*clip, negative, 0)
+        if self.rng.random() < 0.3:
+            image, latent = self.add("LoadImage"), self.add("VAEEncode")
+            self.route(image, 0, latent, 0)
+            self.route(loader, 2, latent, 1)
+        else:
+            latent = self.add("EmptyLatentImage")
+        samples = (latent, 0)
+        for stage in range(self.rng.choice([1, 1, 2, 2, 3, 4])):
+            if stage:
+                upscale = self.add("LatentUpscale")
+                self.route(*samples, upscale, 0)
+                samples = (upscale, 0)
+            sampler = self.add("KSampler")
+            self.route(*model, sampler, 0)
+            self.route(positive, 0, sampler, 1)
+            self.route(negative, 0, sampler, 2)
+            self.route(*samples, sampler, 3)
+            samples = (sampler, 0)
+        decode = self.add("VAEDecode")
+        self.route(*samples, decode, 0)
+        self.route(loader, 2, decode, 1)
+        image = (decode, 0)
+        for _ in range(self.rng.choice([0, 0, 1, 2, 3])):
+            post = self.add(self.rng.choice(["ImageScale", "ImageSharpen"]))
+            self.route(*image, post, 0)
+            image = (post, 0)
+        for _ in range(self.rng.choice([1, 1, 1, 2])):
+            self.route(*image, self.add(self.rng.choice(["SaveImage", "PreviewImage"])), 0)
+
+    def add_group(self, first_node: int, title: str) -> None:
+        members = self.nodes[first_node - 1:]
+        if not members:
+            return
+        padding, heading = 10, 34
+        x0 = min(node["pos"][0] for node in members) - padding
+        y0 = min(node["pos"][1] for node in members) - heading
+        x1 = max(node["pos"][0] + node["size"][0] for node in members) + padding
+        y1 = max(node["pos"][1] + node["size"][1] for node in members) + padding
+        self.groups.append({
+            "id": len(self.groups) + 1, "title": title, "bounding": [x0, y0, x1 - x0, y1 - y0],
+            "color": "#3f789e", "font_size": 24, "flags": {}
+        })
+
+    def generate(self, node_count: int) -> Dict[str, Any]:
+        # 按流水线整体添加，节点数达到 node_count 即停止，实际节点数会略多于 node_count
+        cluster = 0
+        while len(self.nodes) < node_count:
+            # 每个 checkpoint 扇出给 2~8 条流水线，各个集群在画布上按网格排开
+            self.origin = ((cluster % 10) * 3500.0, (cluster // 10) * 2300.0)
+            first_node = len(self.nodes) + 1
+            loader = self.add("CheckpointLoaderSimple")
+            for _ in range(self.rng.randint(2, 8)):
+                self.add_pipeline(loader)
+                if len(self.nodes) >= node_count:
+                    break
+            if self.rng.random() < self.group_ratio:
+                self.add_group(first_node, f"Pipeline {cluster + 1}")
+            cluster += 1
+        return {
+            "last_node_id": len(self.nodes),
+            "last_link_id": len(self.links),
+            "nodes": self.nodes,
+            "links": self.links,
+            "groups": self.groups,
+            "config": {},
+            "extra": {},
+            "version": 0.4,
+        }
+
+
+def generate_workflow(node_count: int, seed: int = 0, **kwargs) -> Dict[str, Any]:
+    return WorkflowGenerator(seed, **kwargs).generate(node_count)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="generate a synthetic ComfyUI workflow")
+    parser.add_argument("nodes", type=int, help="approximate node count")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+    workflow = generate_workflow(args.nodes, args.seed)
+    if args.output:
+        Path(args.output).write_text(json.dumps(workflow, ensure_ascii=False), encoding="utf-8")
+    else:
+        json.dump(workflow, sys.stdout, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
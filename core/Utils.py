@@ -1,52 +1,107 @@
 from typing import Iterable, Generator, List, Tuple, Dict, Any
-from collections import defaultdict
+from collections import defaultdict, deque
+
+from . import instrument
 
 
 
 class AlgorithmTool(object):
     @staticmethod
     def topological_sort(graph: Dict[int, List[int]]) -> List[List[int]]:
-        all_nodes = set(graph.keys())
+        # 分层 Kahn 算法，O(V+E)。每个节点的列号等于它到源点的最长路径长度，
+        # 同列节点按其在 graph 中首次出现的顺序排列
+        order: Dict[int, int] = {}
+        for node, neighbors in graph.items():
+            order.setdefault(node, len(order))
+            for neighbor in neighbors:
+                order.setdefault(neighbor, len(order))
+        in_degree = dict.fromkeys(order, 0)
         for neighbors in graph.values():
-            all_nodes.update(neighbors)
-        all_nodes = list(all_nodes)
-        in_degree = {node: 0 for node in all_nodes}
-        for output_nodes in graph.values():
-            for output_node in output_nodes:
-                in_degree[output_node] += 1
-        columns = []
-        current_degree = in_degree.copy()
-        while current_degree:
-            zero_degree_nodes = [node for node, deg in current_degree.items() if deg == 0]
-            if not zero_degree_nodes:
-                raise ValueError("Cycle detected in dependency graph")
-            columns.append(zero_degree_nodes)
-            for node in zero_degree_nodes:
-                del current_degree[node]
-                for neighbor in graph[node]:
-                    if neighbor in current_degree:
-                        current_degree[neighbor] -= 1
+            for neighbor in neighbors:
+                in_degree[neighbor] += 1
+        layer = {node: 0 for node, degree in in_degree.items() if degree == 0}
+        queue = deque(layer)
+        while queue:
+            node = queue.popleft()
+            next_layer = layer[node] + 1
+            for neighbor in graph.get(node, ()):
+                in_degree[neighbor] -= 1
+                if in_degree[neighbor] == 0:
+                    layer[neighbor] = next_layer
+                    queue.append(neighbor)
+        if len(layer) != len(order):
+            cycle = AlgorithmTool.find_cycle(graph, [node for node in order if node not in layer])
+            raise ValueError(f"Cycle detected in dependency graph: {' -> '.join(map(str, cycle))}")
+        columns: List[List[int]] = [[] for _ in range(max(layer.values(), default=-1) + 1)]
+        for node in order:
+            columns[layer[node]].append(node)
         return columns
+
+    @staticmethod
+    def find_cycle(graph: Dict[int, List[int]], remaining: List[int]) -> List[int]:
+        # remaining 为 Kahn 算法剥离后剩下的节点，其中每个节点都至少有一个前驱也在 remaining 中，
+        # 因此沿前驱一直回溯必然会回到走过的节点
+        remaining_set = set(remaining)
+        predecessor: Dict[int, int] = {}
+        for node in remaining:
+            for neighbor in graph.get(node, ()):
+                if neighbor in remaining_set:
+                    predecessor.setdefault(neighbor, node)
+        path: List[int] = []
+        seen: Dict[int, int] = {}
+        node = remaining[0]
+        while node not in seen:
+            seen[node] = len(path)
+            path.append(node)
+            node = predecessor[node]
+        cycle = path[seen[node]:][::-1]
+        return cycle + [cycle[0]]
     
     @staticmethod
-    def gravity_sort(left_col: List[int], right_col: List[int], relations: List[Tuple[int, int]]) -> List:
-        right_col_idx_map = {node: idx for idx, node in enumerate(right_col)}
-        connections = {node: [] for node in left_col}
+    def order_by_neighbors(
+            neighbor_positions: List[List[int]],
+            default: float,
+            heuristic: str = "barycenter"
+        ) -> List[int]:
+        # 按邻列位置的重心或中位数排序，返回下标；没有邻居的取 default，排序稳定
+        keys: List[float] = []
+        for positions in neighbor_positions:
+            if not positions:
+                keys.append(default)
+            elif heuristic == "median":
+                keys.append(DataTool.get_median(positions))
+            else:
+                keys.append(sum(positions) / len(positions))
+        return sorted(range(len(neighbor_positions)), key=lambda idx: keys[idx])
 
-        for left_node, right_node in relations:
-            if left_node in connections:
-                connections[left_node].append(right_col_idx_map[right_node])
+    @staticmethod
+    def count_crossings(edges: List[Tuple[int, int]], right_size: int) -> int:
+        # 两列之间的交叉数：边按 (左端, 右端) 排序后，右端的逆序对数即交叉数，用树状数组统计，O(E log V)
+        tree = [0] * (right_size + 1)
+        crossings = 0
+        for inserted, (_, right) in enumerate(sorted(edges)):
+            idx = right + 1
+            not_greater = 0
+            while idx > 0:
+                not_greater += tree[idx]
+                idx -= idx & -idx
+            crossings += inserted - not_greater
+            idx = right + 1
+            while idx <= right_size:
+                tree[idx] += 1
+                idx += idx & -idx
+        return crossings
 
-        avg_right_col = sum(right_col_idx_map.values()) / len(right_col) if right_col else 0
-        barycenter = {}
-        
-        for node in left_col:
-            if connections[node]:
-                barycenter[node] = sum(connections[node]) / len(connections[node])
-            else:
-                barycenter[node] = avg_right_col
-        sorted_left_col = sorted(left_col, key=lambda x: barycenter[x])
-        return sorted_left_col
+    @staticmethod
+    def pair_crossings(upper: List[int], lower: List[int]) -> int:
+        # 上下相邻的两个块各自连向同一邻列的位置（均已排序），上块在上时两组连线的交叉数
+        crossings = 0
+        j = 0
+        for position in upper:
+            while j < len(lower) and lower[j] < position:
+                j += 1
+            crossings += j
+        return crossings
 
     @staticmethod
     def group_connected_nodes(graph: Dict[int, List[int]]) -> list[list[int]]:
@@ -119,38 +174,84 @@ class AlgorithmTool(object):
         return result_list
     
     @staticmethod
-    def pava_algorithm(fit_y: List[int | float], weights=None) -> List[float]:
+    def pava_algorithm(fit_y: List[int | float], weights: List[int | float] | None = None) -> List[float]:
+        # 栈式加权 PAVA（保序回归），O(n)：每个块只保存均值、权重和长度三个数组
         n = len(fit_y)
         if weights is None:
             weights = [1.0] * n
-        
-        blocks = [{'value': fit_y[i], 'weight': weights[i], 'indices': [i]} for i in range(n)]
-        
-        i = 0
-        while i < len(blocks) - 1:
-            if blocks[i]['value'] > blocks[i+1]['value']:
-                total_weight = blocks[i]['weight'] + blocks[i+1]['weight']
-                weighted_sum = blocks[i]['value'] * blocks[i]['weight'] + blocks[i+1]['value'] * blocks[i+1]['weight']
-                merged_value = weighted_sum / total_weight
-                merged_block = {
-                    'value': merged_value,
-                    'weight': total_weight,
-                    'indices': blocks[i]['indices'] + blocks[i+1]['indices']
-                }
-                blocks[i] = merged_block
-                del blocks[i+1]
-                if i > 0:
-                    i -= 1
-            else:
-                i += 1
-        
-        result = [0.0] * n
-        for block in blocks:
-            for idx in block['indices']:
-                result[idx] = block['value']
-        
+        elif len(weights) != n:
+            raise ValueError(f"weights must have the same length as fit_y, got {len(weights)} != {n}")
+        block_values: List[float] = []
+        block_weights: List[float] = []
+        block_sizes: List[int] = []
+        merges = 0
+        for value, weight in zip(fit_y, weights):
+            if weight <= 0:
+                raise ValueError(f"weights must be positive, got {weight}")
+            size = 1
+            while block_values and block_values[-1] > value:
+                prev_weight = block_weights.pop()
+                total_weight = prev_weight + weight
+                value = (block_values.pop() * prev_weight + value * weight) / total_weight
+                weight = total_weight
+                size += block_sizes.pop()
+                merges += 1
+            block_values.append(value)
+            block_weights.append(weight)
+            block_sizes.append(size)
+        instrument.count("pava_merges", merges)
+
+        result: List[float] = []
+        for value, size in zip(block_values, block_sizes):
+            result.extend([value] * size)
         return result
 
+    @staticmethod
+    def skyline_pack(sizes: List[Tuple[float, float]], max_width: float) -> List[Tuple[float, float]]:
+        # 天际线装箱：按高度从大到小依次放置，每个矩形放在使它顶边最高（y 最小）的位置，同高时靠左。
+        # skyline 的每一段为 [x, 宽度, 该段已占用到的 y]，返回值与 sizes 的顺序一致
+        max_width = max([max_width] + [width for width, _ in sizes])
+        skyline: List[List[float]] = [[0.0, max_width, 0.0]]
+        positions: List[Tuple[float, float]] = [(0.0, 0.0)] * len(sizes)
+        for idx in sorted(range(len(sizes)), key=lambda idx: (-sizes[idx][1], -sizes[idx][0])):
+            width, height = sizes[idx]
+            best: Tuple[float, float, int] | None = None
+            for start in range(len(skyline)):
+                x = skyline[start][0]
+                if x + width > max_width:
+                    break
+                y = 0.0
+                covered = 0.0
+                end = start
+                while covered < width:
+                    y = max(y, skyline[end][2])
+                    covered += skyline[end][1]
+                    end += 1
+                if best is None or y < best[1]:
+                    best = (x, y, start)
+            x, y, start = best
+            positions[idx] = (x, y)
+            # 用新矩形的底边替换它覆盖的各段，最后一段只覆盖一部分时保留剩余部分
+            remaining = width
+            while remaining > 0:
+                segment = skyline[start]
+                if segment[1] <= remaining:
+                    remaining -= segment[1]
+                    del skyline[start]
+                else:
+                    segment[0] += remaining
+                    segment[1] -= remaining
+                    remaining = 0
+            skyline.insert(start, [x, width, y + height])
+            merged: List[List[float]] = []
+            for segment in skyline:
+                if merged and merged[-1][2] == segment[2]:
+                    merged[-1][1] += segment[1]
+                else:
+                    merged.append(segment)
+            skyline = merged
+        return positions
+
     @staticmethod
     def rectangle_intersection_area(rect1: Tuple[int, int, int, int], rect2: Tuple[int, int, int, int]) -> float:
         left1, top1, right1, bottom1 = rect1
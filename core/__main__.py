@@ -0,0 +1,125 @@
+from typing import Dict, List, Any
+from pathlib import Path
+import argparse
+import json
+import time
+import sys
+
+from .batch import BatchLayout, BatchResult
+from .stream import NDJSONStream
+from .pipeline import layout_workflow
+from .metrics import LayoutMetrics
+
+
+
+def parse_options(args: argparse.Namespace) -> Dict[str, Any]:
+    # --config 读取 JSON 设置文件，--set key=value 逐项覆盖，value 按 JSON 解析，失败时当作字符串
+    options: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            options.update(json.load(f))
+    for item in args.set:
+        key, _, value = item.partition("=")
+        try:
+            options[key] = json.loads(value)
+        except json.JSONDecodeError:
+            options[key] = value
+    return options
+
+
+def add_option_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--config", help="JSON file with layout options")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="override a single layout option")
+
+
+def batch(args: argparse.Namespace) -> int:
+    runner = BatchLayout(args.output_dir, parse_options(args), workers=args.jobs, force=args.force)
+    results: List[BatchResult] = []
+    start = time.perf_counter()
+    try:
+        for result in runner.run(args.paths):
+            results.append(result)
+            if result.status == "failed":
+                print(f"failed   {result.input_path}: {result.error}", file=sys.stderr, flush=True)
+            else:
+                print(f"{result.status:<8} {result.seconds:8.3f}s  {result.input_path} -> {result.output_path}", flush=True)
+    except ValueError as e:
+        # 输出路径冲突在处理任何文件之前检查
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    summary = runner.summary(results, time.perf_counter() - start)
+    summary_path = Path(args.summary) if args.summary else runner.output_dir / "batch_summary.json"
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(
+        f"{summary['done']} done, {summary['skipped']} skipped, {summary['failed']} failed "
+        f"in {summary['wall_seconds']:.2f}s, summary: {summary_path}",
+        file=sys.stderr
+    )
+    return 1 if summary["failed"] else 0
+
+
+def stream(args: argparse.Namespace) -> int:
+    runner = NDJSONStream(parse_options(args), workers=args.jobs, max_in_flight=args.max_in_flight, ordered=not args.unordered)
+    stdout = sys.stdout.buffer
+
+    def write(line: bytes) -> None:
+        stdout.write(line)
+        stdout.flush()
+
+    counts = runner.run(sys.stdin.buffer, write)
+    print(f"{counts['records']} records, {counts['failed']} failed", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+def metrics(args: argparse.Namespace) -> int:
+    # 同一个工作流分别用各个 layout_calculator 布局，输出每种方法的布局质量指标
+    options = parse_options(args)
+    report: List[Dict[str, Any]] = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            workflow = f.read()
+        for method in args.methods or ["simple_align", "average_align", "highly_align"]:
+            result = layout_workflow(workflow, {**options, "layout_calculator": method})
+            report.append({"file": path, "method": method, "metrics": LayoutMetrics.of_workflow(result).measure()})
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m core", description="ComfyUI workflow auto layout")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="lay out files, directories or glob patterns in parallel")
+    batch_parser.add_argument("paths", nargs="+", help="workflow files, directories (searched recursively) or glob patterns")
+    batch_parser.add_argument("-o", "--output-dir", required=True, help="directory for the laid out workflows")
+    batch_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    batch_parser.add_argument("-f", "--force", action="store_true", help="re-layout files whose output is up to date")
+    batch_parser.add_argument("--summary", help="summary JSON path (default: <output-dir>/batch_summary.json)")
+    add_option_arguments(batch_parser)
+    batch_parser.set_defaults(handler=batch)
+
+    stream_parser = subparsers.add_parser("stream", help="read NDJSON workflows from stdin and write laid out NDJSON to stdout")
+    stream_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes, 0 runs in-process (default: CPU count)")
+    stream_parser.add_argument("--max-in-flight", type=int, default=None, help="records being processed or buffered at once (default: 2 x jobs)")
+    stream_parser.add_argument("--unordered", action="store_true", help="write records as they complete instead of in input order")
+    add_option_arguments(stream_parser)
+    stream_parser.set_defaults(handler=stream)
+
+    metrics_parser = subparsers.add_parser("metrics", help="compare layout quality metrics of the layout calculators")
+    metrics_parser.add_argument("paths", nargs="+", help="workflow files")
+    metrics_parser.add_argument(
+        "-m", "--method", dest="methods", action="append", choices=["simple_align", "average_align", "highly_align"],
+        help="layout calculator to measure, can be repeated (default: all)"
+    )
+    add_option_arguments(metrics_parser)
+    metrics_parser.set_defaults(handler=metrics)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
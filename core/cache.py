@@ -0,0 +1,235 @@
+from typing import Dict, List, Any, Optional, Iterator
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import zlib
+
+
+CACHE_FORMAT_VERSION = 1
+# 布局代码的指纹，首次计算缓存键时生成
+_code_version: str | None = None
+
+
+
+class LayoutCache(object):
+    # 两级缓存：进程内 LRU + 可选的 SQLite 磁盘缓存。
+    # 缓存的不是整份输出，而是布局结果补丁（坐标、尺寸、折叠状态、连线等），
+    # 命中时套用到本次上传的工作流上，因此键只需要覆盖会影响布局的字段
+    def __init__(
+            self,
+            max_entries: int = 128,
+            db_path: str | Path | None = None,
+            max_db_bytes: int = 256 * 1024 * 1024
+        ) -> None:
+        self.max_entries = max_entries
+        self.db_path = Path(db_path) if db_path else None
+        self.max_db_bytes = max_db_bytes
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "stores": 0, "memory_evictions": 0, "disk_evictions": 0
+        }
+        if self.db_path is not None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS layouts ("
+                    "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS layouts_accessed ON layouts (accessed)")
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def code_version() -> str:
+        # 磁盘缓存跨版本保留，键中加入布局代码（本包所有 .py 文件）的哈希，
+        # 算法改动后旧结果自然失效；打包后读不到源码时只按 CACHE_FORMAT_VERSION 区分
+        global _code_version
+        if _code_version is None:
+            root = Path(__file__).parent
+            digest = hashlib.sha256()
+            for path in sorted(root.glob("*.py")):
+                try:
+                    content = path.read_bytes()
+                except OSError:
+                    continue
+                digest.update(path.relative_to(root).as_posix().encode("utf-8"))
+                digest.update(content)
+            _code_version = digest.hexdigest()
+        return _code_version
+
+    @staticmethod
+    def workflow_key(workflow_dict: Dict[str, Any], options: Dict[str, Any]) -> str:
+        nodes = []
+        for node in workflow_dict.get("nodes", []):
+            widgets_values = node.get("widgets_values")
+            nodes.append([
+                node.get("id"), node.get("type"), node.get("order"),
+                node.get("pos"), node.get("size"), node.get("flags"),
+                # 补丁会写回 color/bgcolor，用户改过颜色时不能命中旧结果
+                node.get("color"), node.get("bgcolor"),
+                [[slot.get("type"), slot.get("link")] for slot in node.get("inputs", [])],
+                [[slot.get("type"), slot.get("links")] for slot in node.get("outputs", [])],
+                # SetNode/GetNode 的配对依赖第一个控件值
+                widgets_values[0] if node.get("type") in ("SetNode", "GetNode") and widgets_values else None
+            ])
+        groups = [[group.get("id"), group.get("bounding"), group.get("font_size")] for group in workflow_dict.get("groups", [])]
+        canonical = {
+            "version": CACHE_FORMAT_VERSION,
+            "code": LayoutCache.code_version(),
+            "nodes": nodes,
+            "links": workflow_dict.get("links", []),
+            "groups": groups,
+            "reroutes": bool(workflow_dict.get("extra", {}).get("reroutes")),
+            "last_node_id": workflow_dict.get("last_node_id"),
+            "last_link_id": workflow_dict.get("last_link_id"),
+            "options": options,
+        }
+        encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_patch(input_node_ids: set, result: Dict[str, Any]) -> Dict[str, Any]:
+        nodes: List[Dict[str, Any]] = []
+        for node in result["nodes"]:
+            if node["id"] not in input_node_ids:
+                # 布局过程中新建的节点没有原始数据可套用，整份保存
+                nodes.append({"id": node["id"], "created": node})
+                continue
+            nodes.append({
+                "id": node["id"],
+                "fields": {key: node[key] for key in ("pos", "size", "flags", "color", "bgcolor", "order") if key in node},
+                "inputs": [{"link": slot["link"]} if "link" in slot else {} for slot in node.get("inputs", [])],
+                "outputs": [{"links": slot["links"]} if "links" in slot else {} for slot in node.get("outputs", [])],
+            })
+        patch = {
+            "nodes": nodes,
+            "links": result["links"],
+            "groups": [group["bounding"] for group in result["groups"]],
+            "last_node_id": result["last_node_id"],
+            "last_link_id": result["last_link_id"],
+        }
+        if "reroutes" in result.get("extra", {}):
+            patch["reroutes"] = result["extra"]["reroutes"]
+        return patch
+
+    @staticmethod
+    def apply_patch(workflow_dict: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+        raw_nodes = {node["id"]: node for node in workflow_dict["nodes"]}
+        nodes = []
+        for node_patch in patch["nodes"]:
+            if "created" in node_patch:
+                nodes.append(node_patch["created"])
+                continue
+            node = raw_nodes[node_patch["id"]]
+            node.update(node_patch["fields"])
+            node["inputs"] = node.get("inputs", [])
+            node["outputs"] = node.get("outputs", [])
+            for slot, slot_patch in zip(node["inputs"], node_patch["inputs"]):
+                slot.update(slot_patch)
+            for slot, slot_patch in zip(node["outputs"], node_patch["outputs"]):
+                slot.update(slot_patch)
+            nodes.append(node)
+        workflow_dict["nodes"] = nodes
+        workflow_dict["links"] = patch["links"]
+        for group, bounding in zip(workflow_dict.get("groups", []), patch["groups"]):
+            group["bounding"] = bounding
+        workflow_dict["last_node_id"] = patch["last_node_id"]
+        workflow_dict["last_link_id"] = patch["last_link_id"]
+        if "reroutes" in patch:
+            workflow_dict["extra"]["reroutes"] = patch["reroutes"]
+        return workflow_dict
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return json.loads(value)
+        value = self.get_from_disk(key)
+        with self.lock:
+            if value is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["disk_hits"] += 1
+            self.put_in_memory(key, value)
+        return json.loads(value)
+
+    def put(self, key: str, patch: Dict[str, Any]) -> None:
+        value = json.dumps(patch, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            self.counters["stores"] += 1
+            self.put_in_memory(key, value)
+        self.put_on_disk(key, value)
+
+    def put_in_memory(self, key: str, value: bytes) -> None:
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.counters["memory_evictions"] += 1
+
+    def get_from_disk(self, key: str) -> Optional[bytes]:
+        if self.db_path is None:
+            return None
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM layouts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE layouts SET accessed = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0])
+
+    def put_on_disk(self, key: str, value: bytes) -> None:
+        if self.db_path is None:
+            return
+        compressed = zlib.compress(value)
+        evicted = 0
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO layouts (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, compressed, len(compressed), time.time())
+            )
+            # 按最近访问时间淘汰，直到总大小回到上限以内
+            total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM layouts").fetchone()[0]
+            while total_size > self.max_db_bytes:
+                row = conn.execute("SELECT key, size FROM layouts ORDER BY accessed LIMIT 1").fetchone()
+                if row is None or row[0] == key:
+                    break
+                conn.execute("DELETE FROM layouts WHERE key = ?", (row[0],))
+                total_size -= row[1]
+                evicted += 1
+        if evicted:
+            with self.lock:
+                self.counters["disk_evictions"] += evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self.memory)
+        if self.db_path is not None:
+            with self.connect() as conn:
+                count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM layouts").fetchone()
+            stats["disk_entries"] = count
+            stats["disk_bytes"] = size
+        return stats
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+        if self.db_path is not None:
+            with self.connect() as conn:
+                conn.execute("DELETE FROM layouts")
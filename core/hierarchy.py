@@ -0,0 +1,184 @@
+from typing import Dict, List, Tuple
+from collections import defaultdict
+from dataclasses import dataclass, replace
+
+from .header import WorkflowData, Node, NodePos, NodeSize, Link
+from .parser import WorkflowReader, WorkflowWriter
+from .components import ComponentLayout
+from .multilevel import MultilevelOrder
+from .pos_caculate import NodePosCalculator
+from .Utils import DataTool
+from .setting import LayoutOptions
+from . import instrument
+
+
+
+@dataclass
+class GroupHierarchy:
+    # 分层布局的排序结果：每个分组内部的列，以及顶层的列（不属于任何分组的节点和代表分组的超节点）。
+    # 第 i 个分组的超节点 id 为 super_base + i，大于所有真实节点的 id
+    group_ids: List[int]
+    interiors: List[List[List[int]]]
+    top: List[List[int]]
+    super_base: int
+
+    def clone(self) -> "GroupHierarchy":
+        return GroupHierarchy(
+            list(self.group_ids),
+            [[list(column) for column in columns] for columns in self.interiors],
+            [list(column) for column in self.top],
+            self.super_base
+        )
+
+    def loose_columns(self) -> List[List[int]]:
+        columns = [[node for node in column if node < self.super_base] for column in self.top]
+        return [column for column in columns if column]
+
+    def columns(self) -> List[List[int]]:
+        # 顶层的列，超节点展开成分组内的全部节点，供只需要列号的阶段使用
+        return [
+            [
+                member for node in column
+                for member in (
+                    DataTool.flatten_generator(self.interiors[node - self.super_base])
+                    if node >= self.super_base else (node,)
+                )
+            ]
+            for column in self.top
+        ]
+
+
+class HierarchicalLayout(object):
+    # 分层的分组布局：按 get_orig_groups 的包含关系，每个分组内部单独排序、定位（节点多时在进程池中并行排序），
+    # 再把每个分组当作一个超节点，与不属于任何分组的节点一起在顶层排序、定位，最后把组内节点平移到超节点的位置。
+    # 一个节点属于多个分组（嵌套或重叠）时只归入面积最小的分组
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
+        self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
+
+    def assign(self, orig_groups: Dict[int, List[Node]]) -> Tuple[List[int], List[List[int]]]:
+        # 已被移除的中间节点不参与布局；组内节点保持工作流中的顺序
+        id_to_node = self.workflow_reader.id_to_node
+        id_to_group = {group.id: group for group in self.workflow_reader.workflow_data.groups}
+        owner: Dict[int, int] = {}
+        for group_id in sorted(orig_groups, key=lambda group_id: id_to_group[group_id].bounding[2] * id_to_group[group_id].bounding[3]):
+            for node in orig_groups[group_id]:
+                if node.id in id_to_node:
+                    owner.setdefault(node.id, group_id)
+        members: Dict[int, List[int]] = {group_id: [] for group_id in orig_groups}
+        for node in self.workflow_reader.workflow_data.nodes:
+            if node.id in owner:
+                members[owner[node.id]].append(node.id)
+        group_ids = [group_id for group_id in orig_groups if members[group_id]]
+        return group_ids, [members[group_id] for group_id in group_ids]
+
+    @staticmethod
+    def drop_cycles(nodes: List[int], links: List[Link]) -> List[Link]:
+        # 分组收缩后可能出现环（A -> 分组 -> B -> 同一分组），DFS 中指向栈内节点的边会成环，去掉这些边
+        out_links: defaultdict[int, List[Link]] = defaultdict(list)
+        for link in links:
+            out_links[link.input_node_id].append(link)
+        # 1 表示在栈内，2 表示已经访问完
+        state: Dict[int, int] = {}
+        dropped = set()
+        for root in nodes:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(out_links[root]))]
+            while stack:
+                node, pending = stack[-1]
+                link = next(pending, None)
+                if link is None:
+                    state[node] = 2
+                    stack.pop()
+                    continue
+                target = link.output_node_id
+                if state.get(target) == 1:
+                    dropped.add(link.link_id)
+                elif target not in state:
+                    state[target] = 1
+                    stack.append((target, iter(out_links[target])))
+        return [link for link in links if link.link_id not in dropped]
+
+    def coarse_workflow(self, hierarchy: GroupHierarchy, sizes: List[Tuple[float, float]] | None = None) -> WorkflowData:
+        # 顶层的工作流：不属于分组的节点沿用原来的节点对象（顶层定位直接写回），
+        # 分组换成尺寸为 sizes[i] 的超节点；组间连线保留端口，去掉组内的连线和成环的连线
+        owner = {
+            node: hierarchy.super_base + idx
+            for idx, columns in enumerate(hierarchy.interiors)
+            for node in DataTool.flatten_generator(columns)
+        }
+        nodes = [node for node in self.workflow_reader.workflow_data.nodes if node.id not in owner]
+        for idx in range(len(hierarchy.group_ids)):
+            width, height = sizes[idx] if sizes is not None else (0, 0)
+            nodes.append(Node(
+                id=hierarchy.super_base + idx, type="Group", pos=NodePos(0, 0), size=NodeSize(width, height),
+                inputs=[], outputs=[], flags={}, widgets_values=None, color="#322", bgcolor="#533"
+            ))
+        node_ids = [node.id for node in nodes]
+        present = set(node_ids)
+        links = []
+        for link in self.workflow_reader.workflow_data.links:
+            source = owner.get(link.input_node_id, link.input_node_id)
+            target = owner.get(link.output_node_id, link.output_node_id)
+            if source != target and source in present and target in present:
+                links.append(replace(link, input_node_id=source, output_node_id=target))
+        links = self.drop_cycles(node_ids, links)
+        return WorkflowData(nodes, links, [], {}, 0, 0, {})
+
+    def order(self, orig_groups: Dict[int, List[Node]]) -> GroupHierarchy:
+        group_ids, members = self.assign(orig_groups)
+        interiors = ComponentLayout(self.workflow_reader, self.options).order(members)
+        hierarchy = GroupHierarchy(group_ids, interiors, [], max(self.workflow_reader.id_to_node, default=0) + 1)
+        coarse_data = self.coarse_workflow(hierarchy)
+        coarse_reader = WorkflowReader(coarse_data)
+        top_nodes = [node.id for node in coarse_reader.workflow_data.nodes]
+        hierarchy.top = MultilevelOrder.logic_order(coarse_reader, self.options, top_nodes)
+        instrument.count("hierarchy_groups", len(group_ids))
+        instrument.count("hierarchy_top_nodes", len(top_nodes))
+        instrument.count("hierarchy_top_links", len(coarse_data.links))
+        return hierarchy
+
+    def live_groups(self, orig_groups: Dict[int, List[Node]]) -> Dict[int, List[Node]]:
+        # 已被移除的中间节点还停在输入时的坐标，按它们计算分组边框会把整个画布都框进去，这里只保留仍在工作流中的节点
+        id_to_node = self.workflow_reader.id_to_node
+        groups = {group_id: [node for node in nodes if node.id in id_to_node] for group_id, nodes in orig_groups.items()}
+        return {group_id: nodes for group_id, nodes in groups.items() if nodes}
+
+    def align_dimensions(self, hierarchy: GroupHierarchy) -> None:
+        # 组内各列、顶层中散落节点的各列分别对齐宽度
+        workflow_writer = WorkflowWriter(self.workflow_reader.workflow_data, self.options)
+        for columns in hierarchy.interiors + [hierarchy.loose_columns()]:
+            workflow_writer.align_node_dimensions(columns)
+
+    def place(self, hierarchy: GroupHierarchy) -> None:
+        node_opt = self.options.node
+        group_opt = self.options.group
+        id_to_node = self.workflow_reader.id_to_node
+        id_to_group = {group.id: group for group in self.workflow_reader.workflow_data.groups}
+        pos_caculator = NodePosCalculator(self.workflow_reader, self.options)
+        sizes: List[Tuple[float, float]] = []
+        for group_id, columns in zip(hierarchy.group_ids, hierarchy.interiors):
+            pos_caculator.modify_node_layout(columns, align=node_opt.calculator_align, method=node_opt.layout_calculator)
+            nodes = [id_to_node[node] for node in DataTool.flatten_generator(columns)]
+            # modify_group_layout 按 size 计算分组边框，折叠节点取 size 和实际尺寸中较大的一个
+            x0 = min(node.pos.x for node in nodes)
+            y0 = min(node.pos.y for node in nodes)
+            x1 = max(node.pos.x + max(node.size.width, WorkflowReader.real_size(node).width) for node in nodes)
+            y1 = max(node.pos.y + max(node.size.height, WorkflowReader.real_size(node).height) for node in nodes)
+            # 为分组的边距和标题栏留出位置，group_layout 阶段按组内节点重新计算的边框正好落在超节点内
+            heading = id_to_group[group_id].font_size * group_opt.heading_size_multiplier
+            for node in nodes:
+                node.pos.x += group_opt.padding - x0
+                node.pos.y += heading - y0
+            sizes.append((x1 - x0 + group_opt.padding * 2, y1 - y0 + heading + group_opt.padding))
+        coarse_reader = WorkflowReader(self.coarse_workflow(hierarchy, sizes))
+        NodePosCalculator(coarse_reader, self.options).modify_node_layout(
+            hierarchy.top, align=node_opt.calculator_align, method=node_opt.layout_calculator
+        )
+        for idx, columns in enumerate(hierarchy.interiors):
+            super_node = coarse_reader.id_to_node[hierarchy.super_base + idx]
+            for node in DataTool.flatten_generator(columns):
+                id_to_node[node].pos.x += super_node.pos.x
+                id_to_node[node].pos.y += super_node.pos.y
@@ -0,0 +1,200 @@
+from typing import Dict, List, Set, Tuple
+from dataclasses import dataclass
+
+from .header import WorkflowData, Link
+from .parser import WorkflowReader
+from .pos_caculate import NodePosCalculator
+from .multilevel import MultilevelOrder
+from .metrics import LayoutMetrics
+from .Utils import DataTool, AlgorithmTool
+from .setting import LayoutOptions
+from . import instrument
+
+
+
+LinkKey = Tuple[int, int, int, int]
+
+
+@dataclass
+class LayoutDiff:
+    # 上一次的布局结果与当前工作流之间的差异；连线按 (上游, 输出端口, 下游, 输入端口) 比较，与 link_id 无关
+    added_nodes: Set[int]
+    removed_nodes: Set[int]
+    changed_nodes: Set[int]
+    added_links: Set[LinkKey]
+    removed_links: Set[LinkKey]
+
+    @staticmethod
+    def link_key(link: Link) -> LinkKey:
+        return (link.input_node_id, link.input_port, link.output_node_id, link.output_port)
+
+    @classmethod
+    def between(cls, previous: WorkflowData, current: WorkflowData) -> "LayoutDiff":
+        # 类型或尺寸变化的节点算作修改过的节点
+        previous_nodes = {node.id: node for node in previous.nodes}
+        current_nodes = {node.id: node for node in current.nodes}
+        changed_nodes = {
+            node_id for node_id, node in current_nodes.items()
+            if node_id in previous_nodes and (
+                node.type != previous_nodes[node_id].type
+                or (node.size.width, node.size.height) != (previous_nodes[node_id].size.width, previous_nodes[node_id].size.height)
+            )
+        }
+        previous_links = {cls.link_key(link) for link in previous.links}
+        current_links = {cls.link_key(link) for link in current.links}
+        return cls(
+            added_nodes=current_nodes.keys() - previous_nodes.keys(),
+            removed_nodes=previous_nodes.keys() - current_nodes.keys(),
+            changed_nodes=changed_nodes,
+            added_links=current_links - previous_links,
+            removed_links=previous_links - current_links
+        )
+
+    def touched_nodes(self, nodes: Set[int]) -> Set[int]:
+        # 新增或修改过的节点，以及增删的连线两端仍然存在的节点
+        touched = self.added_nodes | self.changed_nodes
+        for input_node_id, _, output_node_id, _ in self.added_links | self.removed_links:
+            touched.add(input_node_id)
+            touched.add(output_node_id)
+        return touched & nodes
+
+
+class IncrementalLayout(object):
+    # 在上一次的布局结果上增量布局：沿用上次的列和列内顺序，只给受影响的节点重新分层、排序和定位，
+    # 其余节点保持上次的坐标（前面插入新列时整体右移）。受影响的节点超过 max_affected_ratio 时退回完整布局
+    max_affected_ratio: float = 0.5
+
+    def __init__(self, workflow_reader: WorkflowReader, previous: WorkflowData, options: LayoutOptions | None = None) -> None:
+        self.workflow_reader = workflow_reader
+        self.previous_reader = WorkflowReader(previous)
+        self.options = options or LayoutOptions.current()
+        self.affected: Set[int] = set()
+        self.full_layout = False
+
+    def previous_columns(self) -> List[List[int]]:
+        # 上一次的结果中同列节点的 x 相同，按 x 分列、列内按 y 排序即可还原列和顺序
+        return LayoutMetrics(self.previous_reader, self.options).derive_columns()
+
+    def center_y(self, node_id: int) -> float:
+        node = self.workflow_reader.id_to_node[node_id]
+        return node.pos.y + WorkflowReader.real_size(node).height / 2
+
+    def assign_columns(self, nodes: List[int], diff: LayoutDiff) -> Dict[int, int]:
+        graph_index = self.workflow_reader.graph_index
+        node_set = set(nodes)
+        node_to_col = {
+            node: col for node, col in WorkflowReader.node_to_col(self.previous_columns()).items()
+            if node in node_set
+        }
+        order = list(DataTool.flatten_generator(AlgorithmTool.topological_sort(self.workflow_reader.build_graph(nodes))))
+        # 新节点有上游时放在上游最右列的下一列，只有下游时放在下游最左列的前一列，孤立的新节点放在第 0 列
+        for node in order:
+            if node not in node_to_col:
+                cols = [node_to_col[u] for u in graph_index.predecessors(node) if u in node_to_col]
+                if cols:
+                    node_to_col[node] = max(cols) + 1
+        for node in reversed(order):
+            if node not in node_to_col:
+                cols = [node_to_col[v] for v in graph_index.successors(node) if v in node_to_col]
+                node_to_col[node] = min(cols) - 1 if cols else 0
+        # 所有连线都必须从左列连向右列，只有上次就存在的同列连线（同列堆叠）保持不变；违反的下游节点右移
+        for node in order:
+            for link in graph_index.links_to(node):
+                col = node_to_col.get(link.input_node_id)
+                if col is None:
+                    continue
+                if col > node_to_col[node] or (col == node_to_col[node] and LayoutDiff.link_key(link) in diff.added_links):
+                    node_to_col[node] = col + 1
+                    self.affected.add(node)
+        shift = min(node_to_col.values(), default=0)
+        return {node: col - shift for node, col in node_to_col.items()}
+
+    def order(self) -> List[List[int]]:
+        nodes = [node.id for node in self.workflow_reader.workflow_data.nodes]
+        diff = LayoutDiff.between(self.previous_reader.workflow_data, self.workflow_reader.workflow_data)
+        self.affected = diff.touched_nodes(set(nodes))
+        reused = [node for node in nodes if node not in diff.added_nodes]
+        instrument.count("incremental_added_nodes", len(diff.added_nodes))
+        instrument.count("incremental_removed_nodes", len(diff.removed_nodes))
+        if not reused or len(self.affected) > len(nodes) * self.max_affected_ratio:
+            self.full_layout = True
+            self.affected = set(nodes)
+            instrument.count("incremental_full_layout")
+            return MultilevelOrder.logic_order(self.workflow_reader, self.options, nodes)
+        node_to_col = self.assign_columns(nodes, diff)
+        # 保留下来的节点先沿用上次的坐标，列内顺序和受影响节点的目标位置都以它为参照
+        previous_nodes = self.previous_reader.id_to_node
+        id_to_node = self.workflow_reader.id_to_node
+        for node in reused:
+            id_to_node[node].pos.x = previous_nodes[node].pos.x
+            id_to_node[node].pos.y = previous_nodes[node].pos.y
+        self.estimate_positions(nodes, node_to_col)
+        columns: List[List[int]] = [[] for _ in range(max(node_to_col.values(), default=-1) + 1)]
+        for node in sorted(nodes, key=lambda node: id_to_node[node].pos.y):
+            columns[node_to_col[node]].append(node)
+        instrument.count("incremental_affected_nodes", len(self.affected))
+        return [column for column in columns if column]
+
+    def estimate_positions(self, nodes: List[int], node_to_col: Dict[int, int]) -> None:
+        # 受影响的节点按拓扑序取相邻节点中心的中位数作为 y，新节点只有下游时再反向补一遍；
+        # 这里的 y 用于列内排序，也是 push_down 的目标位置
+        graph_index = self.workflow_reader.graph_index
+        id_to_node = self.workflow_reader.id_to_node
+        known = set(nodes) - self.affected
+        order = sorted(self.affected, key=node_to_col.__getitem__)
+        passes = ((order, graph_index.predecessors), (order[::-1], graph_index.successors))
+        for nodes_in_pass, neighbors in passes:
+            for node in nodes_in_pass:
+                if node in known:
+                    continue
+                centers = [self.center_y(neighbor) for neighbor in neighbors(node) if neighbor in known]
+                if centers:
+                    id_to_node[node].pos.y = DataTool.get_median(centers)
+                    known.add(node)
+
+    def push_down(self, column: List[int]) -> None:
+        # 列内按顺序从上到下放置：每个节点尽量停在目标 y，与上一个节点重叠时只下移到刚好不重叠，
+        # 原有节点之间的空隙会吸收新节点带来的位移，插入点下方离得远的节点不受影响
+        gap_y = self.options.node.gap_y
+        id_to_node = self.workflow_reader.id_to_node
+        bottom = None
+        for node in column:
+            node_obj = id_to_node[node]
+            if bottom is not None and node_obj.pos.y < bottom + gap_y:
+                node_obj.pos.y = bottom + gap_y
+            bottom = node_obj.pos.y + WorkflowReader.real_size(node_obj).height
+
+    def place(self, columns: List[List[int]]) -> None:
+        pos_caculator = NodePosCalculator(self.workflow_reader, self.options)
+        if self.full_layout:
+            pos_caculator.modify_node_layout(columns, align=self.options.node.calculator_align, method=self.options.node.layout_calculator)
+            return
+        gap_x = self.options.node.gap_x
+        id_to_node = self.workflow_reader.id_to_node
+        previous_nodes = self.previous_reader.id_to_node
+        # 列的 x 沿用上次的位置，放不下（前面插入了新列或列变宽）时才右移；没有旧节点的新列紧贴前一列
+        widths = [max(WorkflowReader.real_size(id_to_node[node]).width for node in column) for column in columns]
+        anchors = [
+            min((previous_nodes[node].pos.x for node in column if node in previous_nodes and node not in self.affected), default=None)
+            for column in columns
+        ]
+        first_anchor = next((idx for idx, anchor in enumerate(anchors) if anchor is not None), 0)
+        x = (anchors[first_anchor] or 0) - sum(widths[idx] + gap_x for idx in range(first_anchor))
+        dirty_columns = 0
+        for idx, column in enumerate(columns):
+            if anchors[idx] is not None:
+                x = max(x, anchors[idx])
+            if any(node in self.affected for node in column):
+                dirty_columns += 1
+                self.push_down(column)
+            for node in column:
+                id_to_node[node].pos.x = x
+            x += widths[idx] + gap_x
+        unmoved = sum(
+            1 for node in DataTool.flatten_generator(columns)
+            if node in previous_nodes
+            and (id_to_node[node].pos.x, id_to_node[node].pos.y) == (previous_nodes[node].pos.x, previous_nodes[node].pos.y)
+        )
+        instrument.count("incremental_dirty_columns", dirty_columns)
+        instrument.count("incremental_reused_columns", len(columns) - dirty_columns)
+        instrument.count("incremental_unmoved_nodes", unmoved)
@@ -0,0 +1,82 @@
+from typing import Dict, List, Any, Iterator, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import time
+
+
+
+@dataclass
+class LayoutReport:
+    # 一次布局的各阶段耗时（秒，按执行顺序）和热点计数；从检查点恢复而跳过的阶段记在 reused_stages
+    stages: Dict[str, float] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+    reused_stages: List[str] = field(default_factory=list)
+    cache_hit: bool = False
+    total_seconds: float = 0.0
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": self.total_seconds,
+            "stages": dict(self.stages),
+            "counters": dict(sorted(self.counters.items())),
+            "reused_stages": list(self.reused_stages),
+            "cache_hit": self.cache_hit,
+        }
+
+    def summary(self) -> str:
+        lines = [f"total {self.total_seconds * 1000:10.1f} ms"]
+        lines += [f"  {name:<26} {seconds * 1000:10.1f} ms" for name, seconds in self.stages.items()]
+        lines += [f"  {name:<26} {value:>10}" for name, value in sorted(self.counters.items())]
+        if self.reused_stages:
+            lines.append(f"  reused: {', '.join(self.reused_stages)}")
+        return "\n".join(lines)
+
+
+# 当前线程（或协程）正在记录的报告；为 None 时下面的函数只做一次查询就返回，几乎没有开销
+_active_report: ContextVar[Optional[LayoutReport]] = ContextVar("active_report", default=None)
+
+
+def active() -> Optional[LayoutReport]:
+    return _active_report.get()
+
+
+@contextmanager
+def recording(report: Optional[LayoutReport]) -> Iterator[Optional[LayoutReport]]:
+    # 在 with 块内记录到 report；report 为 None 时不记录。总耗时累加到 total_seconds
+    if report is None:
+        yield None
+        return
+    token = _active_report.set(report)
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.total_seconds += time.perf_counter() - start
+        _active_report.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    report = _active_report.get()
+    if report is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        report.add_time(name, time.perf_counter() - start)
+
+
+def count(name: str, value: int = 1) -> None:
+    # 热点循环里先在局部变量累计，循环结束后调用一次
+    report = _active_report.get()
+    if report is not None:
+        report.add_count(name, value)
@@ -0,0 +1,152 @@
+from typing import Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+import json
+import time
+import uuid
+
+from .setting import LayoutOptions
+from .cache import LayoutCache
+from .pipeline import layout_workflow, StageMemo
+
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    job_id: str
+    future: Future
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        if self.future.cancelled():
+            return "cancelled"
+        return "failed" if self.future.exception() is not None else "done"
+
+
+# 工作进程各自持有缓存和阶段检查点；磁盘缓存路径相同时，进程之间可以共享布局结果
+_worker_cache: Optional[LayoutCache] = None
+_worker_memo: Optional[StageMemo] = None
+
+
+def _init_worker(cache_db: str | None, cache_entries: int) -> None:
+    global _worker_cache, _worker_memo
+    _worker_cache = LayoutCache(max_entries=cache_entries, db_path=cache_db)
+    _worker_memo = StageMemo()
+
+
+def _run_layout(workflow: bytes, options: LayoutOptions) -> bytes:
+    result = layout_workflow(workflow, options, cache=_worker_cache, memo=_worker_memo)
+    return json.dumps(result, ensure_ascii=False).encode("utf-8")
+
+
+class LayoutJobQueue(object):
+    # 在有界的进程池中异步布局：提交后立即返回 job_id，未完成的任务数达到上限时拒绝新任务，
+    # 完成的结果保留 result_ttl 秒后清理
+    def __init__(
+            self,
+            max_workers: int | None = None,
+            max_pending: int = 16,
+            result_ttl: float = 600,
+            cache_db: str | Path | None = None,
+            cache_entries: int = 32
+        ) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.cache_db = str(cache_db) if cache_db else None
+        self.cache_entries = cache_entries
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> ProcessPoolExecutor:
+        # 第一次提交时才创建进程池，导入模块时不会启动子进程
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.cache_db, self.cache_entries)
+            )
+        return self.executor
+
+    def restart(self) -> ProcessPoolExecutor:
+        # 工作进程异常退出后进程池不再接受任务，丢弃它并新建一个；已提交的任务以 BrokenProcessPool 失败
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        return self.start()
+
+    def pending(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.finished_at is None)
+
+    def submit(self, workflow: bytes, options: LayoutOptions | Dict[str, Any] | None = None) -> str:
+        # 选项在提交时解析，工作进程只负责计算
+        options = LayoutOptions.resolve(options)
+        with self.lock:
+            self.purge_expired()
+            if self.pending() >= self.max_pending:
+                raise JobQueueFull(f"Too many pending layout jobs (limit {self.max_pending})")
+            try:
+                future = self.start().submit(_run_layout, workflow, options)
+            except BrokenProcessPool:
+                future = self.restart().submit(_run_layout, workflow, options)
+            job = Job(uuid.uuid4().hex, future)
+            self.jobs[job.job_id] = job
+        job.future.add_done_callback(lambda _: self.finish(job))
+        return job.job_id
+
+    def finish(self, job: Job) -> None:
+        with self.lock:
+            job.finished_at = time.time()
+
+    def purge_expired(self) -> None:
+        deadline = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None and job.finished_at < deadline]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            self.purge_expired()
+            return self.jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        status = {"job_id": job.job_id, "status": job.status, "submitted_at": job.submitted_at}
+        if job.finished_at is not None:
+            status["finished_at"] = job.finished_at
+            status["expires_at"] = job.finished_at + self.result_ttl
+        if job.status == "failed":
+            status["error"] = str(job.future.exception())
+        return status
+
+    def result(self, job_id: str) -> Optional[bytes]:
+        # 只有已成功完成的任务才有结果
+        job = self.get(job_id)
+        if job is None or job.status != "done":
+            return None
+        return job.future.result()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            stats = {"jobs": len(self.jobs), "pending": self.pending(), "max_pending": self.max_pending}
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+            self.executor = None
@@ -1,21 +1,26 @@
-from typing import Dict, List, Tuple, Iterable, Sequence, Optional, Literal, Set, Any
-from collections import OrderedDict
+from typing import Dict, List, Tuple, Iterable, Iterator, Sequence, Optional, Literal, Set, Callable, Any, IO
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from pathlib import Path
 import json
 import copy
+import io
 
 
-from .setting import NodeOptions, COLLAPSE_WIDTH, COLLAPSE_HEIGHT, TEMPLATE
+from .setting import LayoutOptions, ConfigRegistry, COLLAPSE_WIDTH, COLLAPSE_HEIGHT, TEMPLATE
 from .Utils import DataTool, AlgorithmTool
 from .header import WorkflowData, Node, NodeSize, Link
+from .index import GraphIndex
+from . import instrument
 
 
 
 class WorkflowGraph(object):
     def __init__(self, workflow_data: WorkflowData) -> None:
         self.workflow_data = workflow_data
-        self.id_to_node = {node.id: node for node in self.workflow_data.nodes}
-        self.id_to_link = {link.link_id: link for link in self.workflow_data.links}
+        self.graph_index = GraphIndex.of(workflow_data)
+        self.id_to_node = self.graph_index.id_to_node
+        self.id_to_link = self.graph_index.id_to_link
     
     @staticmethod
     def node_to_col(columns: List[List[int]]) -> Dict[int, int]:
@@ -31,11 +36,13 @@ class WorkflowGraph(object):
             links: Iterable[Tuple[int, int]] | None = None,
             output_graph: bool = True
         ) -> Dict[int, list[int]]:
+        instrument.count("build_graph")
         nodes = nodes if nodes else [node.id for node in self.workflow_data.nodes]
-        links = links if links else [(i.input_node_id, i.output_node_id) for i in self.workflow_data.links]
+        if not links:
+            return self.graph_index.subgraph(nodes, output_graph)
         edges = {node: [] for node in nodes}
         for input_node_id, output_node_id in links:
-            if input_node_id not in nodes or output_node_id not in nodes:
+            if input_node_id not in edges or output_node_id not in edges:
                 continue
             if output_graph:
                 edges[input_node_id].append(output_node_id)
@@ -45,26 +52,54 @@ class WorkflowGraph(object):
    
 
 class WorkflowIO(WorkflowGraph):
-    def __init__(self, workflow_data: WorkflowData) -> None:
-        super().__init__(workflow_data)
-        self.workflow_template = self.load_workflow_template()
+    @property
+    def workflow_template(self) -> Dict[str, Dict]:
+        # 模板只在用到时从进程级缓存中取，构造 WorkflowIO 不再读文件
+        return self.load_workflow_template()
 
-    def load_workflow_template(self) -> Dict[str, Dict]:
-        with open(TEMPLATE, "r", encoding="utf-8") as f:
-            return json.load(f)
+    @staticmethod
+    def load_workflow_template() -> Dict[str, Dict]:
+        return ConfigRegistry.load(TEMPLATE)
 
     @staticmethod
     def import_file(workflow_path: str) -> WorkflowData:
         WorkflowValidator.verify_workflow_file(workflow_path)
-        with open(workflow_path, 'r', encoding='utf-8') as f:
-            try:
-                workflow_dict = json.load(f)
-                workflow_data = WorkflowData.from_dict(workflow_dict)
-                return workflow_data
-            except Exception as e:
-                raise ValueError(f"Failed to parse workflow file: {e}")
-            
+        with open(workflow_path, 'rb') as f:
+            return WorkflowIO.load(f)
+
+    @staticmethod
+    def loads(workflow: bytes | str) -> WorkflowData:
+        workflow_dict = WorkflowIO.parse(workflow)
+        try:
+            return WorkflowData.from_dict(workflow_dict)
+        except Exception as e:
+            raise ValueError(f"Failed to parse workflow file: {e}")
+
+    @staticmethod
+    def parse(workflow: bytes | str) -> Dict[str, Any]:
+        try:
+            return json.loads(workflow)
+        except Exception as e:
+            raise ValueError(f"Failed to parse workflow file: {e}")
+
+    @staticmethod
+    def load(fp: IO[bytes] | IO[str]) -> WorkflowData:
+        return WorkflowIO.loads(fp.read())
+
     def export_file(self, output_path: str, overwrite_raw_data: bool = False) -> None:
+        with open(output_path, "wb") as f:
+            self.dump(f, overwrite_raw_data)
+
+    def dumps(self, overwrite_raw_data: bool = False) -> bytes:
+        return json.dumps(self.to_dict(overwrite_raw_data), ensure_ascii=False).encode("utf-8")
+
+    def dump(self, fp: IO[bytes] | IO[str], overwrite_raw_data: bool = False) -> None:
+        if isinstance(fp, io.TextIOBase):
+            json.dump(self.to_dict(overwrite_raw_data), fp, ensure_ascii=False)
+        else:
+            fp.write(self.dumps(overwrite_raw_data))
+
+    def to_dict(self, overwrite_raw_data: bool = False) -> Dict[str, Any]:
         if {node["id"] for node in self.workflow_data.raw_data.get("nodes", [])} == set(self.id_to_node.keys()):
             order_table = {node["id"]: node["order"] for node in self.workflow_data.raw_data.get("nodes", [])}
         else:
@@ -74,7 +109,7 @@ class WorkflowIO(WorkflowGraph):
         raw_data = self.workflow_data.raw_data
         if not overwrite_raw_data:
             raw_data = raw_data.copy()
-            raw_data["nodes"] = raw_data["nodes"].copy()
+            raw_data["nodes"] = [node.copy() for node in raw_data["nodes"]]
         
         nodes_template = self.workflow_template["nodes"]
         raw_id_nodes: Dict[int, Dict] = {node["id"]: node for node in raw_data["nodes"]}
@@ -88,7 +123,7 @@ class WorkflowIO(WorkflowGraph):
                 template: Dict = nodes_template.get(node_type, {})
                 if not template:
                     raise KeyError(f"type: {node_type} not found in nodes template.")
-                template_copy = template.copy()
+                template_copy = copy.deepcopy(template)
                 template_copy.update(new_node_dict)
                 raw_data["nodes"].append(template_copy)
 
@@ -101,9 +136,7 @@ class WorkflowIO(WorkflowGraph):
         raw_data["groups"] = [WorkflowReader.asdict(group) for group in self.workflow_data.groups]
         raw_data["last_node_id"] = self.workflow_data.last_node_id
         raw_data["last_link_id"] = self.workflow_data.last_link_id
-        
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(raw_data, f, ensure_ascii=False)
+        return raw_data
 
 
 class WorkflowValidator(WorkflowIO):
@@ -119,20 +152,17 @@ class WorkflowValidator(WorkflowIO):
             raise TypeError(f"Not a json file: {workflow_path}")
         
     def is_valid_link(self, link: Link) -> bool:
-        nodes = set(node.id for node in self.workflow_data.nodes)
-        if link.input_node_id not in nodes or link.output_node_id not in nodes:
+        if link.input_node_id not in self.id_to_node or link.output_node_id not in self.id_to_node:
             return False
         if link.input_node_id == link.output_node_id:
             return False
         if link.input_port < 0 or link.output_port < 0:
             return False
-        for i in self.workflow_data.links:
-            if (i.input_node_id == link.input_node_id and 
-                i.input_port == link.input_port and 
-                i.output_node_id == link.output_node_id and 
-                i.output_port == link.output_port):
-                return False
-        return True
+        duplicates = self.graph_index.query(
+            input_node_id=link.input_node_id, input_port=link.input_port,
+            output_node_id=link.output_node_id, output_port=link.output_port
+        )
+        return not duplicates
 
 
 class WorkflowReader(WorkflowIO):
@@ -146,34 +176,16 @@ class WorkflowReader(WorkflowIO):
         output_node_id: Optional[int] = None,
         output_port: Optional[int] = None,
         type: Optional[str] = None,
+        link_type: Optional[str] = None,
     ) -> List[Link]:
-        results = list()
-        search_criteria = []
-        if input_node_id is not None:
-            search_criteria.append(('input_node_id', input_node_id))
-        if input_port is not None:
-            search_criteria.append(('input_port', input_port))
-        if output_node_id is not None:
-            search_criteria.append(('output_node_id', output_node_id))
-        if output_port is not None:
-            search_criteria.append(('output_port', output_port))
-        if type is not None:
-            search_criteria.append(('type', type))
-
-        if not search_criteria:
-            return list()
-        for link in self.workflow_data.links:
-            match = True
-            for attr_name, target_value in search_criteria:
-                attr_value = getattr(link, attr_name)
-                if attr_value != target_value:
-                    match = False
-                    break
-            
-            if match:
-                results.append(link)
-        
-        return results
+        # type 是旧参数名，等价于 link_type
+        return self.graph_index.query(
+            input_node_id=input_node_id,
+            input_port=input_port,
+            output_node_id=output_node_id,
+            output_port=output_port,
+            link_type=link_type if link_type is not None else type,
+        )
 
     def trace_node(
         self,
@@ -184,21 +196,21 @@ class WorkflowReader(WorkflowIO):
         
         if direction not in ["forward", "backward"]:
             raise ValueError("direction must be either 'forward' or 'backward'")
-        queue: List[Node] = [start_node]
+        queue: deque[Node] = deque([start_node])
         visited: set[int] = {start_node.id}
         if direction == "forward":
-            graph = self.build_graph(output_graph=True)
+            neighbors_of = self.graph_index.successors
             interface = "inputs"
         else:
-            graph = self.build_graph(output_graph=False)
+            neighbors_of = self.graph_index.predecessors
             interface = "outputs"
         while queue:
-            current_node = queue.pop(0)
+            current_node = queue.popleft()
             if current_node != start_node:
                 for idx, port_info in enumerate(getattr(current_node, interface)):
                     if port_info["type"] == target_interface_type:
                         return current_node, idx
-            neighbor_ids = graph[current_node.id]
+            neighbor_ids = neighbors_of(current_node.id)
             for neighbor_id in neighbor_ids:
                 if neighbor_id in self.id_to_node and neighbor_id not in visited:
                     neighbor_node = self.id_to_node[neighbor_id]
@@ -211,6 +223,16 @@ class WorkflowReader(WorkflowIO):
         if node.flags and node.flags.get("collapsed", False):
             return NodeSize(width=COLLAPSE_WIDTH, height=COLLAPSE_HEIGHT)
         return node.size
+
+    def bounding_box(self, nodes: Iterable[int]) -> Tuple[float, float, float, float]:
+        # 节点按实际尺寸（折叠节点按折叠后的尺寸）计算的包围盒 (x0, y0, x1, y1)
+        rects = [(self.id_to_node[node], WorkflowReader.real_size(self.id_to_node[node])) for node in nodes]
+        return (
+            min(node.pos.x for node, _ in rects),
+            min(node.pos.y for node, _ in rects),
+            max(node.pos.x + size.width for node, size in rects),
+            max(node.pos.y + size.height for node, size in rects),
+        )
     
     @staticmethod
     def asdict(obj) -> OrderedDict | Any:
@@ -222,18 +244,50 @@ class WorkflowReader(WorkflowIO):
 
 
 class WorkflowWriter(WorkflowIO):
-    def __init__(self, workflow_data: WorkflowData) -> None:
+    def __init__(self, workflow_data: WorkflowData, options: LayoutOptions | None = None) -> None:
         super().__init__(workflow_data)
+        self.options = options or LayoutOptions.current()
         self.workflow_validator = WorkflowValidator(workflow_data)
+        self._removed_link_ids: Set[int] | None = None
+        self._removed_node_ids: Set[int] | None = None
+
+    @contextmanager
+    def deferred_compaction(self) -> Iterator[None]:
+        # 批量删除时先只更新索引，结束后再一次性压缩 nodes/links 列表，避免 list.remove 的 O(n)
+        if self._removed_link_ids is not None:
+            yield
+            return
+        self._removed_link_ids = set()
+        self._removed_node_ids = set()
+        try:
+            yield
+        finally:
+            removed_link_ids, removed_node_ids = self._removed_link_ids, self._removed_node_ids
+            self._removed_link_ids = self._removed_node_ids = None
+            if removed_link_ids:
+                self.workflow_data.links[:] = [
+                    link for link in self.workflow_data.links if link.link_id not in removed_link_ids
+                ]
+            if removed_node_ids:
+                self.workflow_data.nodes[:] = [
+                    node for node in self.workflow_data.nodes if node.id not in removed_node_ids
+                ]
+
+    @contextmanager
+    def transaction(self, strict: bool = True) -> Iterator["WorkflowTransaction"]:
+        # with 块内只记录操作，正常退出时统一校验并一次性应用；块内抛出异常则什么都不改
+        transaction = WorkflowTransaction(self, strict)
+        yield transaction
+        transaction.commit()
 
     def fold_unimportant_node(self) -> None:
         for node in self.workflow_data.nodes:
             if node.flags is None:
                 node.flags = {}
             node.flags["collapsed"] = False
-            if node.type in NodeOptions.fixed_unfold_nodes:
+            if node.type in self.options.node.fixed_unfold_nodes:
                 continue
-            if node.type in NodeOptions.fixed_fold_nodes:
+            if node.type in self.options.node.fixed_fold_nodes:
                 node.flags["collapsed"] = True
             if len(node.inputs) == 0 or len(node.inputs) > 2 or len(node.outputs) != 1:
                 continue
@@ -256,16 +310,14 @@ class WorkflowWriter(WorkflowIO):
         node_template.update(kwargs, id=self.workflow_data.last_node_id)
         node = Node.from_dict(node_template)
         self.workflow_data.nodes.append(node)
-        # 更新 id_to_node 映射
-        self.id_to_node[node.id] = node
+        self.graph_index.add_node(node)
         return node
 
     def create_link(self, input_node_id: int, input_port: int, output_node_id: int, output_port: int) -> Link | None:
         new_link = Link(0, input_node_id, input_port, output_node_id, output_port, "")
         if not self.workflow_validator.is_valid_link(new_link):
             return
-        workflow_reader = WorkflowReader(self.workflow_data)
-        old_links = workflow_reader.search_links(output_node_id=output_node_id, output_port=output_port)
+        old_links = self.graph_index.query(output_node_id=output_node_id, output_port=output_port)
         self.remove_links(*old_links)
         input_node = self.id_to_node[input_node_id]
         output_node = self.id_to_node[output_node_id]
@@ -276,8 +328,7 @@ class WorkflowWriter(WorkflowIO):
         new_link.link_id = self.workflow_data.last_link_id
         new_link.link_type = link_type
         self.workflow_data.links.append(new_link)
-        # 更新 id_to_link 映射
-        self.id_to_link[new_link.link_id] = new_link
+        self.graph_index.add_link(new_link)
         input_node_links = input_node.outputs[input_port]["links"]
         if isinstance(input_node_links, list):
             input_node.outputs[input_port]["links"].append(self.workflow_data.last_link_id)
@@ -298,12 +349,21 @@ class WorkflowWriter(WorkflowIO):
                 input_node.outputs[link.input_port]["links"].remove(link.link_id)
             if output_node.inputs[link.output_port]["link"] == link.link_id:
                 output_node.inputs[link.output_port]["link"] = None
-            self.workflow_data.links.remove(link)
-            self.id_to_link.pop(link.link_id)
+            if self._removed_link_ids is not None:
+                self._removed_link_ids.add(link_id)
+            else:
+                self.workflow_data.links.remove(link)
+            self.graph_index.remove_link(link)
 
     def remove_nodes(self, *nodes: Node) -> None:
+        with self.deferred_compaction():
+            self._remove_nodes(nodes)
+
+    def _remove_nodes(self, nodes: Iterable[Node]) -> None:
         workflow_reader = WorkflowReader(self.workflow_data)
         for node in nodes:
+            if node.id not in self.id_to_node:
+                continue
             old_input_links = workflow_reader.search_links(input_node_id=node.id)
             old_output_links = workflow_reader.search_links(output_node_id=node.id)
             for output_link in old_input_links:
@@ -317,41 +377,72 @@ class WorkflowWriter(WorkflowIO):
                 )
             self.remove_links(*old_input_links)
             self.remove_links(*old_output_links)
-            self.workflow_data.nodes.remove(node)
-            self.id_to_node.pop(node.id)
-            
+            self._removed_node_ids.add(node.id)
+            self.graph_index.remove_node(node.id)
+
     def remove_unnecessary_nodes(self) -> None:
-        wait_to_remove = [node for node in self.workflow_data.nodes if node.type == "Reroute"]
+        # Reroute / SetNode / GetNode 都是中间节点：先把每条中间节点链解析到真正的上游 (节点, 端口)，
+        # 再一次性把下游的连线改接到上游，最后统一删除中间节点和它们的连线
+        intermediate = {
+            node.id: node for node in self.workflow_data.nodes
+            if node.type in ("Reroute", "SetNode", "GetNode")
+        }
         all_set_nodes_map: Dict[str, Link] = {}
-        for node in self.workflow_data.nodes:
-            if node.type != "SetNode":
-                continue
-            if node.widgets_values:
-                set_node_label = str(node.widgets_values[0])
-                link = self.id_to_link.get(node.inputs[0].get("link", -1))
-                if link:
-                    all_set_nodes_map[set_node_label] = link
-            wait_to_remove.append(node)
-        
-        for node in self.workflow_data.nodes:
-            if node.type != "GetNode":
-                continue
-            wait_to_remove.append(node)
-            if not (node.widgets_values and node.widgets_values[0] in all_set_nodes_map):
+        for node in intermediate.values():
+            if node.type != "SetNode" or not node.widgets_values or not node.inputs:
                 continue
-            set_node_link = all_set_nodes_map[node.widgets_values[0]]
-            get_node_outputs = node.outputs[0].get("links", [])
-            if not get_node_outputs:
-                wait_to_remove.append(node)
+            link = self.id_to_link.get(node.inputs[0].get("link", -1))
+            if link:
+                all_set_nodes_map[str(node.widgets_values[0])] = link
+
+        resolved: Dict[int, Tuple[int, int] | None] = {}
+
+        def upstream(node_id: int) -> Tuple[int, int] | None:
+            # 沿链向上走到第一个非中间节点，途经的中间节点共享同一个结果
+            chain: List[int] = []
+            on_chain: Set[int] = set()
+            current = node_id
+            while True:
+                if current in resolved:
+                    source = resolved[current]
+                    break
+                if current in on_chain:
+                    source = None
+                    break
+                chain.append(current)
+                on_chain.add(current)
+                node = intermediate[current]
+                if node.type == "GetNode":
+                    link = all_set_nodes_map.get(node.widgets_values[0]) if node.widgets_values else None
+                else:
+                    link = self.id_to_link.get(node.inputs[0].get("link", -1)) if node.inputs else None
+                if link is None:
+                    source = None
+                    break
+                if link.input_node_id not in intermediate:
+                    source = (link.input_node_id, link.input_port)
+                    break
+                current = link.input_node_id
+            for node_id in chain:
+                resolved[node_id] = source
+            return source
+
+        rewired: List[Tuple[int, int, int, int]] = []
+        for link in self.workflow_data.links:
+            if link.input_node_id not in intermediate or link.output_node_id in intermediate:
                 continue
-            for link_id in get_node_outputs:
-                link = self.id_to_link.get(link_id)
-                if link:
-                    self.create_link(set_node_link.input_node_id, set_node_link.input_port, link.output_node_id, link.output_port)
+            source = upstream(link.input_node_id)
+            if source is not None:
+                rewired.append((*source, link.output_node_id, link.output_port))
+
+        # 无效的连线（如重复连线）直接跳过，和逐条 create_link 的行为一致
+        with self.transaction(strict=False) as transaction:
+            transaction.remove_nodes(*intermediate.values())
+            for input_node_id, input_port, output_node_id, output_port in rewired:
+                transaction.create_link(input_node_id, input_port, output_node_id, output_port)
         if self.workflow_data.extra.get("reroutes"):
             # 这里图方便直接强改了
             self.workflow_data.raw_data["extra"]["reroutes"] = []
-        self.remove_nodes(*wait_to_remove)
 
     def remove_nail(self) -> None:
         for node in self.workflow_data.nodes:
@@ -359,3 +450,184 @@ class WorkflowWriter(WorkflowIO):
                 continue
             node.flags["pinned"] = False
 
+
+
+class WorkflowTransaction(object):
+    # 批量编辑：先收集节点/连线的增删，提交时用哈希集合一次性校验，再逐项应用到索引和端口上，
+    # 被删除的节点和连线只做标记，最后统一压缩 nodes/links 列表；应用过程中出错会按撤销日志回滚
+    def __init__(self, workflow_writer: WorkflowWriter, strict: bool = True) -> None:
+        self.workflow_writer = workflow_writer
+        self.workflow_data = workflow_writer.workflow_data
+        self.graph_index = workflow_writer.graph_index
+        self.strict = strict
+        self.new_nodes: List[Node] = []
+        self.new_links: List[Link] = []
+        self.removed_node_ids: Set[int] = set()
+        self.removed_link_ids: Set[int] = set()
+        self.skipped_links: List[Link] = []
+        self.undo_log: List[Callable[[], None]] = []
+        self.saved_slots: Set[Tuple[int, str]] = set()
+
+    def create_node(self, type: str, **kwargs) -> Node:
+        nodes_template = self.workflow_writer.workflow_template["nodes"]
+        if type not in nodes_template:
+            raise KeyError("No such a node template, you need to config in config/template.json")
+        node_template: Dict = copy.deepcopy(nodes_template[type])
+        node_template.update(kwargs, id=self.workflow_data.last_node_id + len(self.new_nodes) + 1)
+        node = Node.from_dict(node_template)
+        self.new_nodes.append(node)
+        return node
+
+    def create_link(self, input_node_id: int, input_port: int, output_node_id: int, output_port: int) -> Link:
+        # 连线编号和类型在提交时确定
+        link = Link(0, input_node_id, input_port, output_node_id, output_port, "")
+        self.new_links.append(link)
+        return link
+
+    def remove_links(self, *links: Link) -> None:
+        self.removed_link_ids.update(link.link_id for link in links)
+
+    def remove_nodes(self, *nodes: Node) -> None:
+        # 直接删除节点及其所有连线，不会像 WorkflowWriter.remove_nodes 那样改接上下游
+        self.removed_node_ids.update(node.id for node in nodes)
+
+    def node_of(self, node_id: int, new_nodes: Dict[int, Node]) -> Node | None:
+        if node_id in self.removed_node_ids:
+            return None
+        return new_nodes.get(node_id) or self.graph_index.id_to_node.get(node_id)
+
+    def validate(self) -> Tuple[Set[int], List[Link]]:
+        id_to_link = self.graph_index.id_to_link
+        removed_link_ids = {link_id for link_id in self.removed_link_ids if link_id in id_to_link}
+        for node_id in self.removed_node_ids:
+            removed_link_ids.update(link.link_id for link in self.graph_index.links_from(node_id))
+            removed_link_ids.update(link.link_id for link in self.graph_index.links_to(node_id))
+        new_nodes = {node.id: node for node in self.new_nodes}
+        # 每个输入端口只能有一根线：同一端口上后创建的连线覆盖先前的连线
+        port_links: Dict[Tuple[int, int], Link] = {}
+        for link in self.new_links:
+            input_node = self.node_of(link.input_node_id, new_nodes)
+            output_node = self.node_of(link.output_node_id, new_nodes)
+            valid = (
+                input_node is not None and output_node is not None
+                and link.input_node_id != link.output_node_id
+                and 0 <= link.input_port < len(input_node.outputs)
+                and 0 <= link.output_port < len(output_node.inputs)
+                and not any(
+                    old_link.link_id not in removed_link_ids
+                    for old_link in self.graph_index.query(
+                        input_node_id=link.input_node_id, input_port=link.input_port,
+                        output_node_id=link.output_node_id, output_port=link.output_port
+                    )
+                )
+            )
+            if not valid:
+                if self.strict:
+                    raise ValueError(
+                        f"Invalid link {link.input_node_id}:{link.input_port} -> {link.output_node_id}:{link.output_port}"
+                    )
+                self.skipped_links.append(link)
+                continue
+            key = (link.output_node_id, link.output_port)
+            previous = port_links.pop(key, None)
+            if previous is not None:
+                self.skipped_links.append(previous)
+            port_links[key] = link
+        for output_node_id, output_port in port_links:
+            removed_link_ids.update(
+                link.link_id for link in self.graph_index.links_to(output_node_id, output_port)
+            )
+        new_links = [link for link in self.new_links if port_links.get((link.output_node_id, link.output_port)) is link]
+        return removed_link_ids, new_links
+
+    def save_slot(self, slot: Dict[str, Any], key: str) -> None:
+        # 每个端口在一次提交中只保存一次修改前的值，回滚时恢复它就够了；否则扇出很大的端口每改一次都要复制整个列表
+        if (id(slot), key) in self.saved_slots:
+            return
+        self.saved_slots.add((id(slot), key))
+        if key not in slot:
+            self.undo_log.append(lambda: slot.pop(key, None))
+            return
+        value = slot[key]
+        value = list(value) if isinstance(value, list) else value
+        self.undo_log.append(lambda: slot.__setitem__(key, value))
+
+    def commit(self) -> None:
+        removed_link_ids, new_links = self.validate()
+        try:
+            self.apply(removed_link_ids, new_links)
+        except Exception:
+            self.rollback()
+            raise
+        self.undo_log.clear()
+        self.saved_slots.clear()
+
+    def rollback(self) -> None:
+        while self.undo_log:
+            self.undo_log.pop()()
+        self.saved_slots.clear()
+
+    def apply(self, removed_link_ids: Set[int], new_links: List[Link]) -> None:
+        id_to_node = self.graph_index.id_to_node
+        id_to_link = self.graph_index.id_to_link
+        # 同一个输出端口上要删的连线先收集起来，最后每个端口只过滤一遍
+        slot_removals: Dict[int, Tuple[Dict[str, Any], Set[int]]] = {}
+        for link_id in removed_link_ids:
+            link = id_to_link[link_id]
+            # 将被删除的节点上的端口不用再维护
+            input_node = id_to_node.get(link.input_node_id) if link.input_node_id not in self.removed_node_ids else None
+            output_node = id_to_node.get(link.output_node_id) if link.output_node_id not in self.removed_node_ids else None
+            if input_node is not None and link.input_port < len(input_node.outputs):
+                slot = input_node.outputs[link.input_port]
+                if isinstance(slot.get("links"), list):
+                    slot_removals.setdefault(id(slot), (slot, set()))[1].add(link_id)
+            if output_node is not None and link.output_port < len(output_node.inputs):
+                slot = output_node.inputs[link.output_port]
+                if slot.get("link") == link_id:
+                    self.save_slot(slot, "link")
+                    slot["link"] = None
+            self.graph_index.remove_link(link)
+            self.undo_log.append(lambda link=link: self.graph_index.add_link(link))
+        for slot, link_ids in slot_removals.values():
+            if not link_ids.isdisjoint(slot["links"]):
+                self.save_slot(slot, "links")
+                slot["links"][:] = [link_id for link_id in slot["links"] if link_id not in link_ids]
+        for node_id in self.removed_node_ids:
+            node = id_to_node.get(node_id)
+            if node is None:
+                continue
+            self.graph_index.remove_node(node_id)
+            self.undo_log.append(lambda node=node: self.graph_index.add_node(node))
+        for node in self.new_nodes:
+            self.graph_index.add_node(node)
+            self.undo_log.append(lambda node=node: self.graph_index.remove_node(node.id))
+        last_node_id, last_link_id = self.workflow_data.last_node_id, self.workflow_data.last_link_id
+        self.undo_log.append(lambda: setattr(self.workflow_data, "last_node_id", last_node_id))
+        self.undo_log.append(lambda: setattr(self.workflow_data, "last_link_id", last_link_id))
+        self.workflow_data.last_node_id += len(self.new_nodes)
+        for link in new_links:
+            input_node = id_to_node[link.input_node_id]
+            output_node = id_to_node[link.output_node_id]
+            link_type = input_node.outputs[link.input_port].get("type", "*")
+            if link_type == "*":
+                link_type = output_node.inputs[link.output_port].get("type", "*")
+            self.workflow_data.last_link_id += 1
+            link.link_id = self.workflow_data.last_link_id
+            link.link_type = link_type
+            self.graph_index.add_link(link)
+            self.undo_log.append(lambda link=link: self.graph_index.remove_link(link))
+            input_slot = input_node.outputs[link.input_port]
+            self.save_slot(input_slot, "links")
+            if isinstance(input_slot.get("links"), list):
+                input_slot["links"].append(link.link_id)
+            else:
+                input_slot["links"] = [link.link_id]
+            output_slot = output_node.inputs[link.output_port]
+            self.save_slot(output_slot, "link")
+            output_slot["link"] = link.link_id
+        # 压缩列表：一次遍历去掉被标记删除的节点和连线，再追加新建的
+        nodes, links = list(self.workflow_data.nodes), list(self.workflow_data.links)
+        self.undo_log.append(lambda: self.workflow_data.nodes.__setitem__(slice(None), nodes))
+        self.undo_log.append(lambda: self.workflow_data.links.__setitem__(slice(None), links))
+        self.workflow_data.nodes[:] = [node for node in nodes if node.id not in self.removed_node_ids] + self.new_nodes
+        self.workflow_data.links[:] = [link for link in links if link.link_id not in removed_link_ids] + new_links
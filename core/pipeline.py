@@ -0,0 +1,362 @@
+from typing import Dict, List, Tuple, Iterable, Any, Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import hashlib
+import json
+import copy
+
+from .header import WorkflowData, Node
+from .parser import WorkflowIO, WorkflowReader, WorkflowWriter
+from .core import MainBranchShader
+from .pos_caculate import NodePosCalculator, GroupPosCalulator
+from .components import ComponentLayout
+from .multilevel import MultilevelOrder
+from .incremental import IncrementalLayout
+from .partial import PartialLayout
+from .hierarchy import HierarchicalLayout, GroupHierarchy
+from .setting import LayoutOptions
+from .cache import LayoutCache
+from .instrument import LayoutReport
+from . import instrument
+
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    node_options: Tuple[str, ...] = ()
+    group_options: Tuple[str, ...] = ()
+    # 是否在该阶段结束后保存检查点，后续只改动下游设置时可以直接从这里继续
+    memoize: bool = False
+
+    def signature(self, options: LayoutOptions) -> str:
+        values = [getattr(options.node, name) for name in self.node_options]
+        values += [getattr(options.group, name) for name in self.group_options]
+        return json.dumps(values, default=str)
+
+
+class LayoutState(object):
+    def __init__(
+            self,
+            workflow_data: WorkflowData,
+            columns: Optional[List[List[int]]] = None,
+            orig_groups: Optional[Dict[int, List[Node]]] = None,
+            components: Optional[List[List[List[int]]]] = None,
+            hierarchy: Optional[GroupHierarchy] = None
+        ) -> None:
+        self.workflow_data = workflow_data
+        self.workflow_reader = WorkflowReader(workflow_data)
+        self.workflow_writer = WorkflowWriter(workflow_data)
+        self.columns = columns
+        self.orig_groups = orig_groups
+        # 按连通分量布局时每个分量各自的列，否则为 None
+        self.components = components
+        # 按分组分层布局时分组内部和顶层各自的列，否则为 None
+        self.hierarchy = hierarchy
+
+    def clone(self) -> "LayoutState":
+        workflow_data = self.workflow_data.clone()
+        id_to_node = {node.id: node for node in workflow_data.nodes}
+        columns = [list(column) for column in self.columns] if self.columns is not None else None
+        orig_groups = None
+        if self.orig_groups is not None:
+            # 已被移除的中间节点不会再被修改，直接沿用原对象
+            orig_groups = {
+                group_id: [id_to_node.get(node.id, node) for node in nodes]
+                for group_id, nodes in self.orig_groups.items()
+            }
+        components = None
+        if self.components is not None:
+            components = [[list(column) for column in columns] for columns in self.components]
+        hierarchy = self.hierarchy.clone() if self.hierarchy is not None else None
+        return LayoutState(workflow_data, columns, orig_groups, components, hierarchy)
+
+
+class LayoutPipeline(object):
+    stages: Tuple[Stage, ...] = (
+        Stage("scan_groups", group_options=("group_contain_propertion",)),
+        Stage("remove_intermediate_nodes", node_options=("remove_intermediate_nodes",), memoize=True),
+        Stage("logic_order", node_options=(
+            "same_column_stacking_strength", "crossing_heuristic", "crossing_sweeps", "component_layout",
+            "multilevel_threshold", "hierarchical_groups"
+        ), memoize=True),
+        Stage("node_dimensions", node_options=("fixed_fold_nodes", "fixed_unfold_nodes"), memoize=True),
+        Stage("node_layout", node_options=(
+            "gap_x", "gap_y", "layout_calculator", "calculator_align",
+            "pava_weight", "main_path_weight", "placement_backend"
+        ), group_options=("padding", "heading_size_multiplier")),
+        Stage("group_layout", group_options=(
+            "group_contain_propertion", "same_group_node_propertion", "padding", "heading_size_multiplier",
+            "undistrubuted_x", "undistrubuted_width", "undistrubuted_height", "undistrubuted_y_step"
+        )),
+        Stage("main_path_color", node_options=("set_color_for_main_path", "main_path_color", "main_path_bg_color")),
+        Stage("remove_nails", node_options=("remove_nails",)),
+    )
+
+    def __init__(self, options: LayoutOptions | None = None, memo: Optional["StageMemo"] = None) -> None:
+        self.options = options or LayoutOptions.current()
+        self.memo = memo
+
+    def run(self, workflow_data: WorkflowData, workflow_key: Optional[str] = None) -> LayoutState:
+        signatures = [stage.signature(self.options) for stage in self.stages]
+        start = 0
+        state = None
+        if self.memo is not None and workflow_key is not None:
+            start, state = self.memo.restore(workflow_key, signatures)
+        if state is None:
+            state = LayoutState(workflow_data)
+        report = instrument.active()
+        if report is not None:
+            report.reused_stages.extend(stage.name for stage in self.stages[:start])
+        for idx in range(start, len(self.stages)):
+            stage = self.stages[idx]
+            with instrument.stage(stage.name):
+                getattr(self, stage.name)(state)
+            if stage.memoize and self.memo is not None and workflow_key is not None:
+                self.memo.save(workflow_key, signatures[:idx + 1], state)
+        return state
+
+    def scan_groups(self, state: LayoutState) -> None:
+        state.orig_groups = GroupPosCalulator(state.workflow_reader, self.options).get_orig_groups()
+
+    def remove_intermediate_nodes(self, state: LayoutState) -> None:
+        if self.options.node.remove_intermediate_nodes:
+            state.workflow_writer.remove_unnecessary_nodes()
+
+    def logic_order(self, state: LayoutState) -> None:
+        # 分层的分组布局优先于按连通分量布局；工作流中没有分组时按普通方式布局
+        if self.options.node.hierarchical_groups and state.orig_groups:
+            state.hierarchy = HierarchicalLayout(state.workflow_reader, self.options).order(state.orig_groups)
+            state.columns = state.hierarchy.columns()
+            return
+        if self.options.node.component_layout:
+            component_layout = ComponentLayout(state.workflow_reader, self.options)
+            state.components = component_layout.order(component_layout.split())
+            state.columns = ComponentLayout.merge_columns(state.components)
+            return
+        nodes = [i.id for i in state.workflow_data.nodes]
+        state.columns = MultilevelOrder.logic_order(state.workflow_reader, self.options, nodes)
+
+    def node_dimensions(self, state: LayoutState) -> None:
+        # 状态可能来自其他请求保存的检查点，依赖设置的写操作使用本次请求的设置
+        workflow_writer = WorkflowWriter(state.workflow_data, self.options)
+        if state.hierarchy is not None:
+            HierarchicalLayout(state.workflow_reader, self.options).align_dimensions(state.hierarchy)
+        else:
+            for columns in state.components if state.components is not None else [state.columns]:
+                workflow_writer.align_node_dimensions(columns)
+        workflow_writer.fold_unimportant_node()
+
+    def node_layout(self, state: LayoutState) -> None:
+        if state.hierarchy is not None:
+            HierarchicalLayout(state.workflow_reader, self.options).place(state.hierarchy)
+            return
+        if state.components is not None:
+            ComponentLayout(state.workflow_reader, self.options).place(state.components)
+            return
+        pos_caculator = NodePosCalculator(state.workflow_reader, self.options)
+        pos_caculator.modify_node_layout(state.columns, align=self.options.node.calculator_align, method=self.options.node.layout_calculator)
+
+    def group_layout(self, state: LayoutState) -> None:
+        orig_groups = state.orig_groups
+        if state.hierarchy is not None:
+            orig_groups = HierarchicalLayout(state.workflow_reader, self.options).live_groups(orig_groups)
+        GroupPosCalulator(state.workflow_reader, self.options).modify_group_layout(orig_groups)
+
+    def main_path_color(self, state: LayoutState) -> None:
+        if self.options.node.set_color_for_main_path:
+            main_branch_shader = MainBranchShader(state.workflow_reader, self.options)
+            main_branch_shader.set_color_for_main_path(list(state.workflow_reader.id_to_node.keys()))
+
+    def remove_nails(self, state: LayoutState) -> None:
+        if self.options.node.remove_nails:
+            state.workflow_writer.remove_nail()
+
+
+class IncrementalPipeline(LayoutPipeline):
+    # 在上一次的布局结果 previous 上增量布局：分层、排序和节点定位只处理受影响的节点和列，其余阶段与完整布局相同
+    _stages = {stage.name: stage for stage in LayoutPipeline.stages}
+    stages: Tuple[Stage, ...] = (
+        _stages["scan_groups"],
+        _stages["remove_intermediate_nodes"],
+        Stage("incremental_order"),
+        _stages["node_dimensions"],
+        Stage("incremental_layout"),
+        _stages["group_layout"],
+        _stages["main_path_color"],
+        _stages["remove_nails"],
+    )
+
+    def __init__(self, previous: WorkflowData, options: LayoutOptions | None = None) -> None:
+        super().__init__(options)
+        self.previous = previous
+        self.incremental: Optional[IncrementalLayout] = None
+
+    def incremental_order(self, state: LayoutState) -> None:
+        self.incremental = IncrementalLayout(state.workflow_reader, self.previous, self.options)
+        state.columns = self.incremental.order()
+
+    def incremental_layout(self, state: LayoutState) -> None:
+        self.incremental.place(state.columns)
+
+
+class StageMemo(object):
+    # 按工作流内容哈希保存各阶段检查点；检查点的键是截至该阶段所有设置的签名，
+    # 因此只有设置发生变化的阶段及其下游会重新计算
+    def __init__(self, max_workflows: int = 8, max_checkpoints: int = 8) -> None:
+        self.max_workflows = max_workflows
+        self.max_checkpoints = max_checkpoints
+        self.entries: OrderedDict[str, OrderedDict[Tuple[str, ...], LayoutState]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "reused_stages": 0}
+
+    @staticmethod
+    def workflow_key(workflow: Dict[str, Any] | bytes | str) -> str:
+        if isinstance(workflow, str):
+            workflow = workflow.encode("utf-8")
+        elif isinstance(workflow, dict):
+            workflow = json.dumps(workflow, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        return hashlib.sha256(workflow).hexdigest()
+
+    def restore(self, workflow_key: str, signatures: List[str]) -> Tuple[int, Optional[LayoutState]]:
+        with self.lock:
+            checkpoints = self.entries.get(workflow_key)
+            if checkpoints is not None:
+                self.entries.move_to_end(workflow_key)
+                for end in range(len(signatures), 0, -1):
+                    state = checkpoints.get(tuple(signatures[:end]))
+                    if state is not None:
+                        checkpoints.move_to_end(tuple(signatures[:end]))
+                        self.counters["hits"] += 1
+                        self.counters["reused_stages"] += end
+                        break
+                else:
+                    state = None
+            else:
+                state = None
+            if state is None:
+                self.counters["misses"] += 1
+                return 0, None
+        # 检查点本身只读，每次恢复都复制一份出来继续计算
+        return end, state.clone()
+
+    def save(self, workflow_key: str, signatures: List[str], state: LayoutState) -> None:
+        snapshot = state.clone()
+        with self.lock:
+            checkpoints = self.entries.setdefault(workflow_key, OrderedDict())
+            self.entries.move_to_end(workflow_key)
+            checkpoints[tuple(signatures)] = snapshot
+            checkpoints.move_to_end(tuple(signatures))
+            while len(checkpoints) > self.max_checkpoints:
+                checkpoints.popitem(last=False)
+            while len(self.entries) > self.max_workflows:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["workflows"] = len(self.entries)
+        return stats
+
+
+def layout_workflow(
+        workflow: Dict[str, Any] | bytes | str,
+        options: LayoutOptions | Dict[str, Any] | None = None,
+        cache: Optional[LayoutCache] = None,
+        memo: Optional[StageMemo] = None,
+        report: Optional[LayoutReport] = None
+    ) -> Dict[str, Any]:
+    # 内存中完成 解析 -> 布局 -> 导出，不经过临时文件；传入 dict 时不会修改调用方的数据。
+    # options 只作用于本次布局，在配置文件的设置上覆盖，不会修改全局的 NodeOptions。
+    # 传入 report 时把各阶段耗时和计数记录到其中
+    with instrument.recording(report):
+        return _layout_workflow(workflow, options, cache, memo)
+
+
+def _layout_workflow(
+        workflow: Dict[str, Any] | bytes | str,
+        options: LayoutOptions | Dict[str, Any] | None,
+        cache: Optional[LayoutCache],
+        memo: Optional[StageMemo]
+    ) -> Dict[str, Any]:
+    layout_options = LayoutOptions.resolve(options)
+    with instrument.stage("parse"):
+        workflow_key = StageMemo.workflow_key(workflow) if memo is not None else None
+        if isinstance(workflow, dict):
+            workflow_dict = copy.deepcopy(workflow)
+        else:
+            workflow_dict = WorkflowIO.parse(workflow)
+    cache_key = None
+    if cache is not None:
+        with instrument.stage("cache_lookup"):
+            cache_key = LayoutCache.workflow_key(workflow_dict, layout_options.as_dict())
+            patch = cache.get(cache_key)
+        if patch is not None:
+            report = instrument.active()
+            if report is not None:
+                report.cache_hit = True
+            with instrument.stage("cache_apply"):
+                return LayoutCache.apply_patch(workflow_dict, patch)
+    input_node_ids = {node.get("id") for node in workflow_dict.get("nodes", [])}
+    with instrument.stage("parse"):
+        try:
+            workflow_data = WorkflowData.from_dict(workflow_dict)
+        except Exception as e:
+            raise ValueError(f"Failed to parse workflow file: {e}")
+    state = LayoutPipeline(layout_options, memo).run(workflow_data, workflow_key)
+    with instrument.stage("export"):
+        # 有检查点时原始数据会被后续请求复用，导出时不能就地修改
+        result = state.workflow_writer.to_dict(overwrite_raw_data=memo is None)
+        if cache is not None and cache_key is not None:
+            cache.put(cache_key, LayoutCache.make_patch(input_node_ids, result))
+    return result
+
+
+def layout_workflow_data(workflow_data: WorkflowData, options: LayoutOptions | None = None) -> WorkflowWriter:
+    return LayoutPipeline(options).run(workflow_data).workflow_writer
+
+
+def relayout_workflow(
+        workflow: Dict[str, Any] | bytes | str,
+        previous: Dict[str, Any] | bytes | str,
+        options: LayoutOptions | Dict[str, Any] | None = None,
+        report: Optional[LayoutReport] = None
+    ) -> Dict[str, Any]:
+    # previous 是上一次 layout_workflow 的结果，workflow 是在它上面编辑（增删节点、改连线）后的工作流。
+    # 复用情况记录在 report 的 incremental_* 计数中
+    with instrument.recording(report):
+        layout_options = LayoutOptions.resolve(options)
+        with instrument.stage("parse"):
+            try:
+                previous_data = WorkflowData.from_dict(previous if isinstance(previous, dict) else WorkflowIO.parse(previous))
+                workflow_dict = copy.deepcopy(workflow) if isinstance(workflow, dict) else WorkflowIO.parse(workflow)
+                workflow_data = WorkflowData.from_dict(workflow_dict)
+            except Exception as e:
+                raise ValueError(f"Failed to parse workflow file: {e}")
+        state = IncrementalPipeline(previous_data, layout_options).run(workflow_data)
+        with instrument.stage("export"):
+            return state.workflow_writer.to_dict(overwrite_raw_data=True)
+
+
+def layout_selection(
+        workflow: Dict[str, Any] | bytes | str,
+        node_ids: Iterable[int],
+        options: LayoutOptions | Dict[str, Any] | None = None,
+        report: Optional[LayoutReport] = None
+    ) -> Dict[str, Any]:
+    # 只重新布局 node_ids 中的节点，放回它们原来的包围盒内；其余节点、分组和连线保持不变
+    with instrument.recording(report):
+        layout_options = LayoutOptions.resolve(options)
+        with instrument.stage("parse"):
+            try:
+                workflow_dict = copy.deepcopy(workflow) if isinstance(workflow, dict) else WorkflowIO.parse(workflow)
+                workflow_data = WorkflowData.from_dict(workflow_dict)
+            except Exception as e:
+                raise ValueError(f"Failed to parse workflow file: {e}")
+            # 建立连线索引是 O(N) 的，算在解析里；之后的布局只访问选中的节点
+            workflow_reader = WorkflowReader(workflow_data)
+        with instrument.stage("partial_layout"):
+            PartialLayout(workflow_reader, layout_options).layout(node_ids)
+        with instrument.stage("export"):
+            return WorkflowWriter(workflow_data, layout_options).to_dict(overwrite_raw_data=True)
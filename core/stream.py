@@ -0,0 +1,123 @@
+from typing import Dict, Tuple, Any, Iterable, Iterator, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor, Future
+from collections import deque
+import threading
+import queue
+import json
+import os
+
+from .setting import LayoutOptions
+from .pipeline import layout_workflow
+
+
+
+_worker_options: Optional[LayoutOptions] = None
+
+
+def _init_worker(options: LayoutOptions) -> None:
+    global _worker_options
+    _worker_options = options
+
+
+def _layout_record(record: int, line: bytes) -> Tuple[bool, bytes]:
+    # 每条记录单独捕获异常，错误作为一条输出记录返回，不会中断整个流
+    try:
+        workflow = json.loads(line)
+        if not isinstance(workflow, dict):
+            raise ValueError("Each line must be a workflow JSON object")
+        result = json.dumps(layout_workflow(workflow, _worker_options), ensure_ascii=False).encode("utf-8")
+    except Exception as e:
+        error = json.dumps({"record": record, "error": f"{type(e).__name__}: {e}"}, ensure_ascii=False)
+        return False, error.encode("utf-8") + b"\n"
+    return True, b'{"record": %d, "workflow": %s}\n' % (record, result)
+
+
+class NDJSONStream(object):
+    # 逐行读取工作流，同时在途的记录（包括已完成但还在等待按序输出的）不超过 max_in_flight 条，
+    # 因此无论输入多长，内存占用都有上限。输入在后台线程中读取，记录一完成就输出（有序模式下输出已完成的前缀），
+    # 不必等到后面的行到达
+    def __init__(
+            self,
+            options: LayoutOptions | Dict[str, Any] | None = None,
+            workers: int | None = None,
+            max_in_flight: int | None = None,
+            ordered: bool = True
+        ) -> None:
+        self.options = LayoutOptions.resolve(options)
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.max_in_flight = max(max_in_flight or self.workers * 2, 1)
+        self.ordered = ordered
+
+    @staticmethod
+    def records(lines: Iterable[bytes]) -> Iterator[Tuple[int, bytes]]:
+        # 记录号按非空行从 0 开始计数，空行直接跳过
+        record = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            yield record, line
+            record += 1
+
+    def run(self, lines: Iterable[bytes], write: Callable[[bytes], None]) -> Dict[str, int]:
+        counts = {"records": 0, "failed": 0}
+
+        def emit(output: Tuple[bool, bytes]) -> None:
+            succeeded, line = output
+            counts["records"] += 1
+            counts["failed"] += not succeeded
+            write(line)
+
+        if self.workers == 0:
+            # 不启动子进程，在当前进程中逐条处理
+            _init_worker(self.options)
+            for record, line in self.records(lines):
+                emit(_layout_record(record, line))
+            return counts
+        # 读线程送来的新记录和完成回调都放进 events，主线程按事件到达的顺序提交和输出；
+        # slots 限制在途的记录数，没有空位时读线程停止读取
+        events: queue.Queue = queue.Queue()
+        slots = threading.Semaphore(self.max_in_flight)
+        finished = object()
+
+        def read() -> None:
+            try:
+                for item in self.records(lines):
+                    slots.acquire()
+                    events.put(item)
+            except BaseException as e:
+                events.put(e)
+            events.put(None)
+
+        def release(output: Tuple[bool, bytes]) -> None:
+            slots.release()
+            emit(output)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.options,)) as executor:
+            # 先让子进程全部启动再开读线程：fork 时读线程可能正持有 stdin 的锁，子进程关闭 stdin 时会死锁
+            executor.submit(os.getpid).result()
+            threading.Thread(target=read, name="ndjson-reader", daemon=True).start()
+            in_flight: deque[Future] = deque()
+            reading = True
+            while reading or in_flight:
+                event = events.get()
+                if event is None:
+                    reading = False
+                elif isinstance(event, BaseException):
+                    raise event
+                elif event is not finished:
+                    record, line = event
+                    future = executor.submit(_layout_record, record, line)
+                    future.add_done_callback(lambda _: events.put(finished))
+                    in_flight.append(future)
+                self.flush(in_flight, release)
+        return counts
+
+    def flush(self, in_flight: deque, emit: Callable[[Tuple[bool, bytes]], None]) -> None:
+        # 不阻塞地输出已完成的记录；有序模式下只输出从队首开始连续完成的部分
+        if self.ordered:
+            while in_flight and in_flight[0].done():
+                emit(in_flight.popleft().result())
+            return
+        for future in [future for future in in_flight if future.done()]:
+            in_flight.remove(future)
+            emit(future.result())
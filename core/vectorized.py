@@ -0,0 +1,197 @@
+from typing import Dict, List, Literal
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .parser import WorkflowReader
+from .Utils import AlgorithmTool
+from .setting import LayoutOptions, COLLAPSE_WIDTH, COLLAPSE_HEIGHT
+from . import instrument
+
+
+HAS_NUMPY = np is not None
+
+
+
+class ColumnArrays(object):
+    # 一次性把节点的位置、真实尺寸和输入邻接读成数组，之后所有列都在数组上计算
+    def __init__(self, workflow_reader: WorkflowReader, columns: List[List[int]], input_edges: Dict[int, List[int]]) -> None:
+        id_to_node = workflow_reader.id_to_node
+        node_ids = list(chain.from_iterable(columns))
+        self.nodes = [id_to_node[node] for node in node_ids]
+        self.node_index = {node: idx for idx, node in enumerate(node_ids)}
+        # 等价于 WorkflowReader.real_size；高度保留 Python 原始类型，逐列转成数组时由 numpy 推断 int/float，
+        # 和纯 Python 路径的结果类型一致
+        collapsed = [bool(node.flags and node.flags.get("collapsed", False)) for node in self.nodes]
+        self.heights = [COLLAPSE_HEIGHT if fold else node.size.height for node, fold in zip(self.nodes, collapsed)]
+        self.widths = [COLLAPSE_WIDTH if fold else node.size.width for node, fold in zip(self.nodes, collapsed)]
+        self.ys = np.array([node.pos.y for node in self.nodes], dtype=np.float64)
+        self.half_heights = np.array(self.heights, dtype=np.float64) / 2
+        self.float_heights = np.array([not isinstance(height, int) for height in self.heights], dtype=bool)
+        # 列在扁平数组中是连续的一段，用切片表示
+        self.columns: List[slice] = []
+        start = 0
+        for column in columns:
+            self.columns.append(slice(start, start + len(column)))
+            start += len(column)
+        # 输入边按 CSR 格式存储：indptr[i]:indptr[i+1] 是第 i 个节点的输入节点下标
+        indptr = [0]
+        sources: List[int] = []
+        node_index = self.node_index.__getitem__
+        for node in node_ids:
+            sources.extend(map(node_index, input_edges[node]))
+            indptr.append(len(sources))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.sources = np.array(sources, dtype=np.int64)
+
+    def column_blocks(self, column: slice, gap_y: int | float) -> np.ndarray:
+        return np.array(self.heights[column]) + gap_y
+
+    def column_medians(self, column: slice) -> np.ndarray:
+        # 每个节点输入节点中心的中位数，没有输入的节点为 nan
+        indptr = self.indptr[column.start:column.stop + 1]
+        counts = np.diff(indptr)
+        medians = np.full(len(counts), np.nan)
+        if indptr[-1] == indptr[0]:
+            return medians
+        # 同一列的节点下标连续，因此它们的输入在 CSR 中也是连续的一段
+        segment = np.repeat(np.arange(len(counts)), counts)
+        sources = self.sources[indptr[0]:indptr[-1]]
+        centers = self.ys[sources] + self.half_heights[sources]
+        order = np.lexsort((centers, segment))
+        centers = centers[order]
+        seg_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        has_inputs = counts > 0
+        mid = seg_starts[has_inputs] + counts[has_inputs] // 2
+        odd = (counts[has_inputs] % 2) == 1
+        lower = np.where(odd, mid, mid - 1)
+        medians[has_inputs] = np.where(odd, centers[mid], (centers[mid] + centers[lower]) / 2)
+        return medians
+
+    def write_column(self, column: slice, x0: int | float, ys: List[int | float]) -> None:
+        self.ys[column] = ys
+        for node, y in zip(self.nodes[column], ys):
+            node.pos.x = x0
+            node.pos.y = y
+
+    def int_prefix(self, column: slice, gap_y: int | float) -> int:
+        # 纯 Python 路径逐个累加偏移量，遇到第一个浮点高度之前的偏移量都是 int
+        if not isinstance(gap_y, int):
+            return 1
+        float_idx = np.flatnonzero(self.float_heights[column])
+        return int(float_idx[0]) + 1 if len(float_idx) else column.stop - column.start + 1
+
+    def column_width(self, column: slice) -> int | float:
+        return max(self.widths[column])
+
+
+
+class VectorizedPosCalculator(object):
+    # 定位节点少于这个数量的列用栈式 PAVA：每轮 numpy 调用的固定开销在短列上比逐个合并更慢
+    pava_threshold: int = 256
+
+    def __init__(self, workflow_reader: WorkflowReader, options: LayoutOptions | None = None) -> None:
+        if np is None:
+            raise ImportError("numpy is required for the vectorized placement backend")
+        self.workflow_reader = workflow_reader
+        self.options = options or LayoutOptions.current()
+
+    @staticmethod
+    def align_line(align: str, base_y, accumulate_offsets):
+        if align == "top":
+            return base_y
+        elif align == "center":
+            return base_y - accumulate_offsets // 2
+        elif align == "bottom":
+            return base_y - accumulate_offsets
+        else:
+            raise ValueError("Cannot recognize the align type.")
+
+    @staticmethod
+    def exclusive_offsets(blocks: np.ndarray) -> np.ndarray:
+        offsets = np.zeros(len(blocks) + 1, dtype=blocks.dtype)
+        np.cumsum(blocks, out=offsets[1:])
+        return offsets
+
+    @staticmethod
+    def pava(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        # 分块数组上的加权 PAVA：每轮找出所有相邻逆序的块，把每一段连续逆序的块一次合并成一块，
+        # 直到块均值单调不减。合并逆序链等价于依次合并相邻逆序块，结果与 AlgorithmTool.pava_algorithm 相同（浮点误差内）
+        if np.any(weights <= 0):
+            raise ValueError(f"weights must be positive, got {weights.min()}")
+        sums = values * weights
+        block_weights = weights.astype(np.float64)
+        sizes = np.ones(len(values), dtype=np.int64)
+        while len(sums) > 1:
+            means = sums / block_weights
+            violated = means[:-1] > means[1:]
+            if not violated.any():
+                break
+            starts = np.flatnonzero(np.concatenate(([True], ~violated)))
+            sums = np.add.reduceat(sums, starts)
+            block_weights = np.add.reduceat(block_weights, starts)
+            sizes = np.add.reduceat(sizes, starts)
+        instrument.count("pava_merges", len(values) - len(sums))
+        return np.repeat(sums / block_weights, sizes)
+
+    @staticmethod
+    def stack_from(start_y: int | float, offsets: np.ndarray, int_prefix: int) -> List[int | float]:
+        # 从 start_y 开始依次堆叠，整数部分保持 int，使导出的 JSON 与纯 Python 路径逐字节一致
+        ys = (start_y + offsets[:-1]).tolist()
+        if isinstance(start_y, int) and offsets.dtype.kind == "f":
+            for idx in range(min(int_prefix, len(ys))):
+                ys[idx] = int(ys[idx])
+        return ys
+
+    def highly_align_calculator(
+            self,
+            columns: List[List[int]],
+            input_edges: Dict[int, List[int]],
+            base_x: int = 0,
+            base_y: int = 0,
+            align: Literal["top", "center", "bottom"] = "top",
+            weights: Dict[int, float] | None = None
+        ) -> None:
+        gap_x = self.options.node.gap_x
+        gap_y = self.options.node.gap_y
+        arrays = ColumnArrays(self.workflow_reader, columns, input_edges)
+        node_weights = np.array(
+            [weights.get(node.id, 1.0) if weights else 1.0 for node in arrays.nodes], dtype=np.float64
+        )
+        x0 = base_x
+        for column in arrays.columns:
+            blocks = arrays.column_blocks(column, gap_y)
+            offsets = self.exclusive_offsets(blocks)
+            medians = arrays.column_medians(column)
+            located = np.flatnonzero(~np.isnan(medians))
+            if len(located) == 0:
+                start_y = self.align_line(align, base_y, offsets[-1].item())
+                ys = self.stack_from(start_y, offsets, arrays.int_prefix(column, gap_y))
+                arrays.write_column(column, x0, ys)
+                x0 += (arrays.column_width(column) + gap_x)
+                continue
+            desired = medians[located]
+            if len(located) > 1:
+                # k[j] 为相邻两个定位节点之间的距离，c 为其前缀和，问题化为对 desired - c 做保序回归
+                k = offsets[located[1:]] - offsets[located[:-1]]
+                c = np.zeros(len(located))
+                np.cumsum(k, out=c[1:])
+                if len(located) >= self.pava_threshold:
+                    z = self.pava(desired - c, node_weights[column][located])
+                else:
+                    z = np.asarray(AlgorithmTool.pava_algorithm((desired - c).tolist(), node_weights[column][located].tolist()))
+                x = z + c
+            else:
+                x = desired
+            # 定位节点取保序回归的结果，未定位节点紧跟在上一个节点之后；首个定位节点之前的节点向上堆叠
+            anchor = np.full(len(blocks), -1, dtype=np.int64)
+            anchor[located] = located
+            anchor = np.maximum.accumulate(anchor)
+            anchor[anchor < 0] = located[0]
+            located_rank = np.searchsorted(located, anchor)
+            ys = x[located_rank] + (offsets[:-1] - offsets[anchor])
+            arrays.write_column(column, x0, ys.tolist())
+            x0 += (arrays.column_width(column) + gap_x)
@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmark"))
+
+from workflow_generator import WorkflowGenerator
+
+
+FIXTURE = ROOT / "backend" / "src" / "半理想的排线布局.json"
+
+
+@pytest.fixture
+def builder() -> WorkflowGenerator:
+    # 手工搭建小工作流：用 add / add_node / connect 添加节点和连线，generate(0) 导出为字典；节点不折叠
+    return WorkflowGenerator(seed=0, collapse_ratio=0)
+
+
+def index_state(graph_index) -> tuple:
+    # 索引中可比较的内容：节点、连线以及按节点和端口分桶的连线编号
+    def buckets(table) -> dict:
+        return {key: sorted(links) for key, links in table.items() if links}
+    return (
+        sorted(graph_index.id_to_node), sorted(graph_index.id_to_link),
+        buckets(graph_index.out_links), buckets(graph_index.in_links),
+        buckets(graph_index.input_port_links), buckets(graph_index.output_port_links),
+        buckets(graph_index.type_links),
+    )
+
+
+def assert_index_consistent(workflow_data) -> None:
+    # 增量维护的索引必须和按当前 nodes/links 重建的索引一致
+    from core.index import GraphIndex
+    assert index_state(workflow_data.graph_index) == index_state(GraphIndex(workflow_data))
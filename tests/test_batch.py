@@ -0,0 +1,53 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from core.batch import BatchLayout
+from core.__main__ import main
+
+from conftest import FIXTURE
+
+
+@pytest.fixture
+def inputs(tmp_path) -> Path:
+    # a/x.json、b/x.json 同名，c/nested/y.json 在子目录中
+    root = tmp_path / "in"
+    for rel in ("a/x.json", "b/x.json", "c/nested/y.json"):
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(FIXTURE, root / rel)
+    return root
+
+
+def test_glob_keeps_path_below_its_base(inputs, tmp_path):
+    runner = BatchLayout(tmp_path / "out")
+    found = {rel.as_posix() for _, rel in runner.find_workflows([str(inputs / "*" / "x.json"), str(inputs / "**" / "y.json")])}
+    assert found == {"a/x.json", "b/x.json", "c/nested/y.json"}
+    assert BatchLayout.glob_base("a/b/**/*.json") == Path("a/b")
+    assert BatchLayout.glob_base("*.json") == Path(".")
+
+
+@pytest.mark.parametrize("patterns", [
+    ["a/x.json", "b/x.json"],
+    ["a", "b"],
+])
+def test_colliding_outputs_are_rejected(inputs, tmp_path, patterns):
+    runner = BatchLayout(tmp_path / "out")
+    with pytest.raises(ValueError, match="would both be written to"):
+        runner.find_workflows([str(inputs / pattern) for pattern in patterns])
+
+
+def test_cli_fails_before_writing_anything(inputs, tmp_path, capsys):
+    output_dir = tmp_path / "out"
+    assert main(["batch", str(inputs / "a" / "x.json"), str(inputs / "b" / "x.json"), "-o", str(output_dir), "-j", "1"]) == 2
+    assert "would both be written to" in capsys.readouterr().err
+    assert not output_dir.exists()
+
+
+def test_batch_writes_nested_outputs(inputs, tmp_path):
+    runner = BatchLayout(tmp_path / "out", workers=1)
+    results = list(runner.run([str(inputs / "**" / "*.json")]))
+    assert sorted(result.status for result in results) == ["done"] * 3
+    for rel in ("a/x.json", "b/x.json", "c/nested/y.json"):
+        assert json.loads((tmp_path / "out" / rel).read_text(encoding="utf-8"))["nodes"]
@@ -0,0 +1,109 @@
+import copy
+import json
+
+import pytest
+
+import core.cache
+from core.cache import LayoutCache
+from core.pipeline import layout_workflow
+from core.instrument import LayoutReport
+from core.setting import LayoutOptions
+
+from workflow_generator import generate_workflow
+from conftest import FIXTURE
+
+
+@pytest.fixture(scope="module")
+def workflow() -> dict:
+    return json.loads(FIXTURE.read_bytes())
+
+
+def dumps(workflow_dict: dict) -> str:
+    return json.dumps(workflow_dict, sort_keys=True, ensure_ascii=False)
+
+
+def test_hit_returns_uncached_result(workflow, tmp_path):
+    expected = dumps(layout_workflow(workflow))
+    cache = LayoutCache(db_path=tmp_path / "cache.sqlite3")
+    assert dumps(layout_workflow(workflow, cache=cache)) == expected
+    report = LayoutReport()
+    assert dumps(layout_workflow(workflow, cache=cache, report=report)) == expected
+    assert report.cache_hit
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+    # 新的实例读同一个数据库，命中磁盘缓存
+    reopened = LayoutCache(db_path=tmp_path / "cache.sqlite3")
+    assert dumps(layout_workflow(workflow, cache=reopened)) == expected
+    assert reopened.stats()["disk_hits"] == 1 and reopened.stats()["disk_entries"] == 1
+
+
+def test_options_are_part_of_the_key(workflow):
+    cache = LayoutCache()
+    layout_workflow(workflow, cache=cache)
+    layout_workflow(workflow, {"gap_x": 300}, cache=cache)
+    assert cache.stats()["misses"] == 2
+
+
+def test_key_ignores_fields_that_do_not_affect_layout(workflow):
+    options = {"gap_x": 100}
+    key = LayoutCache.workflow_key(workflow, options)
+    edited = copy.deepcopy(workflow)
+    node = next(node for node in edited["nodes"] if node["type"] not in ("SetNode", "GetNode") and node.get("widgets_values"))
+    node["widgets_values"] = ["changed"]
+    assert LayoutCache.workflow_key(edited, options) == key
+    node["pos"] = [-12345, -12345]
+    assert LayoutCache.workflow_key(edited, options) != key
+
+
+def test_recolored_nodes_keep_their_colors(workflow):
+    cache = LayoutCache()
+    layout_workflow(workflow, cache=cache)
+    recolored = copy.deepcopy(workflow)
+    for node in recolored["nodes"]:
+        node["color"], node["bgcolor"] = "#123456", "#654321"
+    result = layout_workflow(recolored, cache=cache)
+    assert cache.stats()["misses"] == 2
+    assert dumps(result) == dumps(layout_workflow(recolored))
+    # 主路径上的节点由布局重新着色，其余节点保留用户设置的颜色
+    main_path_color = LayoutOptions.current().node.main_path_color
+    kept = [node for node in result["nodes"] if node.get("color") != main_path_color]
+    assert kept and all((node["color"], node["bgcolor"]) == ("#123456", "#654321") for node in kept)
+
+
+def test_key_changes_with_code_version(workflow, monkeypatch):
+    key = LayoutCache.workflow_key(workflow, {})
+    monkeypatch.setattr(core.cache, "_code_version", "other")
+    assert LayoutCache.code_version() == "other"
+    assert LayoutCache.workflow_key(workflow, {}) != key
+
+
+def test_patch_round_trip():
+    # 生成的工作流包含 Reroute 和 SetNode/GetNode，布局时会删除和新建节点
+    workflow_dict = generate_workflow(300, seed=2)
+    result = layout_workflow(workflow_dict)
+    patch = LayoutCache.make_patch({node["id"] for node in workflow_dict["nodes"]}, result)
+    patch = json.loads(json.dumps(patch))
+    assert dumps(LayoutCache.apply_patch(copy.deepcopy(workflow_dict), patch)) == dumps(result)
+
+
+def test_memory_lru_eviction():
+    cache = LayoutCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"key": key})
+    assert cache.get("a") is None
+    assert cache.get("b") == {"key": "b"}
+    cache.put("d", {"key": "d"})
+    # b 刚被访问过，淘汰的是 c
+    assert cache.get("c") is None and cache.get("b") is not None
+    assert cache.stats()["memory_evictions"] == 2
+
+
+def test_disk_eviction_keeps_size_bound(tmp_path):
+    cache = LayoutCache(max_entries=1, db_path=tmp_path / "cache.sqlite3", max_db_bytes=2000)
+    for idx in range(20):
+        cache.put(f"key{idx}", {"payload": list(range(idx * 1000, idx * 1000 + 300))})
+    stats = cache.stats()
+    assert stats["disk_bytes"] <= 2000 and stats["disk_evictions"] > 0
+    # 最近写入的一条总是保留
+    assert cache.get("key19") == {"payload": list(range(19000, 19300))}
+    cache.clear()
+    assert cache.stats()["disk_entries"] == 0 and cache.get("key19") is None
@@ -0,0 +1,39 @@
+import copy
+import pickle
+
+from core.header import NodePos, NodeSize
+from core.pipeline import layout_workflow
+from core.components import ComponentLayout
+from core.instrument import LayoutReport
+
+from workflow_generator import generate_workflow
+
+
+COMPONENTS = {"component_layout": True}
+
+
+def position(node: dict) -> tuple:
+    pos = node["pos"]
+    return (pos["0"], pos["1"]) if isinstance(pos, dict) else tuple(pos)
+
+
+def test_node_properties_survive_pickle():
+    # 发给子进程的节点要能按字段还原，不能读到导出用的 __dict__
+    for prop in (NodePos(1, 2), NodeSize(3, 4)):
+        assert pickle.loads(pickle.dumps(prop)) == prop
+        assert copy.deepcopy(prop) == prop
+
+
+def test_parallel_order_matches_serial(monkeypatch):
+    workflow = generate_workflow(600, seed=3)
+    monkeypatch.setattr(ComponentLayout, "parallel_threshold", 10)
+    report = LayoutReport()
+    parallel = layout_workflow(workflow, {**COMPONENTS, "component_workers": 2}, report=report)
+    assert report.counters["components_parallel"] > 1
+    assert parallel == layout_workflow(workflow, {**COMPONENTS, "component_workers": 1})
+
+
+def test_links_point_right():
+    result = layout_workflow(generate_workflow(600, seed=3), COMPONENTS)
+    x = {node["id"]: position(node)[0] for node in result["nodes"]}
+    assert all(x[link[1]] <= x[link[3]] for link in result["links"] if link[1] in x and link[3] in x)
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from core.header import WorkflowData, Link
+from core.parser import WorkflowReader
+from core.pipeline import layout_workflow
+from core.pos_caculate import GroupPosCalulator
+from core.hierarchy import HierarchicalLayout, GroupHierarchy
+from core.instrument import LayoutReport
+from core.setting import LayoutOptions
+
+from workflow_generator import generate_workflow
+from conftest import FIXTURE
+
+
+HIERARCHICAL = {"hierarchical_groups": True}
+
+
+def position(node: dict) -> tuple:
+    pos = node["pos"]
+    return (pos["0"], pos["1"]) if isinstance(pos, dict) else tuple(pos)
+
+
+def overlaps(a: list, b: list) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def test_drop_cycles_removes_back_edges_only():
+    links = [Link(1, 1, 0, 2, 0, "*"), Link(2, 2, 0, 3, 0, "*"), Link(3, 3, 0, 1, 0, "*"), Link(4, 1, 0, 3, 1, "*")]
+    kept = HierarchicalLayout.drop_cycles([1, 2, 3], links)
+    assert [link.link_id for link in kept] == [1, 2, 4]
+    assert HierarchicalLayout.drop_cycles([1, 2, 3], kept) == kept
+
+
+def test_group_hierarchy_columns():
+    hierarchy = GroupHierarchy([7, 8], [[[1], [2, 3]], [[4]]], [[5, 10], [11, 6]], 10)
+    assert hierarchy.loose_columns() == [[5], [6]]
+    assert hierarchy.columns() == [[5, 1, 2, 3], [4, 6]]
+    clone = hierarchy.clone()
+    clone.interiors[0][1].append(9)
+    clone.top[0].append(12)
+    assert hierarchy.interiors[0][1] == [2, 3] and hierarchy.top[0] == [5, 10]
+
+
+def test_nested_groups_assign_to_smallest(builder):
+    # outer 包含全部四个节点，inner 只包含后两个
+    loader = builder.add("CheckpointLoaderSimple")
+    text = builder.add("CLIPTextEncode")
+    latent = builder.add("EmptyLatentImage")
+    sampler = builder.add("KSampler")
+    builder.connect(loader, 1, text, 0)
+    builder.connect(loader, 0, sampler, 0)
+    builder.connect(text, 0, sampler, 1)
+    builder.connect(latent, 0, sampler, 3)
+    workflow = builder.generate(0)
+    for node, pos in zip(workflow["nodes"], ([0, 0], [0, 600], [1000, 0], [1000, 600])):
+        node["pos"] = pos
+    workflow["groups"] = [
+        {"id": 1, "title": "outer", "bounding": [-50, -50, 1700, 1300], "color": "#3f789e", "font_size": 24, "flags": {}},
+        {"id": 2, "title": "inner", "bounding": [950, -50, 600, 1300], "color": "#3f789e", "font_size": 24, "flags": {}},
+    ]
+    workflow_reader = WorkflowReader(WorkflowData.from_dict(workflow))
+    orig_groups = GroupPosCalulator(workflow_reader).get_orig_groups()
+    group_ids, members = HierarchicalLayout(workflow_reader).assign(orig_groups)
+    assert dict(zip(group_ids, members)) == {1: [loader, text], 2: [latent, sampler]}
+
+
+@pytest.fixture(scope="module")
+def grouped() -> dict:
+    return generate_workflow(300, seed=5, group_ratio=1.0)
+
+
+def test_groups_are_laid_out_as_blocks(grouped):
+    report = LayoutReport()
+    result = layout_workflow(grouped, HIERARCHICAL, report=report)
+    assert report.counters["hierarchy_groups"] == len(grouped["groups"])
+    group_options = LayoutOptions.current().group
+    boundings = [group["bounding"] for group in result["groups"]]
+    # 每个分组都被重新定位，分组之间不重叠
+    assert all(bounding[0] != group_options.undistrubuted_x or bounding[2] != group_options.undistrubuted_width for bounding in boundings)
+    assert not any(overlaps(a, b) for idx, a in enumerate(boundings) for b in boundings[idx + 1:])
+    x = {node["id"]: position(node)[0] for node in result["nodes"]}
+    assert all(x[link[1]] <= x[link[3]] for link in result["links"] if link[1] in x and link[3] in x)
+
+
+def test_without_groups_matches_flat_layout():
+    workflow = json.loads(FIXTURE.read_bytes())
+    workflow["groups"] = []
+    assert layout_workflow(workflow, HIERARCHICAL) == layout_workflow(workflow)
@@ -0,0 +1,99 @@
+import copy
+import json
+
+import pytest
+
+from core.header import WorkflowData
+from core.pipeline import layout_workflow, relayout_workflow
+from core.incremental import LayoutDiff
+from core.instrument import LayoutReport
+from core.metrics import LayoutMetrics
+
+from conftest import FIXTURE
+
+
+@pytest.fixture(scope="module")
+def previous() -> dict:
+    return layout_workflow(json.loads(FIXTURE.read_bytes()))
+
+
+def position(node: dict) -> tuple:
+    pos = node["pos"]
+    return (pos["0"], pos["1"]) if isinstance(pos, dict) else tuple(pos)
+
+
+def add_consumer(workflow: dict, source: int, slot: int = 0) -> int:
+    # 在 source 的输出端口后接一个没有下游的新节点
+    node_id = workflow["last_node_id"] = workflow["last_node_id"] + 1
+    link_id = workflow["last_link_id"] = workflow["last_link_id"] + 1
+    source_node = next(node for node in workflow["nodes"] if node["id"] == source)
+    link_type = source_node["outputs"][slot]["type"]
+    workflow["nodes"].append({
+        "id": node_id, "type": "PreviewAny", "pos": [0, 0], "size": [100, 60], "flags": {}, "order": node_id, "mode": 0,
+        "inputs": [{"name": "source", "type": link_type, "link": link_id}], "outputs": [], "properties": {}, "widgets_values": []
+    })
+    source_node["outputs"][slot].setdefault("links", []).append(link_id)
+    workflow["links"].append([link_id, source, slot, node_id, 0, link_type])
+    return node_id
+
+
+def remove_link(workflow: dict, link_id: int) -> None:
+    workflow["links"] = [link for link in workflow["links"] if link[0] != link_id]
+    for node in workflow["nodes"]:
+        for slot in node.get("outputs", []):
+            if link_id in (slot.get("links") or []):
+                slot["links"].remove(link_id)
+        for slot in node.get("inputs", []):
+            if slot.get("link") == link_id:
+                slot["link"] = None
+
+
+def test_diff_between(previous):
+    current = copy.deepcopy(previous)
+    added = add_consumer(current, current["links"][0][1], current["links"][0][2])
+    removed_link = current["links"][1]
+    remove_link(current, removed_link[0])
+    current["nodes"][0]["size"] = [1234, 567]
+    diff = LayoutDiff.between(WorkflowData.from_dict(copy.deepcopy(previous)), WorkflowData.from_dict(current))
+    assert diff.added_nodes == {added} and diff.removed_nodes == set()
+    assert diff.changed_nodes == {current["nodes"][0]["id"]}
+    assert diff.added_links == {(current["links"][0][1], current["links"][0][2], added, 0)}
+    assert diff.removed_links == {tuple(removed_link[1:5])}
+    assert diff.touched_nodes({node["id"] for node in current["nodes"]}) == {
+        added, current["nodes"][0]["id"], current["links"][0][1], removed_link[1], removed_link[3]
+    }
+
+
+def test_unchanged_workflow_keeps_every_position(previous):
+    report = LayoutReport()
+    result = relayout_workflow(copy.deepcopy(previous), previous, report=report)
+    assert [position(node) for node in result["nodes"]] == [position(node) for node in previous["nodes"]]
+    assert report.counters["incremental_affected_nodes"] == 0
+    assert report.counters["incremental_unmoved_nodes"] == len(previous["nodes"])
+
+
+def test_small_edit_moves_few_nodes(previous):
+    current = copy.deepcopy(previous)
+    sources = [link[1] for link in current["links"][::20][:3]]
+    added = [add_consumer(current, source) for source in sources]
+    report = LayoutReport()
+    result = relayout_workflow(current, previous, report=report)
+    assert report.counters["incremental_added_nodes"] == 3
+    assert "incremental_full_layout" not in report.counters
+    previous_positions = {node["id"]: position(node) for node in previous["nodes"]}
+    unmoved = [node for node in result["nodes"] if previous_positions.get(node["id"]) == position(node)]
+    assert len(unmoved) == report.counters["incremental_unmoved_nodes"] >= len(previous["nodes"]) * 0.9
+    # 新节点在上游的右侧，所有连线都从左连向右，节点不重叠
+    x = {node["id"]: position(node)[0] for node in result["nodes"]}
+    assert all(x[link[1]] < x[link[3]] for link in result["links"] if link[3] in added)
+    assert all(x[link[1]] <= x[link[3]] for link in result["links"])
+    assert LayoutMetrics.of_workflow(result).measure()["overlapping_pairs"] == 0
+
+
+def test_large_edit_falls_back_to_full_layout(previous):
+    current = copy.deepcopy(previous)
+    for link in list(current["links"]):
+        remove_link(current, link[0])
+    report = LayoutReport()
+    relayout_workflow(current, previous, report=report)
+    assert report.counters["incremental_full_layout"] == 1
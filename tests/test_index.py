@@ -0,0 +1,120 @@
+import itertools
+
+import pytest
+
+from core.header import WorkflowData, Link
+from core.index import GraphIndex
+
+from workflow_generator import generate_workflow
+from conftest import assert_index_consistent, index_state
+
+
+@pytest.fixture
+def workflow_data() -> WorkflowData:
+    return WorkflowData.from_dict(generate_workflow(300, seed=1))
+
+
+def brute_query(workflow_data: WorkflowData, **criteria) -> list:
+    return sorted(
+        link.link_id for link in workflow_data.links
+        if all(getattr(link, name) == value for name, value in criteria.items())
+    )
+
+
+def test_of_is_cached_on_workflow_data(workflow_data):
+    graph_index = GraphIndex.of(workflow_data)
+    assert GraphIndex.of(workflow_data) is graph_index
+    assert workflow_data.graph_index is graph_index
+
+
+@pytest.mark.parametrize("names", [
+    names for count in range(1, 6)
+    for names in itertools.combinations(("input_node_id", "input_port", "output_node_id", "output_port", "link_type"), count)
+])
+def test_query_matches_brute_force(workflow_data, names):
+    graph_index = GraphIndex(workflow_data)
+    # 每个条件组合都用工作流中真实存在的几条连线取值，保证结果非空
+    for link in workflow_data.links[::37]:
+        criteria = {name: getattr(link, name) for name in names}
+        assert sorted(found.link_id for found in graph_index.query(**criteria)) == brute_query(workflow_data, **criteria)
+
+
+def test_query_without_criteria_is_empty(workflow_data):
+    assert GraphIndex(workflow_data).query() == []
+
+
+def test_neighbours_and_ports(workflow_data):
+    graph_index = GraphIndex(workflow_data)
+    for node in workflow_data.nodes:
+        outgoing = [link for link in workflow_data.links if link.input_node_id == node.id]
+        incoming = [link for link in workflow_data.links if link.output_node_id == node.id]
+        assert sorted(graph_index.successors(node.id)) == sorted(link.output_node_id for link in outgoing)
+        assert sorted(graph_index.predecessors(node.id)) == sorted(link.input_node_id for link in incoming)
+        for port in range(len(node.outputs)):
+            assert sorted(link.link_id for link in graph_index.links_from(node.id, port)) == sorted(
+                link.link_id for link in outgoing if link.input_port == port
+            )
+        for port in range(len(node.inputs)):
+            assert sorted(link.link_id for link in graph_index.links_to(node.id, port)) == sorted(
+                link.link_id for link in incoming if link.output_port == port
+            )
+
+
+def test_subgraph_and_inner_links(workflow_data):
+    graph_index = GraphIndex(workflow_data)
+    nodes = [node.id for node in workflow_data.nodes[:120]]
+    node_set = set(nodes)
+    inner = [link for link in workflow_data.links if link.input_node_id in node_set and link.output_node_id in node_set]
+    assert sorted(link.link_id for link in graph_index.inner_links(nodes)) == sorted(link.link_id for link in inner)
+    out_graph = graph_index.subgraph(nodes)
+    in_graph = graph_index.subgraph(nodes, output_graph=False)
+    assert list(out_graph) == nodes and list(in_graph) == nodes
+    for node in nodes:
+        assert sorted(out_graph[node]) == sorted(link.output_node_id for link in inner if link.input_node_id == node)
+        assert sorted(in_graph[node]) == sorted(link.input_node_id for link in inner if link.output_node_id == node)
+
+
+def test_subgraph_keeps_parallel_links(builder):
+    loader = builder.add("CheckpointLoaderSimple")
+    lora = builder.add("LoraLoader")
+    builder.connect(loader, 0, lora, 0)
+    builder.connect(loader, 1, lora, 1)
+    graph_index = GraphIndex(WorkflowData.from_dict(builder.generate(0)))
+    assert graph_index.subgraph([loader, lora]) == {loader: [lora, lora], lora: []}
+
+
+def test_incremental_updates_match_rebuild(workflow_data):
+    graph_index = GraphIndex.of(workflow_data)
+    removed = workflow_data.nodes[10]
+    workflow_data.nodes.remove(removed)
+    workflow_data.links = [
+        link for link in workflow_data.links
+        if removed.id not in (link.input_node_id, link.output_node_id)
+    ]
+    graph_index.remove_node(removed.id)
+    assert removed.id not in graph_index.id_to_node
+    assert graph_index.query(input_node_id=removed.id) == graph_index.query(output_node_id=removed.id) == []
+    assert_index_consistent(workflow_data)
+
+    link = workflow_data.links.pop(5)
+    graph_index.remove_link(link)
+    # 重复删除同一条连线不报错，也不影响其他连线
+    graph_index.remove_link(link)
+    assert_index_consistent(workflow_data)
+
+    new_link = Link(workflow_data.last_link_id + 1, link.input_node_id, link.input_port, link.output_node_id, link.output_port, "NEW")
+    workflow_data.links.append(new_link)
+    graph_index.add_link(new_link)
+    assert graph_index.query(link_type="NEW") == [new_link]
+    assert_index_consistent(workflow_data)
+
+
+def test_removing_last_link_drops_empty_buckets(builder):
+    loader = builder.add("CheckpointLoaderSimple")
+    encode = builder.add("CLIPTextEncode")
+    builder.connect(loader, 1, encode, 0)
+    workflow_data = WorkflowData.from_dict(builder.generate(0))
+    graph_index = GraphIndex(workflow_data)
+    graph_index.remove_link(workflow_data.links[0])
+    workflow_data.links.clear()
+    assert index_state(graph_index) == ([loader, encode], [], {}, {}, {}, {}, {})
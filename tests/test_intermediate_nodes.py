@@ -0,0 +1,56 @@
+import json
+
+from core.header import WorkflowData
+from core.parser import WorkflowWriter
+
+from conftest import FIXTURE
+
+
+def link_keys(workflow_data: WorkflowData) -> set:
+    return {(link.input_node_id, link.input_port, link.output_node_id, link.output_port) for link in workflow_data.links}
+
+
+def remove_intermediate(workflow: dict) -> WorkflowData:
+    workflow_data = WorkflowData.from_dict(workflow)
+    WorkflowWriter(workflow_data).remove_unnecessary_nodes()
+    return workflow_data
+
+
+def test_reroute_chain_with_untyped_link_is_rewired(builder):
+    # 链中间的连线类型为 "*" 时，下游仍然改接到链头的真实输出（旧实现按类型回溯，会丢掉这条连线）
+    loader = builder.add("CheckpointLoaderSimple")
+    first = builder.add_node("Reroute", [("", "*")], [("", "VAE")], (75, 26))
+    second = builder.add_node("Reroute", [("", "*")], [("", "VAE")], (75, 26))
+    decode, encode = builder.add("VAEDecode"), builder.add("VAEEncode")
+    builder.connect(loader, 2, first, 0)
+    builder.connect(first, 0, second, 0)
+    builder.links[-1][5] = "*"
+    builder.connect(first, 0, decode, 1)
+    builder.connect(second, 0, encode, 1)
+    workflow_data = remove_intermediate(builder.generate(0))
+    assert {node.type for node in workflow_data.nodes} == {"CheckpointLoaderSimple", "VAEDecode", "VAEEncode"}
+    assert link_keys(workflow_data) == {(loader, 2, decode, 1), (loader, 2, encode, 1)}
+
+
+def test_get_node_consumers_are_rewired_to_set_node_source(builder):
+    loader = builder.add("CheckpointLoaderSimple")
+    set_node = builder.add_node("SetNode", [("VAE", "VAE")], [("*", "*")], (210, 58), ["vae"])
+    get_node = builder.add_node("GetNode", [], [("VAE", "VAE")], (210, 58), ["vae"])
+    orphan = builder.add_node("GetNode", [], [("VAE", "VAE")], (210, 58), ["missing"])
+    decode, encode = builder.add("VAEDecode"), builder.add("VAEEncode")
+    builder.connect(loader, 2, set_node, 0)
+    builder.connect(get_node, 0, decode, 1)
+    builder.connect(orphan, 0, encode, 1)
+    workflow_data = remove_intermediate(builder.generate(0))
+    # 找不到对应 SetNode 的 GetNode 直接删除，它的下游保持未连接
+    assert link_keys(workflow_data) == {(loader, 2, decode, 1)}
+    assert workflow_data.nodes[-1].inputs[1]["link"] is None
+
+
+def test_fixture_rewiring_through_reroute_chain():
+    # 半理想的排线布局.json：VAELoader 513 经 Reroute 592 -> 593 连到 514 和 536 的 VAE 输入
+    workflow_data = remove_intermediate(json.loads(FIXTURE.read_text(encoding="utf-8")))
+    keys = link_keys(workflow_data)
+    assert {(513, 0, 514, 4), (513, 0, 536, 4), (513, 0, 521, 1)} <= keys
+    assert len(workflow_data.links) == 129
+    assert not any(node.type in ("Reroute", "SetNode", "GetNode") for node in workflow_data.nodes)
@@ -0,0 +1,108 @@
+import pytest
+
+from core.header import WorkflowData
+from core.parser import WorkflowReader, WorkflowWriter
+from core.core import StandardOrder
+from core.multilevel import MultilevelOrder
+from core.setting import LayoutOptions
+
+from workflow_generator import generate_workflow
+
+
+@pytest.fixture
+def pipeline(builder) -> WorkflowReader:
+    # ckpt -> lora -> 正负提示词 -> KSampler <- EmptyLatentImage，KSampler -> VAEDecode -> ImageScale -> SaveImage
+    ckpt = builder.add("CheckpointLoaderSimple")
+    lora = builder.add("LoraLoader")
+    positive = builder.add("CLIPTextEncode")
+    negative = builder.add("CLIPTextEncode")
+    latent = builder.add("EmptyLatentImage")
+    sampler = builder.add("KSampler")
+    decode = builder.add("VAEDecode")
+    scale = builder.add("ImageScale")
+    save = builder.add("SaveImage")
+    builder.connect(ckpt, 0, lora, 0)
+    builder.connect(ckpt, 1, lora, 1)
+    builder.connect(lora, 1, positive, 0)
+    builder.connect(lora, 1, negative, 0)
+    builder.connect(lora, 0, sampler, 0)
+    builder.connect(positive, 0, sampler, 1)
+    builder.connect(negative, 0, sampler, 2)
+    builder.connect(latent, 0, sampler, 3)
+    builder.connect(sampler, 0, decode, 0)
+    builder.connect(ckpt, 2, decode, 1)
+    builder.connect(decode, 0, scale, 0)
+    builder.connect(scale, 0, save, 0)
+    return WorkflowReader(WorkflowData.from_dict(builder.generate(0)))
+
+
+def generated_reader(node_count: int) -> WorkflowReader:
+    workflow_data = WorkflowData.from_dict(generate_workflow(node_count, group_ratio=0))
+    WorkflowWriter(workflow_data).remove_unnecessary_nodes()
+    return WorkflowReader(workflow_data)
+
+
+def assert_valid_columns(workflow_reader: WorkflowReader, columns) -> None:
+    # 每个节点恰好出现一次，所有连线都从左列连向右列
+    nodes = sorted(node.id for node in workflow_reader.workflow_data.nodes)
+    assert sorted(node for column in columns for node in column) == nodes
+    node_to_col = workflow_reader.node_to_col(columns)
+    assert all(node_to_col[link.input_node_id] < node_to_col[link.output_node_id] for link in workflow_reader.workflow_data.links)
+
+
+def test_trees(pipeline):
+    trees = MultilevelOrder(pipeline).find_trees([node.id for node in pipeline.workflow_data.nodes])
+    # checkpoint 连向 lora 和 VAEDecode，lora 连向两个提示词和 KSampler，都是根；
+    # 其余节点都只有一个下游，KSampler 的输入按端口排序
+    assert trees == {1: [[1]], 2: [[2]], 9: [[9], [8], [7], [6], [3, 4, 5]]}
+
+
+def test_expand_keeps_trees_adjacent(pipeline):
+    columns = MultilevelOrder(pipeline).get_logic_order([node.id for node in pipeline.workflow_data.nodes])
+    assert_valid_columns(pipeline, columns)
+    node_to_col = pipeline.node_to_col(columns)
+    assert node_to_col[8] == node_to_col[7] + 1 and node_to_col[9] == node_to_col[8] + 1
+    assert node_to_col[3] == node_to_col[4] == node_to_col[5] == node_to_col[6] - 1
+
+
+def test_logic_order_uses_threshold(pipeline):
+    nodes = [node.id for node in pipeline.workflow_data.nodes]
+    standard = StandardOrder(pipeline).get_logic_order(nodes=nodes)
+    for threshold in (0, len(nodes) + 1):
+        options = LayoutOptions.current().merge({"multilevel_threshold": threshold})
+        assert MultilevelOrder.logic_order(pipeline, options, nodes) == standard
+
+
+def test_refine_reduces_crossings(monkeypatch):
+    workflow_reader = generated_reader(2000)
+    nodes = [node.id for node in workflow_reader.workflow_data.nodes]
+    refined = MultilevelOrder(workflow_reader).get_logic_order(nodes)
+    monkeypatch.setattr(MultilevelOrder, "refine", lambda self, columns, expanded: None)
+    unrefined = MultilevelOrder(workflow_reader).get_logic_order(nodes)
+    monkeypatch.undo()
+    # crossing_sweeps 为 0 时 refine 不改动列
+    columns = [list(column) for column in unrefined]
+    options = LayoutOptions.current().merge({"crossing_sweeps": 0})
+    MultilevelOrder(workflow_reader, options).refine(columns, list(range(len(columns))))
+    assert columns == unrefined
+    assert_valid_columns(workflow_reader, refined)
+    assert [sorted(column) for column in refined] == [sorted(column) for column in unrefined]
+    standard_order = StandardOrder(workflow_reader)
+    assert standard_order.count_crossings(refined) < standard_order.count_crossings(unrefined)
+
+
+def test_coarsening_shrinks_the_graph(monkeypatch):
+    # 多层收缩后只在很小的粗图上做完整排序，其余各层只调整展开出的列
+    workflow_reader = generated_reader(5000)
+    nodes = [node.id for node in workflow_reader.workflow_data.nodes]
+    sizes = []
+    get_logic_order = StandardOrder.get_logic_order
+
+    def recording_order(self, nodes):
+        sizes.append(len(nodes))
+        return get_logic_order(self, nodes)
+
+    monkeypatch.setattr(StandardOrder, "get_logic_order", recording_order)
+    columns = MultilevelOrder(workflow_reader).get_logic_order(nodes)
+    assert_valid_columns(workflow_reader, columns)
+    assert len(sizes) == 1 and sizes[0] <= len(nodes) * 0.25
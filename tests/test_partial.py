@@ -0,0 +1,108 @@
+import copy
+import json
+import random
+
+import pytest
+
+from core.header import WorkflowData
+from core.parser import WorkflowReader
+from core.pipeline import layout_workflow, layout_selection
+from core.instrument import LayoutReport
+
+from conftest import FIXTURE
+
+
+@pytest.fixture(scope="module")
+def laid_out() -> dict:
+    return layout_workflow(json.loads(FIXTURE.read_bytes()))
+
+
+def position(node: dict) -> tuple:
+    pos = node["pos"]
+    return (pos["0"], pos["1"]) if isinstance(pos, dict) else tuple(pos)
+
+
+def rects(workflow: dict, node_ids: list) -> dict:
+    # 节点的位置和实际尺寸（折叠节点按折叠后的尺寸）
+    workflow_reader = WorkflowReader(WorkflowData.from_dict(copy.deepcopy(workflow)))
+    result = {}
+    for node_id in node_ids:
+        node = workflow_reader.id_to_node[node_id]
+        real_size = WorkflowReader.real_size(node)
+        result[node_id] = (node.pos.x, node.pos.y, real_size.width, real_size.height)
+    return result
+
+
+def connected_selection(workflow: dict, count: int) -> list:
+    # 从第一条连线的上游出发，按广度优先选出 count 个相连的节点
+    neighbors: dict = {}
+    for link in workflow["links"]:
+        neighbors.setdefault(link[1], []).append(link[3])
+        neighbors.setdefault(link[3], []).append(link[1])
+    selection = [workflow["links"][0][1]]
+    queue = list(selection)
+    while queue and len(selection) < count:
+        for node in neighbors.get(queue.pop(0), []):
+            if node not in selection:
+                selection.append(node)
+                queue.append(node)
+    return selection[:count]
+
+
+@pytest.fixture
+def scrambled(laid_out) -> tuple:
+    workflow = copy.deepcopy(laid_out)
+    selection = connected_selection(workflow, 20)
+    rng = random.Random(0)
+    for node in workflow["nodes"]:
+        if node["id"] in selection:
+            x, y = position(node)
+            node["pos"] = [x + rng.uniform(-200, 200), y + rng.uniform(-200, 200)]
+    return workflow, selection
+
+
+def test_only_selection_moves(scrambled):
+    workflow, selection = scrambled
+    report = LayoutReport()
+    result = layout_selection(workflow, selection, report=report)
+    assert report.counters["partial_nodes"] == len(selection)
+    before = {node["id"]: node for node in workflow["nodes"]}
+    for node in result["nodes"]:
+        if node["id"] not in selection:
+            assert position(node) == position(before[node["id"]])
+    assert result["links"] == workflow["links"]
+    # 导出时分组边框取整，其余不变
+    for group, original in zip(result["groups"], workflow["groups"]):
+        assert group["bounding"] == pytest.approx(original["bounding"], abs=1)
+
+
+def test_selection_is_ordered_and_stays_in_its_box(scrambled):
+    workflow, selection = scrambled
+    before = rects(workflow, selection)
+    x0 = min(x for x, _, _, _ in before.values())
+    y0 = min(y for _, y, _, _ in before.values())
+    y1 = max(y + height for _, y, _, height in before.values())
+    result = layout_selection(workflow, selection)
+    placed = rects(result, selection)
+    assert min(x for x, _, _, _ in placed.values()) == pytest.approx(x0)
+    # 同列堆叠时上下游可以在同一列
+    assert all(placed[link[1]][0] <= placed[link[3]][0] for link in result["links"] if link[1] in placed and link[3] in placed)
+    top = min(y for _, y, _, _ in placed.values())
+    bottom = max(y + height for _, y, _, height in placed.values())
+    if bottom - top <= y1 - y0:
+        assert y0 - 1e-6 <= top and bottom <= y1 + 1e-6
+    # 同列的选中节点互不重叠
+    columns: dict = {}
+    for x, y, _, height in placed.values():
+        columns.setdefault(x, []).append((y, height))
+    for column in columns.values():
+        column.sort()
+        assert all(upper_y + upper_height <= lower_y + 1e-6 for (upper_y, upper_height), (lower_y, _) in zip(column, column[1:]))
+
+
+def test_unknown_and_duplicate_ids_are_ignored(scrambled):
+    workflow, selection = scrambled
+    expected = layout_selection(workflow, selection)
+    assert layout_selection(workflow, selection + selection[:3] + [10 ** 9]) == expected
+    assert layout_selection(workflow, [10 ** 9]) == layout_selection(workflow, [])
+    assert [position(node) for node in layout_selection(workflow, [])["nodes"]] == [position(node) for node in workflow["nodes"]]
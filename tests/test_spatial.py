@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from core.spatial import SpatialGrid
+from core.Utils import AlgorithmTool
+
+
+def random_rects(count: int, seed: int = 0) -> list:
+    # 大小悬殊的矩形，包括宽或高为 0 的矩形和跨越很多格子的大矩形
+    rng = random.Random(seed)
+    rects = []
+    for _ in range(count):
+        x, y = rng.uniform(-2000, 2000), rng.uniform(-2000, 2000)
+        width = rng.choice([0, rng.uniform(10, 400), rng.uniform(400, 3000)])
+        height = rng.choice([0, rng.uniform(10, 400), rng.uniform(400, 3000)])
+        rects.append((x, y, x + width, y + height))
+    return rects
+
+
+@pytest.fixture(params=[None, 40.0, 5000.0], ids=["median", "small-cells", "large-cells"])
+def grid(request) -> SpatialGrid:
+    rects = random_rects(300)
+    return SpatialGrid.of_rects(rects, [f"r{idx}" for idx in range(len(rects))], cell_size=request.param)
+
+
+def queries(seed: int = 1) -> list:
+    # 普通的查询区域，以及比整个网格还大的查询区域
+    return random_rects(30, seed) + [(-10 ** 5, -10 ** 5, 10 ** 5, 10 ** 5)]
+
+
+def test_intersecting_matches_brute_force(grid):
+    for query in queries():
+        expected = [grid.keys[idx] for idx, rect in enumerate(grid.rects) if AlgorithmTool.rectangle_intersection_area(rect, query) > 0]
+        assert grid.intersecting(query) == expected
+
+
+@pytest.mark.parametrize("proportion", [0, 0.5, 0.99])
+def test_contained_matches_brute_force(grid, proportion):
+    for query in queries():
+        expected = [
+            grid.keys[idx] for idx, rect in enumerate(grid.rects)
+            if AlgorithmTool.rectangle_intersection_area(rect, query) > 0
+            and AlgorithmTool.rectangle_intersection_area(rect, query) / max(SpatialGrid.area(rect), 1) > proportion
+        ]
+        assert grid.contained(query, proportion) == expected
+
+
+@pytest.mark.parametrize("limit", [None, 1, 5])
+def test_count_contained_stops_at_limit(grid, limit):
+    for query in queries() + [(10 ** 5, 10 ** 5, 2 * 10 ** 5, 2 * 10 ** 5)]:
+        count = len(grid.contained(query, 0.5))
+        assert grid.count_contained(query, 0.5, limit) == (count if limit is None else min(count, limit))
+
+
+def test_large_query_on_sparse_grid():
+    # 两个相距很远的小矩形，查询区域覆盖上亿个格子，只访问有矩形的行
+    grid = SpatialGrid.of_rects([(0, 0, 10, 10), (10 ** 5, 10 ** 5, 10 ** 5 + 10, 10 ** 5 + 10)], cell_size=10)
+    assert grid.intersecting((-10 ** 6, -10 ** 6, 10 ** 6, 10 ** 6)) == [0, 1]
+    assert grid.intersecting((5, 5, 10 ** 5 + 5, 50)) == [0]
+    assert grid.intersecting((-100, -100, -50, -50)) == []
+
+
+def test_nearest_matches_brute_force(grid):
+    rng = random.Random(2)
+    for _ in range(100):
+        point = (rng.uniform(-6000, 6000), rng.uniform(-6000, 6000))
+        distances = [SpatialGrid.distance(point, rect) for rect in grid.rects]
+        # 距离相同时取先插入的矩形
+        assert grid.nearest(point) == grid.keys[distances.index(min(distances))]
+
+
+def test_nearest_on_empty_grid():
+    assert SpatialGrid(10).nearest((0, 0)) is None
+
+
+def test_overlapping_pairs_reported_once(grid):
+    index = {key: idx for idx, key in enumerate(grid.keys)}
+    found = {}
+    for a, b, area in grid.overlapping_pairs():
+        pair = tuple(sorted((index[a], index[b])))
+        assert pair not in found
+        found[pair] = area
+    expected = {}
+    for i, a in enumerate(grid.rects):
+        for j in range(i + 1, len(grid.rects)):
+            left, top = max(a[0], grid.rects[j][0]), max(a[1], grid.rects[j][1])
+            right, bottom = min(a[2], grid.rects[j][2]), min(a[3], grid.rects[j][3])
+            if left < right and top < bottom:
+                expected[(i, j)] = (right - left) * (bottom - top)
+    assert found.keys() == expected.keys()
+    assert all(found[pair] == pytest.approx(area) for pair, area in expected.items())
+
+
+def test_along_segment_covers_every_crossed_rect(grid):
+    rng = random.Random(3)
+    for _ in range(20):
+        start = (rng.uniform(-3000, 3000), rng.uniform(-3000, 3000))
+        end = (rng.uniform(-3000, 3000), rng.uniform(-3000, 3000))
+        found = list(grid.along_segment(start, end))
+        assert len(found) == len(set(found))
+        # 线段上密集取点，包含任一点的矩形都必须出现在结果中
+        for step in range(201):
+            t = step / 200
+            x, y = start[0] + (end[0] - start[0]) * t, start[1] + (end[1] - start[1]) * t
+            for idx, rect in enumerate(grid.rects):
+                if rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]:
+                    assert grid.keys[idx] in found
+
+
+def test_keys_default_to_indices():
+    grid = SpatialGrid.of_rects([(0, 0, 10, 10), (5, 5, 20, 20)])
+    assert grid.intersecting((0, 0, 100, 100)) == [0, 1]
+    assert list(grid.overlapping_pairs()) == [(0, 1, 25)]
@@ -0,0 +1,48 @@
+import json
+import threading
+
+import pytest
+
+from core.stream import NDJSONStream
+
+from conftest import FIXTURE
+
+
+@pytest.fixture(scope="module")
+def line() -> bytes:
+    return json.dumps(json.loads(FIXTURE.read_bytes()), ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+@pytest.mark.parametrize("ordered", [True, False])
+def test_records_and_errors(line, workers, ordered):
+    output = []
+    counts = NDJSONStream(workers=workers, ordered=ordered).run([line, b"\n", b"[1]\n", b"{broken\n", line], output.append)
+    assert counts == {"records": 4, "failed": 2}
+    records = [json.loads(item) for item in output]
+    if ordered:
+        assert [record["record"] for record in records] == [0, 1, 2, 3]
+    assert sorted(record["record"] for record in records if "error" in record) == [1, 2]
+    assert all(record["workflow"]["nodes"] for record in records if "workflow" in record)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_finished_records_are_written_before_more_input(line, ordered):
+    # 第一条记录输出之前输入不再给出新的行，模拟交互式的 stdin；记录必须在没有新输入的情况下输出
+    written = threading.Event()
+    stalled = []
+
+    def lines():
+        yield line
+        stalled.append(not written.wait(timeout=20))
+        yield line
+
+    output = []
+
+    def write(item: bytes) -> None:
+        output.append(item)
+        written.set()
+
+    counts = NDJSONStream(workers=1, max_in_flight=4, ordered=ordered).run(lines(), write)
+    assert stalled == [False]
+    assert counts == {"records": 2, "failed": 0}
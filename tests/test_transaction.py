@@ -0,0 +1,193 @@
+import copy
+
+import pytest
+
+from core.header import WorkflowData
+from core.parser import WorkflowWriter
+
+from conftest import assert_index_consistent, index_state
+
+
+@pytest.fixture
+def writer(builder) -> WorkflowWriter:
+    # loader -> CLIPTextEncode (clip)、loader -> VAEDecode (vae)，VAEEncode 未连接
+    loader = builder.add("CheckpointLoaderSimple")
+    text = builder.add("CLIPTextEncode")
+    decode = builder.add("VAEDecode")
+    builder.add("VAEEncode")
+    builder.connect(loader, 1, text, 0)
+    builder.connect(loader, 2, decode, 1)
+    return WorkflowWriter(WorkflowData.from_dict(builder.generate(0)))
+
+
+def snapshot(workflow_data: WorkflowData) -> tuple:
+    return (
+        [(node.id, copy.deepcopy(node.inputs), copy.deepcopy(node.outputs)) for node in workflow_data.nodes],
+        [(link.link_id, link.input_node_id, link.input_port, link.output_node_id, link.output_port, link.link_type) for link in workflow_data.links],
+        workflow_data.last_node_id, workflow_data.last_link_id,
+        index_state(workflow_data.graph_index),
+    )
+
+
+def test_commit_applies_all_edits(writer):
+    workflow_data = writer.workflow_data
+    with writer.transaction() as transaction:
+        transaction.remove_nodes(writer.id_to_node[2])
+        transaction.create_link(1, 2, 4, 1)
+    assert [node.id for node in workflow_data.nodes] == [1, 3, 4]
+    assert [(link.link_id, link.input_node_id, link.output_node_id) for link in workflow_data.links] == [(2, 1, 3), (3, 1, 4)]
+    assert workflow_data.last_link_id == 3
+    link = writer.id_to_link[3]
+    assert link.link_type == "VAE"
+    assert writer.id_to_node[1].outputs[1]["links"] == []
+    assert writer.id_to_node[1].outputs[2]["links"] == [2, 3]
+    assert writer.id_to_node[4].inputs[1]["link"] == 3
+    assert_index_consistent(workflow_data)
+
+
+def test_compaction_renumbers_new_links_after_last_link_id(writer):
+    workflow_data = writer.workflow_data
+    with writer.transaction() as transaction:
+        transaction.remove_links(writer.id_to_link[1])
+        node = transaction.create_node("SetNode", pos=[0, 0])
+        transaction.create_link(1, 1, node.id, 0)
+        transaction.create_link(node.id, 0, 2, 0)
+    # 被删除的连线从列表中去掉，新连线按创建顺序从 last_link_id + 1 开始编号并追加在末尾
+    assert [link.link_id for link in workflow_data.links] == [2, 3, 4]
+    assert (workflow_data.links[1].input_node_id, workflow_data.links[1].output_node_id) == (1, node.id)
+    assert (workflow_data.links[2].input_node_id, workflow_data.links[2].output_node_id) == (node.id, 2)
+    assert workflow_data.last_node_id == node.id == 5
+    assert workflow_data.nodes[-1] is node
+    assert writer.id_to_node[2].inputs[0]["link"] == 4
+    assert_index_consistent(workflow_data)
+
+
+def test_later_link_on_same_input_port_wins(writer):
+    with writer.transaction() as transaction:
+        first = transaction.create_link(1, 2, 4, 1)
+        second = transaction.create_link(1, 1, 3, 1)
+        third = transaction.create_link(1, 2, 4, 1)
+    assert transaction.skipped_links == [first]
+    assert writer.id_to_node[4].inputs[1]["link"] == third.link_id
+    # 原来接在 3:1 上的连线被新连线替换
+    assert [link.link_id for link in writer.graph_index.links_to(3, 1)] == [second.link_id]
+    assert 2 not in writer.id_to_link and writer.id_to_node[1].outputs[2]["links"] == [third.link_id]
+    assert_index_consistent(writer.workflow_data)
+
+
+def test_strict_invalid_edit_raises_and_changes_nothing(writer):
+    before = snapshot(writer.workflow_data)
+    with pytest.raises(ValueError, match="Invalid link"):
+        with writer.transaction() as transaction:
+            transaction.remove_nodes(writer.id_to_node[2])
+            transaction.create_link(1, 2, 4, 1)
+            # 端口越界
+            transaction.create_link(1, 9, 4, 0)
+    assert snapshot(writer.workflow_data) == before
+
+
+@pytest.mark.parametrize("link", [
+    (1, 9, 4, 0),   # 输出端口越界
+    (1, 2, 4, 5),   # 输入端口越界
+    (1, 2, 99, 1),  # 节点不存在
+    (4, 0, 4, 0),   # 自环
+    (1, 2, 3, 1),   # 与已有连线重复
+])
+def test_non_strict_skips_invalid_links(writer, link):
+    with writer.transaction(strict=False) as transaction:
+        invalid = transaction.create_link(*link)
+        valid = transaction.create_link(1, 0, 4, 0)
+    assert transaction.skipped_links == [invalid]
+    assert invalid not in writer.workflow_data.links
+    assert writer.id_to_link[valid.link_id] is valid
+    assert_index_consistent(writer.workflow_data)
+
+
+def test_links_to_removed_nodes_are_invalid(writer):
+    with pytest.raises(ValueError):
+        with writer.transaction() as transaction:
+            transaction.remove_nodes(writer.id_to_node[4])
+            transaction.create_link(1, 2, 4, 1)
+
+
+def test_exception_inside_block_changes_nothing(writer):
+    before = snapshot(writer.workflow_data)
+    with pytest.raises(RuntimeError):
+        with writer.transaction() as transaction:
+            transaction.remove_nodes(writer.id_to_node[3])
+            raise RuntimeError("abort")
+    assert snapshot(writer.workflow_data) == before
+
+
+def test_failure_while_applying_rolls_back(writer, monkeypatch):
+    before = snapshot(writer.workflow_data)
+    graph_index = writer.graph_index
+    add_link = graph_index.add_link
+    calls = []
+
+    def failing_add_link(link):
+        # 第二根新连线加入索引时失败，此前已经应用的删除和第一根连线都要撤销
+        calls.append(link)
+        if len(calls) == 2:
+            raise RuntimeError("index failure")
+        add_link(link)
+
+    monkeypatch.setattr(graph_index, "add_link", failing_add_link)
+    with pytest.raises(RuntimeError, match="index failure"):
+        with writer.transaction() as transaction:
+            transaction.remove_nodes(writer.id_to_node[2])
+            transaction.remove_links(writer.id_to_link[2])
+            transaction.create_link(1, 2, 4, 1)
+            transaction.create_link(1, 2, 3, 1)
+    monkeypatch.undo()
+    assert snapshot(writer.workflow_data) == before
+    assert_index_consistent(writer.workflow_data)
+
+
+@pytest.fixture
+def fanout(builder) -> WorkflowWriter:
+    # 一个 VAE 输出接 60 个 VAEDecode，另有 60 个未连接的 VAEEncode
+    loader = builder.add("CheckpointLoaderSimple")
+    for _ in range(60):
+        builder.connect(loader, 2, builder.add("VAEDecode"), 1)
+    for _ in range(60):
+        builder.add("VAEEncode")
+    return WorkflowWriter(WorkflowData.from_dict(builder.generate(0)))
+
+
+def rewire(writer: WorkflowWriter, transaction) -> None:
+    # 断开一半的 VAEDecode，改接到 VAEEncode 上
+    for link_id in range(1, 61, 2):
+        transaction.remove_links(writer.id_to_link[link_id])
+    for node_id in range(62, 122):
+        transaction.create_link(1, 2, node_id, 1)
+
+
+def test_high_fanout_rewire(fanout):
+    with fanout.transaction() as transaction:
+        rewire(fanout, transaction)
+    assert fanout.id_to_node[1].outputs[2]["links"] == list(range(2, 61, 2)) + list(range(61, 121))
+    assert_index_consistent(fanout.workflow_data)
+
+
+def test_high_fanout_rewire_rolls_back(fanout, monkeypatch):
+    before = snapshot(fanout.workflow_data)
+    graph_index = fanout.graph_index
+    add_link = graph_index.add_link
+    calls = []
+
+    def failing_add_link(link):
+        calls.append(link)
+        if len(calls) == 60:
+            raise RuntimeError("index failure")
+        add_link(link)
+
+    monkeypatch.setattr(graph_index, "add_link", failing_add_link)
+    with pytest.raises(RuntimeError, match="index failure"):
+        with fanout.transaction() as transaction:
+            rewire(fanout, transaction)
+    monkeypatch.undo()
+    assert snapshot(fanout.workflow_data) == before
+    assert_index_consistent(fanout.workflow_data)
+    # 端口在这次提交中只保存过一次，回滚后也不残留
+    assert transaction.saved_slots == set()